@@ -2,45 +2,104 @@
 # -*- coding: utf-8 -*-
 
 #  Modules import
-import os
-import glob
+import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from airflow.models.baseoperator import BaseOperator
 from airflow.utils.decorators import apply_defaults
 
+# Custom modules
+from custom_operator.file_storage import LocalFileStorage, GCSFileStorage
+from lines_pipeline.instrumentation import PipelineMetrics
+
+# Composer data folder, mounted on the workers and stored under the data/ prefix of the environment bucket
+DATA_DIRECTORY = '/home/airflow/gcs/data/'
+DATA_PREFIX = 'data/'
+
 
 class CustomCleanFilesOperator(BaseOperator):
     """
     Custom Operator created to deal with cleaning operations needed for all ETLs.
-    It simply deletes file from Cloud Storage
+    It deletes the files <dataset>.<table_name><file><date_str>.* generated by an ETL, for each of the given files patterns.
+    - Files are listed once per table (one directory scan, or one prefix listing on the bucket) and deleted in batches by a bounded pool of workers.
+    - date_str can be a date, a list of dates (e.g. after a backfill) or None to match every date.
+    - With min_age, files modified more recently than min_age ago are retained.
+    - storage defaults to the mounted data folder, bucket switches to the Cloud Storage API on the data/ prefix of the bucket.
     """
 
-    template_fields = ['date_str']
+    template_fields = ['date_str', 'bucket']
 
     @apply_defaults
-    def __init__( self, files, dataset, table_name, date_str, *args, **kwargs) -> None:
+    def __init__( self, files, dataset, table_name, date_str, bucket=None, storage=None, min_age=None, max_workers=8, batch_size=100, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.files = files
         self.dataset = dataset
         self.table_name = table_name
         self.date_str = date_str
+        self.bucket = bucket
+        self.storage = storage
+        self.min_age = min_age
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+
+    def get_storage(self):
+        if self.storage is not None:
+            return self.storage
+        if self.bucket:
+            return GCSFileStorage(self.bucket, prefix=DATA_PREFIX)
+        return LocalFileStorage(DATA_DIRECTORY)
+
+    def get_prefixes(self):
+        # One prefix per files pattern and date, the date being followed by the extension(s) of the file
+        table_prefix = self.dataset + '.' + self.table_name
+        if self.date_str is None:
+            return [table_prefix + file for file in self.files]
+
+        date_strs = [self.date_str] if isinstance(self.date_str, str) else self.date_str
+        return [table_prefix + file + date_str + '.' for file in self.files for date_str in date_strs]
 
     def execute(self, context):
 
-        for file in self.files:
+        storage = self.get_storage()
+        prefixes = tuple(self.get_prefixes())
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - self.min_age if self.min_age else None
+        metrics = PipelineMetrics(self.table_name, labels={'dataset': self.dataset, 'task_id': self.task_id})
+
+        with metrics.stage('clean') as stage:
+            # List the files of the table once, then select the ones matching a pattern and old enough
+            to_delete = []
+            files_retained = 0
+            for stored_file in storage.list(self.dataset + '.' + self.table_name):
+                if not stored_file.name.startswith(prefixes):
+                    continue
+                if cutoff is not None and stored_file.updated > cutoff:
+                    files_retained += 1
+                    continue
+                to_delete.append(stored_file)
+
+            sizes = {stored_file.name: stored_file.size for stored_file in to_delete}
+            batches = [[stored_file.name for stored_file in to_delete[i:i + self.batch_size]] for i in range(0, len(to_delete), self.batch_size)]
+
+            # Delete the batches concurrently
+            files_deleted = 0
+            bytes_freed = 0
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for deleted in executor.map(storage.delete, batches):
+                    for filename in deleted:
+                        logging.info('file cleaned: ' + filename)
+                    files_deleted += len(deleted)
+                    bytes_freed += sum(sizes[filename] for filename in deleted)
 
-            filepattern = '/home/airflow/gcs/data/' + self.dataset + '.' + self.table_name + file + self.date_str + '.*'
-            print(filepattern)
-            filelist = glob.glob(filepattern)
+            stage.add(files_deleted=files_deleted, bytes_freed=bytes_freed, files_retained=files_retained)
 
-            for filename in filelist:
-                if os.path.exists(filename):
-                    os.remove(filename)
-                    logging.info('file cleaned: ' + filename)
-                else:
-                    logging.info("The file does not exist: " + filename)
+        logging.info('%d files cleaned, %d bytes freed, %d files retained', files_deleted, bytes_freed, files_retained)
+        metrics.export(log=logging.info)
 
         return {
             'task_status': 'Cleaning operation: success',
-            'files_deleted': str(self.files)
+            'files': str(self.files),
+            'files_deleted': files_deleted,
+            'bytes_freed': bytes_freed,
+            'files_retained': files_retained,
+            'metrics': metrics.get('clean').as_dict()
         }
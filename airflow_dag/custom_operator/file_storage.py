@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#  Modules import
+import os
+import datetime
+import collections
+
+# File of a storage: name relative to the storage root, size in bytes and last modification time (UTC)
+StoredFile = collections.namedtuple('StoredFile', ['name', 'size', 'updated'])
+
+
+class LocalFileStorage:
+    """
+    Storage backed by a local (or FUSE-mounted) directory.
+    A prefix is listed with a single directory scan instead of one glob per pattern.
+    """
+
+    def __init__(self, root) -> None:
+        self.root = root
+
+    def list(self, prefix):
+        """
+        Method used to list the files of the root directory whose name starts with prefix.
+        """
+
+        files = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.startswith(prefix) and entry.is_file():
+                    stat = entry.stat()
+                    files.append(StoredFile(entry.name, stat.st_size, datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc)))
+
+        return files
+
+    def delete(self, names):
+        """
+        Method used to delete a batch of files, files already gone are ignored. Returns the names actually deleted.
+        """
+
+        deleted = []
+        for name in names:
+            try:
+                os.remove(os.path.join(self.root, name))
+                deleted.append(name)
+            except FileNotFoundError:
+                pass
+
+        return deleted
+
+
+class GCSFileStorage:
+    """
+    Storage backed by a Cloud Storage bucket, under an optional prefix (e.g. 'data/' for the Composer data folder).
+    Prefixes are listed through the objects API and deletions are sent as batch requests.
+    """
+
+    def __init__(self, bucket, prefix='', client=None) -> None:
+        self.bucket_name = bucket
+        self.prefix = prefix
+        self._client = client
+
+    @property
+    def client(self):
+        # Imported here so the DAG parse and the local storage do not depend on the Cloud Storage package
+        if self._client is None:
+            from google.cloud import storage
+            self._client = storage.Client()
+
+        return self._client
+
+    def list(self, prefix):
+        """
+        Method used to list the objects whose name (relative to the storage prefix) starts with prefix.
+        """
+
+        return [
+            StoredFile(blob.name[len(self.prefix):], blob.size, blob.updated)
+            for blob in self.client.list_blobs(self.bucket_name, prefix=self.prefix + prefix)
+        ]
+
+    def delete(self, names):
+        """
+        Method used to delete a batch of objects in a single batch request, objects already gone are ignored. Returns the names deleted.
+        """
+
+        from google.api_core import exceptions
+
+        bucket = self.client.bucket(self.bucket_name)
+
+        try:
+            with self.client.batch():
+                for name in names:
+                    bucket.delete_blob(self.prefix + name)
+            return list(names)
+
+        except exceptions.NotFound:
+            # Part of the batch was already deleted (e.g. task retry), fall back to one request per object to know which ones remain
+            deleted = []
+            for name in names:
+                try:
+                    bucket.delete_blob(self.prefix + name)
+                    deleted.append(name)
+                except exceptions.NotFound:
+                    pass
+            return deleted
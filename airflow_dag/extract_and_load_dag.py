@@ -1,30 +1,48 @@
 # !/usr/bin/python
 # -*- coding: utf-8 -*-
 
+# This file is re-parsed by the scheduler on every heartbeat: it only holds the DAG definitions.
+# The task implementations (pandas, pyarrow, requests) live in pipeline_tasks and are imported inside the callables, when a task runs.
+
 # Modules import
-import uuid
-import time
 import airflow
-import pendulum
 import datetime
-import pandas as pd
 from airflow.operators import python_operator
 from airflow.contrib.operators import gcs_to_bq, bigquery_operator, bigquery_table_delete_operator
 
 # Custom modules
 import custom_operator.custom_clean_files_operator as custom_clean_files_operator
+import lines_pipeline.backfill as backfill
+import lines_pipeline.merge as merge
+import lines_pipeline.schema as schema
 
-# Set the project, dataset and table name
+# Set the project name
 GCP_PROJECT_NAME = 'test_project'
-GCP_DATASET_NAME = 'dw_test'
-GCP_TABLE_NAME = 'lines'
-
-# Define the local timezone
-local_tz = pendulum.timezone('Europe/Paris')
 
-# Build GCP destination and temporary destination using project, dataset and table names
-gcp_destination = GCP_PROJECT_NAME + "." + GCP_DATASET_NAME + "." + GCP_TABLE_NAME
-gcp_temporary = GCP_PROJECT_NAME + ".dw_temporary." + GCP_TABLE_NAME
+# Set the tables to load, one DAG is created per table:
+# - dataset / table: destination of the data, the table has to be registered in lines_pipeline/schema.py
+# - load_mode: 'full' merges the whole catalogue, 'incremental' (opt-in) only ships lines that changed since the latest merged snapshot,
+#   its runs are serialised (one active run, each waiting for the previous one to succeed) as each one is compared with the snapshot of the previous one
+# - layout: table layout (partitioning, clustering, history table, 'scd2' versioning), see lines_pipeline/schema.py
+# - staging_directory / staging_codec: staging directory (Cloud Storage bucket mounted by Composer) and Parquet codec of the staging files
+# - backfill_max_workers: number of days extracted concurrently by the backfill DAG
+# - source_date_parameter: query parameter of the API selecting the day of the data, None when the API only serves its current state
+#   (the backfill DAG then extracts the payload once instead of once per day)
+# - transform_max_workers / transform_min_rows: worker processes of the transform, only started for payloads of at least transform_min_rows lines
+TABLE_CONFIGS = [
+    {
+        'dataset': 'dw_test',
+        'table': 'lines',
+        'load_mode': 'full',
+        'layout': 'legacy',
+        'staging_directory': '/home/airflow/gcs/data/',
+        'staging_codec': 'zstd',
+        'backfill_max_workers': 4,
+        'source_date_parameter': None,
+        'transform_max_workers': 4,
+        'transform_min_rows': 200000
+    }
+]
 
 # Define default_args
 default_args = {
@@ -39,161 +57,222 @@ default_args = {
     'end_date': datetime.datetime(2022, 12, 25)
 }
 
-# Define a function that represents the task we want to perform
-def extract_and_transform_data(**kwargs):
+
+def extract_and_transform_data(table_config, **kwargs):
     """
-    Method used to extract and transform data.
+    Method used to extract and transform data, the implementation is imported when the task runs.
     """
 
-    # Set the base URL and endpoint for the API --> In an Airflow context, we'd prefer to use set-up Connection rather than environment variables
-    # Additionally this might result in the creation of a dedicated Operator if it makes sense
-    base_url = os.environ.get("SOURCE_API_BASE_URL", "default_base_url")
-    endpoint = os.environ.get("SOURCE_API_ENDPOINT", "default_endpoint")
+    from pipeline_tasks import extract_and_load
 
-    # Send the request to the API
-    response = requests.get(base_url + endpoint)
+    return extract_and_load.extract_and_transform_data(table_config, **kwargs)
 
-    # Check if the request was successful
-    if response.status_code == 200:
 
-        # Extract the data from the response
-        data = response.json()
+def commit_snapshot(table_config, **kwargs):
+    """
+    Method used to promote the snapshot of the hashes once the changes have been merged, the implementation is imported when the task runs.
+    """
 
-        # Create a list to store the data
-        rows = []
+    from pipeline_tasks import extract_and_load
 
-        # Iterate over the lines in the data
-        for pk_line_id, line_data in data.items():
-            # Extract the fields we are interested in
-            line_name = line_data.get("LineName", None)
-            transport_type = line_data.get("TransportType") if line_data.get("TransportType") in ['BUS', 'TRAIN', 'METRO', 'BOAT', 'TRAM'] else None
-            line_public_number = line_data.get("LinePublicNumber", None)
-            data_owner_code = line_data.get("DataOwnerCode", None)
-            destination_name_50 = line_data.get("DestinationName50", None)
-            line_planning_number = line_data.get("LinePlanningNumber", None)
-            line_direction = line_data.get("LineDirection", None)
+    return extract_and_load.commit_snapshot(table_config, **kwargs)
 
-            # Add technical columns such as the source system and unique identifier generated through the ETL
-            source_system = "http://v0.ovapi.nl/line/"
-            uuid_line = str(uuid.uuid4())
 
-            # Add the data to the list
-            rows.append((uuid_line, pk_line_id, line_name, transport_type, line_public_number, data_owner_code, destination_name_50, line_planning_number, line_direction, source_system))
+def backfill_lines(table_config, **kwargs):
+    """
+    Method used to stage the days of a backfill, the implementation is imported when the task runs.
+    """
 
-        # Convert the list to a Pandas dataframe
-        df = pd.DataFrame(rows, columns=["uuid_line", "pk_line_id", "line_name", "transport_type", "line_public_number", "data_owner_code", "destination_name_50", "line_planning_number", "line_direction", "source_system"])
+    from pipeline_tasks import extract_and_load
 
-        df.to_parquet('/home/airflow/gcs/data/' + GCP_DATASET_NAME + '.' + GCP_TABLE_NAME + '_transformed_' + kwargs['execution_date'].strftime('%Y-%m-%d') + '.parquet', index=False)
+    return extract_and_load.backfill_lines(table_config, **kwargs)
 
-    return {
-        'task_status': 'Transformation step: success',
-        'result_length': len(final_df.index)
-    }
 
-# Create a DAG instance
-with airflow.DAG(
-        GCP_DATASET_NAME + '.' + GCP_TABLE_NAME,
-        'catchup=False',
-        default_args=default_args,
-        schedule_interval='@daily') as dag:
-
-    # Create an instance of PythonOperator to extract and transform data, output to cloud storage and assumes we are using Composer (Airflow as a Service), this can easily be adapted
-    extract_and_transform_op = python_operator.PythonOperator(
-        task_id='transform_step',
-        provide_context=True,
-        python_callable=extract_and_transform_data,
-        dag=dag
-    )
+def merge_key_range(table_schema, layout, task_id):
+    """
+    Method used to build the query parameters of the range of keys restricting the MERGE, rendered from the XCom of the staging task.
+    The keys come from the payload: they are bound as @min_key / @max_key parameters, never rendered into the SQL text.
+    """
 
-    # Use the Cloud Storage to BigQuery operator and use the PARQUET generated file to load data to temporary table
-    gcs_to_bq_op = gcs_to_bq.GoogleCloudStorageToBigQueryOperator(
-        task_id='to_bq_step',
-        bucket='{{ var.value.GCP_BUCKET_NAME }}',
-        source_objects=['data/' + GCP_DATASET_NAME + '.' + GCP_TABLE_NAME + '_transformed_{{ ds }}.parquet'],
-        destination_project_dataset_table='{{ var.value.GCP_PROJECT_NAME }}:dw_temporary' + '.' + GCP_TABLE_NAME + '_{{ ds_nodash }}',
-        schema_fields=[
-            {'name': 'uuid_line', 'type': 'STRING', 'mode': 'REQUIRED', 'description': 'A unique identifier generated through the ETL process.'},
-            {'name': 'pk_line_id', 'type': 'STRING', 'mode': 'REQUIRED', 'description': 'Primary key of the table. A line is a predetermined route along several timingpoints.'},
-            {'name': 'line_name', 'type': 'STRING', 'mode': 'NULLABLE', 'description': 'Name of the line.'},
-            {'name': 'transport_type', 'type': 'STRING', 'mode': 'NULLABLE',  'description': 'Type of transport, it has to be one of: BUS, TRAIN, METRO, BOAT, TRAM.'},
-            {'name': 'line_public_number', 'type': 'STRING', 'mode': 'NULLABLE',  'description': 'Line number used when communicated with travellers. Communicated as STRING from source of truth.'},
-            {'name': 'data_owner_code', 'type': 'STRING', 'mode': 'REQUIRED', 'description': 'Data owner code.'},
-            {'name': 'destination_name_50', 'type': 'STRING', 'mode': 'NULLABLE',  'description': 'Destination name.'},
-            {'name': 'line_planning_number', 'type': 'STRING', 'mode': 'REQUIRED', 'description': 'Line planning number. Communicated as STRING from source of truth.'},
-            {'name': 'line_direction', 'type': 'INTEGER', 'mode': 'REQUIRED', 'description': 'Direction of the line.'},
-            {'name': 'load_timestamp', 'type': 'TIMESTAMP', 'mode': 'NULLABLE', 'defaultValueExpression': 'CURRENT_TIMESTAMP()', 'description': 'Technical data corresponding to latest load date and time.'},
-            {'name': 'source_system', 'type': 'STRING', 'mode': 'REQUIRED', 'description': 'Source system from which the data has been extracted.'}
-        ],
-        source_format='PARQUET',
-        skip_leading_rows=1,
-        write_disposition='WRITE_TRUNCATE',
-        dag=dag
+    return merge.key_range_query_params(
+        table_schema,
+        layout,
+        "{{ ti.xcom_pull(task_ids='" + task_id + "')['min_key'] }}",
+        "{{ ti.xcom_pull(task_ids='" + task_id + "')['max_key'] }}"
     )
 
-    # Merge the previously loaded data in the destination table
-    bq_merge_query_op = bigquery_operator.BigQueryOperator(
-        task_id='merge_bq_step',
-        sql="""
-            MERGE dw_test.lines B
-            USING dw_temporary.lines_{{ ds_nodash }} N
-            ON B.pk_line_id = N.pk_line_id
-            WHEN MATCHED THEN
-              UPDATE SET
-                uuid_line = N.uuid_line,
-                line_name = N.line_name,
-                transport_type = N.transport_type,
-                line_public_number = N.line_public_number,
-                data_owner_code = N.data_owner_code,
-                destination_name_50 = N.destination_name_50,
-                line_planning_number = N.line_planning_number,
-                line_direction = N.line_direction,
-                load_timestamp = CURRENT_TIMESTAMP(),
-                source_system = N.source_system
-            WHEN NOT MATCHED THEN
-              INSERT (
-                uuid_line,
-                pk_line_id,
-                line_name,
-                transport_type,
-                line_public_number,
-                data_owner_code,
-                destination_name_50,
-                line_planning_number,
-                line_direction,
-                load_timestamp,
-                source_system
-              ) VALUES(
-                N.uuid_line,
-                N.pk_line_id,
-                N.line_name,
-                N.transport_type,
-                N.line_public_number,
-                N.data_owner_code,
-                N.destination_name_50,
-                N.line_planning_number,
-                N.line_direction,
-                CURRENT_TIMESTAMP(),
-                N.source_system
-              ) """,
-        use_legacy_sql=False,
-        dag=dag
-    )
 
-    # Delete the temporary table
-    bq_delete_op = bigquery_table_delete_operator.BigQueryTableDeleteOperator(
-        task_id='delete_bq_step',
-        deletion_dataset_table='{{ var.value.GCP_PROJECT_NAME }}.dw_temporary' + '.' + GCP_TABLE_NAME + '_{{ ds_nodash }}',
-    )
+def create_dag(table_config):
+    """
+    Method used to create the extract and load DAG of a configured table.
+    """
+
+    dataset = table_config['dataset']
+    table = table_config['table']
+    table_schema = schema.get_table_schema(table)
+    incremental = table_config['load_mode'] == 'incremental'
+
+    # Schema of the temporary table loaded from the staging files (in incremental mode a change_type column flags the changed lines and deleted lines only carry their key)
+    staging_schema_fields = schema.schema_fields(table_schema, incremental=incremental)
+
+    # Create a DAG instance, incremental runs never overlap nor skip a failed run so the snapshot of the hashes always follows the merged changes
+    with airflow.DAG(
+            dataset + '.' + table,
+            catchup=False,
+            default_args=dict(default_args, depends_on_past=True) if incremental else default_args,
+            schedule_interval='@daily',
+            **({'max_active_runs': 1} if incremental else {})) as dag:
+
+        # Create an instance of PythonOperator to extract and transform data, output to cloud storage and assumes we are using Composer (Airflow as a Service), this can easily be adapted
+        extract_and_transform_op = python_operator.PythonOperator(
+            task_id='transform_step',
+            provide_context=True,
+            python_callable=extract_and_transform_data,
+            op_kwargs={'table_config': table_config},
+            dag=dag
+        )
+
+        # Use the Cloud Storage to BigQuery operator and use the PARQUET generated shards to load data to temporary table
+        gcs_to_bq_op = gcs_to_bq.GoogleCloudStorageToBigQueryOperator(
+            task_id='to_bq_step',
+            bucket='{{ var.value.GCP_BUCKET_NAME }}',
+            source_objects=['data/' + dataset + '.' + table + '_transformed_{{ ds }}.*.parquet'],
+            destination_project_dataset_table='{{ var.value.GCP_PROJECT_NAME }}:dw_temporary' + '.' + table + '_{{ ds_nodash }}',
+            schema_fields=staging_schema_fields,
+            source_format='PARQUET',
+            skip_leading_rows=1,
+            write_disposition='WRITE_TRUNCATE',
+            dag=dag
+        )
+
+        # Merge the previously loaded data in the destination table, the statements are generated (once per process) from the schema definition and the table layout
+        bq_merge_query_op = bigquery_operator.BigQueryOperator(
+            task_id='merge_bq_step',
+            sql=';\n'.join(merge.merge_statements(
+                table_schema,
+                dataset + '.' + table,
+                'dw_temporary.' + table + '_{{ ds_nodash }}',
+                table_schema.layout(table_config['layout']),
+                incremental=incremental
+            )),
+            query_params=merge_key_range(table_schema, table_schema.layout(table_config['layout']), 'transform_step'),
+            use_legacy_sql=False,
+            dag=dag
+        )
+
+        # Promote the hashes of this run as the reference for the next incremental run
+        commit_snapshot_op = python_operator.PythonOperator(
+            task_id='commit_snapshot_step',
+            provide_context=True,
+            python_callable=commit_snapshot,
+            op_kwargs={'table_config': table_config},
+            dag=dag
+        )
+
+        # Delete the temporary table
+        bq_delete_op = bigquery_table_delete_operator.BigQueryTableDeleteOperator(
+            task_id='delete_bq_step',
+            deletion_dataset_table='{{ var.value.GCP_PROJECT_NAME }}.dw_temporary' + '.' + table + '_{{ ds_nodash }}',
+        )
+
+        # Clean the generated files, listed and deleted in batches through the Cloud Storage API of the bucket
+        clean_file_op = custom_clean_files_operator.CustomCleanFilesOperator(
+            task_id='clean_file_step',
+            files=['_transformed_', '_from_lucca_'],
+            dataset=dataset,
+            table_name=table,
+            date_str='{{ ds }}',
+            bucket='{{ var.value.GCP_BUCKET_NAME }}',
+            dag=dag
+        )
+
+        # Set the task dependencies being: extract & transform -> load in tmp table -> merge with destination table -> commit snapshot -> clean tmp table -> clean generated files
+        extract_and_transform_op >> gcs_to_bq_op >> bq_merge_query_op >> commit_snapshot_op >> bq_delete_op >> clean_file_op
+
+    return dag
+
+
+def create_backfill_dag(table_config):
+    """
+    Method used to create the backfill DAG of a configured table, triggered with {"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD"} as configuration.
+    The days are extracted concurrently and staged under one prefix, then loaded by a single load job and merged by a single MERGE
+    deduplicated by key (latest day wins), instead of one load/MERGE/DROP cycle per day.
+    """
+
+    dataset = table_config['dataset']
+    table = table_config['table']
+    table_schema = schema.get_table_schema(table)
+    temporary = 'dw_temporary.' + table + '_backfill_{{ ts_nodash }}'
+
+    # The snapshot of the incremental mode is not involved: backfilled days are staged in full, with the day they were extracted for
+    staging_schema_fields = schema.schema_fields(table_schema) + [dict(backfill.BACKFILL_DATE_FIELD)]
+
+    # Create a DAG instance, only run when triggered
+    with airflow.DAG(
+            dataset + '.' + table + '_backfill',
+            catchup=False,
+            default_args=default_args,
+            schedule_interval=None) as dag:
+
+        # Extract and transform every day of the range with bounded parallelism, all days are staged under one prefix
+        backfill_stage_op = python_operator.PythonOperator(
+            task_id='backfill_stage_step',
+            provide_context=True,
+            python_callable=backfill_lines,
+            op_kwargs={'table_config': table_config},
+            dag=dag
+        )
+
+        # Load the shards of every day to one temporary table with a single load job
+        gcs_to_bq_op = gcs_to_bq.GoogleCloudStorageToBigQueryOperator(
+            task_id='to_bq_step',
+            bucket='{{ var.value.GCP_BUCKET_NAME }}',
+            source_objects=['data/' + dataset + '.' + table + '_backfill_{{ ts_nodash }}.*.parquet'],
+            destination_project_dataset_table='{{ var.value.GCP_PROJECT_NAME }}:' + temporary,
+            schema_fields=staging_schema_fields,
+            source_format='PARQUET',
+            write_disposition='WRITE_TRUNCATE',
+            dag=dag
+        )
+
+        # Merge the latest version of each key in the destination table with a single MERGE
+        bq_merge_query_op = bigquery_operator.BigQueryOperator(
+            task_id='merge_bq_step',
+            sql=';\n'.join(merge.merge_statements(
+                table_schema,
+                dataset + '.' + table,
+                backfill.deduplicated_source(table_schema, temporary),
+                table_schema.layout(table_config['layout'])
+            )),
+            query_params=merge_key_range(table_schema, table_schema.layout(table_config['layout']), 'backfill_stage_step'),
+            use_legacy_sql=False,
+            dag=dag
+        )
+
+        # Delete the temporary table
+        bq_delete_op = bigquery_table_delete_operator.BigQueryTableDeleteOperator(
+            task_id='delete_bq_step',
+            deletion_dataset_table='{{ var.value.GCP_PROJECT_NAME }}.' + temporary,
+        )
+
+        # Clean the staging files of the backfill run
+        clean_file_op = custom_clean_files_operator.CustomCleanFilesOperator(
+            task_id='clean_file_step',
+            files=['_backfill_'],
+            dataset=dataset,
+            table_name=table,
+            date_str='{{ ts_nodash }}',
+            bucket='{{ var.value.GCP_BUCKET_NAME }}',
+            dag=dag
+        )
+
+        # Set the task dependencies being: stage the days -> load in tmp table -> merge with destination table -> clean tmp table -> clean generated files
+        backfill_stage_op >> gcs_to_bq_op >> bq_merge_query_op >> bq_delete_op >> clean_file_op
+
+    return dag
 
-    # Clean the generated files
-    clean_file_op = custom_clean_files_operator.CustomCleanFilesOperator(
-        task_id='clean_file_step',
-        files=['_transformed_', '_from_lucca_'],
-        dataset=GCP_DATASET_NAME,
-        table_name=GCP_TABLE_NAME,
-        date_str='{{ ds }}',
-        dag=dag
-    )
 
-    # Set the task dependencies being: extract & transform -> load in tmp table -> merge with destination table -> clean tmp table -> clean generated files
-    extract_and_transform_op >> gcs_to_bq_op >> bq_merge_query_op >> bq_delete_op >> clean_file_op
+# Register one DAG, and one backfill DAG, per configured table, the scheduler discovers them through the module globals
+for table_config in TABLE_CONFIGS:
+    for dag in [create_dag(table_config), create_backfill_dag(table_config)]:
+        globals()[dag.dag_id] = dag
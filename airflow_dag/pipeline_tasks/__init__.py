@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+"""
+Implementations of the DAG tasks, imported by the DAG callables when a task runs so that parsing a DAG file stays cheap.
+"""
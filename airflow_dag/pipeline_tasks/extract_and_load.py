@@ -0,0 +1,261 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import logging
+from airflow.exceptions import AirflowSkipException
+
+# Custom modules
+import lines_pipeline.backfill as backfill
+import lines_pipeline.cdc as cdc
+import lines_pipeline.extract as extract
+import lines_pipeline.http_client as http_client
+import lines_pipeline.instrumentation as instrumentation
+import lines_pipeline.merge as merge
+import lines_pipeline.parallel_transform as parallel_transform
+import lines_pipeline.response_cache as response_cache
+import lines_pipeline.schema as schema
+import lines_pipeline.staging as staging
+import lines_pipeline.validation as validation
+
+
+def staging_prefix(table_config, date_str):
+    """
+    Method used to build the prefix of the staging files: <dataset>.<table>_transformed_<date>, sharded as <prefix>.<shard>.parquet.
+    """
+
+    return table_config['staging_directory'] + table_config['dataset'] + '.' + table_config['table'] + '_transformed_' + date_str
+
+
+def snapshot_path(table_config):
+    """
+    Method used to build the path of the snapshot of the latest merged hashes, used by the incremental load mode.
+    """
+
+    return table_config['staging_directory'] + table_config['dataset'] + '.' + table_config['table'] + '_snapshot.parquet'
+
+
+def quarantine_path(table_config, run_tag):
+    """
+    Method used to build the path of the quarantine file of a run: <dataset>.<table>_quarantine_<run tag>.parquet, kept out of the staging files and of the clean step.
+    """
+
+    return table_config['staging_directory'] + table_config['dataset'] + '.' + table_config['table'] + '_quarantine_' + run_tag + '.parquet'
+
+
+def cache_directory(table_config):
+    """
+    Method used to build the directory of the cached API responses, in the staging directory so a retry running on another worker finds them.
+    """
+
+    return table_config['staging_directory'] + 'response_cache/' + table_config['dataset'] + '.' + table_config['table']
+
+
+def source_url():
+    """
+    Method used to read the base URL and endpoint of the API.
+    """
+
+    # Set the base URL and endpoint for the API --> In an Airflow context, we'd prefer to use set-up Connection rather than environment variables
+    # Additionally this might result in the creation of a dedicated Operator if it makes sense
+    return os.environ.get("SOURCE_API_BASE_URL", "default_base_url"), os.environ.get("SOURCE_API_ENDPOINT", "default_endpoint")
+
+
+def task_metrics(table_config, **kwargs):
+    """
+    Method used to create the metrics of a task, labelled with the table, the task and the run.
+    """
+
+    return instrumentation.PipelineMetrics(table_config['table'], labels={
+        'dataset': table_config['dataset'],
+        'task_id': kwargs['task'].task_id if 'task' in kwargs else '',
+        'run_id': kwargs.get('run_id', '')
+    })
+
+
+def export_metrics(metrics):
+    """
+    Method used to log the metrics of a task as JSON lines and, when configured, send them to StatsD (METRICS_STATSD_HOST/METRICS_STATSD_PORT).
+    Returns the metrics of each stage, pushed to XCom by the tasks.
+    """
+
+    metrics.export(log=logging.info, statsd_host=os.environ.get("METRICS_STATSD_HOST"), statsd_port=int(os.environ.get("METRICS_STATSD_PORT") or 8125))
+
+    return {name: stage.as_dict() for name, stage in metrics.stages.items()}
+
+
+def stage_lines(table_config, prefix, quarantine_file, change_detector=None, backfill_date=None, date_parameter=None, cache=None, metrics=None):
+    """
+    Method used to extract, validate and transform the lines, and write them to the staging files <prefix>.<shard>.parquet.
+    Rejected lines are written to the quarantine_file with their reasons instead of being staged.
+    With a response cache, a conditional request is sent and AirflowSkipException is raised when the response did not change since the latest successful run.
+    Backfilled days are requested with the date_parameter of the API when it has one.
+    Stages (extract, validate, transform, cdc, stage) are recorded in metrics.
+    Returns the staging writer, the range of the staged keys and the quarantine writer.
+    """
+
+    metrics = metrics or instrumentation.PipelineMetrics(table_config['table'])
+
+    base_url, endpoint = source_url()
+
+    table_schema = schema.get_table_schema(table_config['table'])
+    staging_schema_fields = schema.schema_fields(table_schema, incremental=change_detector is not None)
+
+    # Backfilled rows carry the day they were extracted for
+    if backfill_date is not None:
+        staging_schema_fields.append(dict(backfill.BACKFILL_DATE_FIELD))
+        if date_parameter:
+            endpoint = backfill.dated_endpoint(endpoint, date_parameter, backfill_date)
+
+    # Range of the loaded keys, pushed to the MERGE step
+    key_range = merge.KeyRange(table_schema.key)
+
+    # Stream the API response through the pooled session (timeouts, backoff retries and gzip) and write each transformed batch to the staging files
+    with http_client.ParallelExtractor(base_url) as extractor:
+
+        if cache is None:
+            batches = extract.stream_line_batches(extractor, endpoint, metrics=metrics)
+        else:
+            response = cache.get(extractor, endpoint)
+
+            # Nothing changed since the latest successful run, the downstream tasks are skipped
+            if response.unchanged:
+                raise AirflowSkipException('API response not modified since the latest successful run')
+
+            batches = extract.iter_response_batches(response, metrics=metrics)
+
+        # Split the lines breaking the constraints of the table to the quarantine file, only valid lines are transformed and staged
+        validator = validation.BatchValidator(table_schema)
+        quarantine = validation.QuarantineWriter(quarantine_file)
+        batches = validator.validate_batches(metrics.iter_stage('extract', batches, rows=lambda batch: batch.num_rows), quarantine=quarantine, metrics=metrics)
+
+        # Apply the column-wise transformation shared with the standalone script, in worker processes for large payloads
+        transformer = parallel_transform.ParallelTransformer(max_workers=table_config['transform_max_workers'], min_rows=table_config['transform_min_rows'])
+        frames = metrics.iter_stage('transform', transformer.transform_batches(batches), rows=lambda df: len(df.index))
+
+        with quarantine, staging.StagingParquetWriter(prefix, staging_schema_fields, codec=table_config['staging_codec']) as writer:
+            for df in frames:
+                if change_detector:
+                    with metrics.stage('cdc') as stage:
+                        stage.add(rows_in=len(df.index))
+                        df = change_detector.changes(df)
+                        stage.add(rows_out=len(df.index))
+
+                if backfill_date is not None:
+                    df[backfill.BACKFILL_DATE_FIELD['name']] = backfill_date
+
+                key_range.update(df)
+                with metrics.stage('stage') as stage:
+                    writer.write(df)
+                    stage.add(rows_in=len(df.index))
+
+            # Quarantined lines are neither shipped nor deleted, they keep their hash of the latest snapshot
+            if change_detector:
+                change_detector.retain(validator.quarantined_keys())
+                deleted_df = change_detector.deletions()
+                key_range.update(deleted_df)
+                with metrics.stage('stage') as stage:
+                    writer.write(deleted_df)
+                    stage.add(rows_in=len(deleted_df.index))
+
+        # Rows and bytes actually written to the staging files, once the last shard is closed
+        metrics.get('stage').add(rows_out=writer.rows_written, bytes_written=writer.bytes_written)
+
+    if quarantine.rows_written:
+        logging.warning('%d lines quarantined to %s (%s)', quarantine.rows_written, quarantine_file, validator.report())
+
+    return writer, key_range, quarantine
+
+
+def extract_and_transform_data(table_config, **kwargs):
+    """
+    Method used to extract and transform data.
+    """
+
+    incremental = table_config['load_mode'] == 'incremental'
+
+    # In incremental mode, only ship the lines that changed since the latest merged snapshot
+    change_detector = cdc.ChangeDetector(cdc.load_snapshot(snapshot_path(table_config))) if incremental else None
+
+    # The raw response is cached: a retry replays it instead of downloading it again, an unchanged response skips the run
+    cache = response_cache.ResponseCache(cache_directory(table_config))
+    metrics = task_metrics(table_config, **kwargs)
+
+    date_str = kwargs['execution_date'].strftime('%Y-%m-%d')
+    writer, key_range, quarantine = stage_lines(table_config, staging_prefix(table_config, date_str), quarantine_path(table_config, date_str), change_detector, cache=cache, metrics=metrics)
+
+    # Keep the hashes of this run aside (tagged with the run date, so another run never overwrites them), they become the reference once the MERGE succeeded
+    if change_detector:
+        cdc.save_snapshot(change_detector.current_hashes(), snapshot_path(table_config), run_tag=kwargs['ds_nodash'])
+
+    return {
+        'task_status': 'Transformation step: success',
+        'result_length': writer.rows_written,
+        'staging_files': writer.paths,
+        'quarantined_length': quarantine.rows_written,
+        'min_key': key_range.min_key or '',
+        'max_key': key_range.max_key or '',
+        'metrics': export_metrics(metrics)
+    }
+
+
+def backfill_prefix(table_config, run_tag):
+    """
+    Method used to build the prefix of the staging files of a backfill run: <dataset>.<table>_backfill_<run tag>, sharded as <prefix>.<date>.<shard>.parquet.
+    """
+
+    return table_config['staging_directory'] + table_config['dataset'] + '.' + table_config['table'] + '_backfill_' + run_tag
+
+
+def backfill_lines(table_config, **kwargs):
+    """
+    Method used to stage every day of the backfilled range (dag_run.conf start_date and end_date, the run date by default) with bounded parallelism.
+    All the days are staged under a single prefix so they are loaded by one load job and merged by one MERGE.
+    When the API has no date parameter (source_date_parameter) the payload is the same for every day, it is extracted and staged once.
+    """
+
+    conf = kwargs['dag_run'].conf or {}
+    days = backfill.date_range(conf.get('start_date', kwargs['ds']), conf.get('end_date', conf.get('start_date', kwargs['ds'])))
+    prefix = backfill_prefix(table_config, kwargs['ts_nodash'])
+    metrics = task_metrics(table_config, **kwargs)
+
+    date_parameter = table_config.get('source_date_parameter')
+    extracted_days = backfill.extracted_days(days, date_parameter)
+    if len(extracted_days) < len(days):
+        logging.info('The API has no date parameter, the payload of %s is extracted once for the %d days of the range', extracted_days[0], len(days))
+
+    def stage_day(day):
+        return stage_lines(table_config, prefix + '.' + day.isoformat(), quarantine_path(table_config, 'backfill_' + kwargs['ts_nodash'] + '_' + day.isoformat()), backfill_date=day, date_parameter=date_parameter, metrics=metrics)
+
+    staged = backfill.stage_days(extracted_days, stage_day, max_workers=table_config.get('backfill_max_workers', backfill.DEFAULT_MAX_WORKERS))
+
+    key_ranges = [key_range for _, key_range, _ in staged.values() if key_range.min_key is not None]
+
+    return {
+        'task_status': 'Backfill staging step: success',
+        'days': [day.isoformat() for day in days],
+        'extracted_days': [day.isoformat() for day in extracted_days],
+        'result_length': sum(writer.rows_written for writer, _, _ in staged.values()),
+        'staging_files': [path for writer, _, _ in staged.values() for path in writer.paths],
+        'quarantined_length': sum(quarantine.rows_written for _, _, quarantine in staged.values()),
+        'min_key': min((key_range.min_key for key_range in key_ranges), default=''),
+        'max_key': max((key_range.max_key for key_range in key_ranges), default=''),
+        'metrics': export_metrics(metrics)
+    }
+
+
+def commit_snapshot(table_config, **kwargs):
+    """
+    Method used to promote the snapshot of the hashes, and the cached API response, once the changes have been merged.
+    """
+
+    cdc.commit_snapshot(snapshot_path(table_config), run_tag=kwargs['ds_nodash'])
+
+    # The cached response has been processed, an unchanged response will now skip the next run
+    base_url, endpoint = source_url()
+    response_cache.ResponseCache(cache_directory(table_config)).commit(base_url + endpoint)
+
+    return {
+        'task_status': 'Snapshot commit step: success'
+    }
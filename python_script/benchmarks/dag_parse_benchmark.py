@@ -0,0 +1,115 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Parse-time benchmark of the DAG files: import time of the modules loaded at parse time, DagBag fill time, and heavy modules pulled in by the parse.
+Each measure runs in a fresh interpreter so already imported modules do not hide the cost.
+Run from the python_script folder: python3 -m benchmarks.dag_parse_benchmark [--max-seconds 2.0] [--allow-missing-airflow]
+Exits with status 1 when a heavy module is imported at parse time, when a measure exceeds --max-seconds, or when Airflow is not installed
+(the DAG file cannot be measured) unless --allow-missing-airflow is given, so it can run as a regression check.
+"""
+
+# Modules import
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Folders holding the DAG files and the lines_pipeline package (deployed next to the DAG files by Composer)
+DAG_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "airflow_dag")
+PIPELINE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only needed when a task runs, they must not be imported when a DAG file is parsed
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "requests", "google.cloud", "pipeline_tasks"]
+
+# Modules imported at parse time by the DAG files, measured even when Airflow is not installed
+PARSE_TIME_MODULES = ["lines_pipeline.schema", "lines_pipeline.merge", "lines_pipeline.backfill", "lines_pipeline.instrumentation"]
+
+# Code run in the fresh interpreter, prints the measure as JSON
+_IMPORT_PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+{generate}
+print(json.dumps({{"seconds": seconds, "heavy": [module for module in {heavy!r} if module in sys.modules]}}))
+"""
+
+_DAGBAG_PROBE = """
+import sys, json, time
+from airflow.models import DagBag
+start = time.perf_counter()
+dagbag = DagBag({dag_folder!r}, include_examples=False)
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "dags": len(dagbag.dags), "errors": {{path: str(error) for path, error in dagbag.import_errors.items()}}, "heavy": [module for module in {heavy!r} if module in sys.modules]}}))
+"""
+
+# Generation of the parse-time artifacts of the lines table, on top of the import of the modules
+_GENERATE_ARTIFACTS = """
+from lines_pipeline import merge, schema
+for layout in schema.LINES.layouts.values():
+    schema.schema_fields(schema.LINES, incremental=True)
+    merge.merge_statements(schema.LINES, "dataset.lines", "dw_temporary.lines", layout, incremental=True)
+seconds = time.perf_counter() - start
+"""
+
+
+def run_probe(code):
+    """
+    Method used to run a probe in a fresh interpreter, returning its measure or None when Airflow is not installed (any other error is raised).
+    """
+
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([DAG_FOLDER, PIPELINE_FOLDER, os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=environment)
+
+    if result.returncode != 0:
+        if "No module named 'airflow'" in result.stderr:
+            return None
+        raise RuntimeError(result.stderr)
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(max_seconds, allow_missing_airflow=False):
+    failures = []
+
+    print("%-40s %10s  %s" % ("measure", "seconds", "heavy modules"))
+
+    # Modules imported at parse time, with the generation of the SQL and schema_fields
+    probes = [(module, _IMPORT_PROBE.format(module=module, generate=_GENERATE_ARTIFACTS, heavy=HEAVY_MODULES)) for module in PARSE_TIME_MODULES]
+
+    # The DAG file itself and the DagBag fill, only when Airflow is installed
+    probes.append(("extract_and_load_dag", _IMPORT_PROBE.format(module="extract_and_load_dag", generate="", heavy=HEAVY_MODULES)))
+    probes.append(("DagBag(%s)" % os.path.basename(DAG_FOLDER), _DAGBAG_PROBE.format(dag_folder=DAG_FOLDER, heavy=HEAVY_MODULES)))
+
+    for name, code in probes:
+        measure = run_probe(code)
+
+        if measure is None:
+            print("%-40s %10s  %s" % (name, "-", "skipped, Airflow is not installed"))
+            if not allow_missing_airflow:
+                failures.append("%s could not be measured, Airflow is not installed (pass --allow-missing-airflow to only check the parse-time modules)" % name)
+            continue
+
+        print("%-40s %10.3f  %s" % (name, measure["seconds"], ", ".join(measure["heavy"]) or "none"))
+
+        if measure["heavy"]:
+            failures.append("%s imports %s at parse time" % (name, ", ".join(measure["heavy"])))
+        if measure["seconds"] > max_seconds:
+            failures.append("%s took %.3fs, more than %.3fs" % (name, measure["seconds"], max_seconds))
+        for path, error in measure.get("errors", {}).items():
+            failures.append("%s: %s" % (path, error))
+
+    for failure in failures:
+        print("FAILED: %s" % failure)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse-time benchmark of the DAG files.")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="maximum time allowed per measure")
+    parser.add_argument("--allow-missing-airflow", action="store_true", help="only check the parse-time modules when Airflow is not installed")
+    arguments = parser.parse_args()
+    sys.exit(main(arguments.max_seconds, allow_missing_airflow=arguments.allow_missing_airflow))
@@ -0,0 +1,127 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+In-memory fake of the BigQuery client surface used by the pipeline (get_table, query, load_table_from_dataframe),
+so the load and MERGE stages can be benchmarked offline with the lines_pipeline.bigquery_jobs.JobOrchestrator.
+It does not evaluate SQL: statements are recorded, tables are created and dropped by their DDL, and loaded dataframes are
+serialised to Parquet in memory as the real client does before uploading them. job_latency emulates the round trip of each job.
+"""
+
+# Modules import
+import io
+import re
+import time
+import itertools
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import exceptions
+
+# Table identifiers of the DDL statements handled by the fake
+_CREATE_TABLE = re.compile(r"CREATE TABLE IF NOT EXISTS\s+`?([\w.-]+)`?", re.IGNORECASE)
+_DROP_TABLE = re.compile(r"DROP TABLE IF EXISTS\s+`?([\w.-]+)`?", re.IGNORECASE)
+
+# Slot time charged per byte processed, to give the jobs statistics of a plausible magnitude
+_SLOT_MILLIS_PER_MEGABYTE = 50
+
+
+class FakeTable:
+    """
+    Metadata returned by FakeBigQueryClient.get_table.
+    """
+
+    def __init__(self, table_id, table) -> None:
+        self.table_id = table_id
+        self.schema = table.schema
+        self.num_rows = table.num_rows
+        self.num_bytes = table.nbytes
+
+
+class FakeJob:
+    """
+    Finished job of the fake client, result() waits for the emulated latency of the job from the time it was submitted.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, job_type, latency, total_bytes_processed=0, output_rows=None, statement=None) -> None:
+        self.job_id = "fake_%s_%d" % (job_type, next(self._ids))
+        self.job_type = job_type
+        self.statement = statement
+        self.total_bytes_processed = total_bytes_processed
+        self.slot_millis = int(total_bytes_processed / 1024 / 1024 * _SLOT_MILLIS_PER_MEGABYTE)
+        self.output_rows = output_rows
+        self._done_at = time.perf_counter() + latency
+
+    def done(self):
+        return time.perf_counter() >= self._done_at
+
+    def result(self):
+        remaining = self._done_at - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        return self
+
+
+class FakeBigQueryClient:
+    """
+    Fake BigQuery client holding tables as Arrow tables keyed by table id.
+    Every call is recorded in calls as (method, detail) so a benchmark can report the number of jobs and round trips.
+    """
+
+    def __init__(self, job_latency=0.0, tables=None) -> None:
+        self.job_latency = job_latency
+        self.tables = dict(tables or {})
+        self.calls = []
+
+    def _record(self, method, detail):
+        self.calls.append((method, detail))
+
+    def _bytes_referenced(self, statement):
+        # A query is charged the size of every table it references, as a full scan would be
+        return sum(table.nbytes for table_id, table in self.tables.items() if table_id in statement)
+
+    def get_table(self, table_id):
+        self._record("get_table", table_id)
+        if table_id not in self.tables:
+            raise exceptions.NotFound("Not found: Table %s" % table_id)
+        return FakeTable(table_id, self.tables[table_id])
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self._record("delete_table", table_id)
+        if self.tables.pop(table_id, None) is None and not not_found_ok:
+            raise exceptions.NotFound("Not found: Table %s" % table_id)
+
+    def query(self, statement, job_config=None):
+        self._record("query", statement)
+        total_bytes_processed = self._bytes_referenced(statement)
+
+        # Dry runs only report the bytes the statement would process
+        if job_config is not None and getattr(job_config, "dry_run", False):
+            return FakeJob("dry_run", 0.0, total_bytes_processed, statement=statement)
+
+        for table_id in _CREATE_TABLE.findall(statement):
+            self.tables.setdefault(table_id, pa.table({}))
+        for table_id in _DROP_TABLE.findall(statement):
+            self.tables.pop(table_id, None)
+
+        return FakeJob("query", self.job_latency, total_bytes_processed, statement=statement)
+
+    def load_table_from_dataframe(self, dataframe, destination, job_config=None):
+        self._record("load_table_from_dataframe", destination)
+
+        # The real client serialises the dataframe to Parquet before uploading it
+        table = pa.Table.from_pandas(dataframe, preserve_index=False)
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+        table = pq.read_table(io.BytesIO(buffer.getvalue()))
+
+        write_disposition = getattr(job_config, "write_disposition", None) or "WRITE_APPEND"
+        if write_disposition == "WRITE_APPEND" and destination in self.tables and self.tables[destination].num_columns:
+            table = pa.concat_tables([self.tables[destination], table.cast(self.tables[destination].schema)])
+        self.tables[destination] = table
+
+        return FakeJob("load", self.job_latency, len(buffer.getvalue()), output_rows=len(dataframe.index))
+
+    def job_count(self, method=None):
+        return sum(1 for call_method, _ in self.calls if method is None or call_method == method)
@@ -0,0 +1,563 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Offline benchmark of the pipeline: each stage in isolation (extract, fan-out crawl, validate, transform, cdc, load, merge) and the extract_and_load.py script end to end,
+fed by synthetic OVAPI payloads served by a local HTTP stub (benchmarks/stub_api.py) and loaded to an in-memory fake of BigQuery (benchmarks/fake_bigquery.py).
+Each case runs in a fresh interpreter so its peak memory is its own, and reports throughput, latency percentiles over the repeats and peak RSS.
+Run from the python_script folder: python3 -m benchmarks.pipeline_benchmark [--sizes 10000 100000] [--cases extract transform] [--save-baseline]
+Results are compared with the stored baseline (benchmarks/baseline.json, written by --save-baseline from a single run with its settings): exits with status 1
+when the median throughput drops, or a peak memory grows, by more than the tolerance of the case, or when the baseline was recorded with other settings
+or on another machine (--allow-other-machine only warns: throughputs measured on different hardware are not comparable).
+"""
+
+# Modules import
+import io
+import os
+import sys
+import json
+import math
+import atexit
+import time
+import shutil
+import runpy
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from unittest import mock
+
+# Custom modules
+from benchmarks import stub_api, synthetic
+from lines_pipeline import instrumentation
+
+# Folder holding the script and the lines_pipeline package, and the default baseline
+PIPELINE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(PIPELINE_FOLDER, "extract_and_load.py")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Default number of lines of the payloads, repeats per case and allowed regression against the baseline
+DEFAULT_SIZES = [10000, 100000]
+DEFAULT_REPEAT = 9
+DEFAULT_TOLERANCE = 0.3
+
+# Cases bound by the scheduling of threads, processes or sockets are noisier, they get a wider tolerance
+CASE_TOLERANCES = {"extract": 0.4, "fan_out": 0.5, "parallel_transform": 0.4, "end_to_end": 0.4, "end_to_end_incremental": 0.4}
+
+# Medians of fewer runs are too noisy to be compared, the comparison is reported as unreliable
+MIN_COMPARED_REPEAT = 5
+
+# Settings that change the measures, a baseline is only compared with runs sharing them (the repeat and the sizes are recorded but do not change a median)
+COMPARED_SETTINGS = ["api_latency", "api_bandwidth", "job_latency", "loader_backend"]
+
+# Fields of the machine a baseline is only compared on, absolute throughputs depend on them (fields missing from an older baseline are not compared)
+COMPARED_MACHINE_FIELDS = ["platform", "python", "processor", "cpu_count"]
+
+# Cases running faster than this in the baseline are dominated by noise, their throughput is reported but not compared
+MIN_COMPARABLE_SECONDS = 0.01
+
+# Shorter runs of a case are looped so each timing lasts at least this long (at most MAX_LOOPS runs), the timer and scheduler noise staying small
+MIN_RUN_SECONDS = 0.2
+MAX_LOOPS = 1000
+
+# Endpoints served by the stub for a payload size: the catalogue of a first run, and the catalogue of a later run for the incremental mode
+ENDPOINT = "/line/"
+MUTATED_ENDPOINT = "/line_mutated/"
+
+
+# Number of lines whose detail endpoint is served by the stub and crawled by the fan_out case
+FAN_OUT_LINES = 2000
+
+
+def machine_info():
+    """
+    Method used to describe the machine the benchmark runs on: platform, Python version, processor model and number of CPUs.
+    """
+
+    processor = platform.processor()
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as cpuinfo:
+            processor = next((line.split(":", 1)[1].strip() for line in cpuinfo if line.startswith("model name")), processor)
+    except OSError:
+        pass
+
+    return {"platform": platform.platform(), "python": platform.python_version(), "processor": processor, "cpu_count": os.cpu_count()}
+
+
+def machine_mismatch(stored, current):
+    """
+    Method used to list the fields of the machine differing between a baseline (its machine, None when not recorded) and the current run.
+    """
+
+    if not stored:
+        return ["machine not recorded in the baseline"]
+
+    return ["%s=%s (baseline %s)" % (field, current[field], stored[field]) for field in COMPARED_MACHINE_FIELDS if field in stored and stored[field] != current[field]]
+
+
+def size_base_url(base_url, size):
+    return base_url + "/" + str(size)
+
+
+def fetch_batches(base_url, endpoint, batch_size=None):
+    """
+    Method used to download and parse a payload of the stub into raw Arrow record batches, the input of the transform step.
+    """
+
+    from lines_pipeline import extract, http_client
+
+    with http_client.ParallelExtractor(base_url) as extractor:
+        return list(extract.stream_line_batches(extractor, endpoint, batch_size=batch_size or extract.DEFAULT_BATCH_SIZE))
+
+
+def transformed_frames(base_url, endpoint):
+    from lines_pipeline import transform
+
+    return [transform.transform_batch(batch) for batch in fetch_batches(base_url, endpoint)]
+
+
+def case_extract(base_url, size, options):
+    """
+    Streamed download and incremental parsing of the payload into raw Arrow record batches.
+    """
+
+    def run():
+        return sum(batch.num_rows for batch in fetch_batches(base_url, ENDPOINT))
+
+    return run
+
+
+def case_fan_out(base_url, size, options):
+    """
+    Crawl of the per-line detail endpoints of the first FAN_OUT_LINES lines of the catalogue, fanned out over the pooled extractor.
+    """
+
+    from lines_pipeline import http_client
+
+    line_ids = list(synthetic.synthetic_lines(min(size, FAN_OUT_LINES)))
+
+    def run():
+        with http_client.ParallelExtractor(base_url) as extractor:
+            return len(extractor.fetch_all(http_client.line_detail_endpoints(ENDPOINT, line_ids)))
+
+    return run
+
+
+def case_validate(base_url, size, options):
+    """
+    Validation of the raw record batches against the constraints of the table, duplicate keys included.
+    """
+
+    from lines_pipeline import schema, validation
+
+    batches = fetch_batches(base_url, ENDPOINT)
+
+    def run():
+        validator = validation.BatchValidator(schema.LINES)
+        return sum(validator.split(batch)[0].num_rows for batch in batches) + validator.rows_quarantined
+
+    return run
+
+
+def case_transform(base_url, size, options):
+    """
+    Transform of the raw record batches into the dataframes loaded to the temporary table.
+    """
+
+    from lines_pipeline import transform
+
+    batches = fetch_batches(base_url, ENDPOINT)
+
+    def run():
+        return sum(len(transform.transform_batch(batch).index) for batch in batches)
+
+    return run
+
+
+def case_parallel_transform(base_url, size, options):
+    """
+    Transform of the raw record batches over a pool of one worker process per CPU, partitions exchanged through shared memory.
+    """
+
+    from lines_pipeline import parallel_transform
+
+    batches = fetch_batches(base_url, ENDPOINT)
+    transformer = parallel_transform.ParallelTransformer(min_rows=0)
+
+    def run():
+        return sum(len(df.index) for df in transformer.transform_batches(batches))
+
+    return run
+
+
+def case_cdc(base_url, size, options):
+    """
+    Change detection of a later catalogue (2% updated, 0.5% deleted, 0.5% inserted lines) against the snapshot of the first one.
+    """
+
+    import pandas as pd
+    from lines_pipeline import cdc
+
+    hashes = pd.concat([cdc.hash_lines(df) for df in transformed_frames(base_url, ENDPOINT)])
+    frames = transformed_frames(base_url, MUTATED_ENDPOINT)
+
+    def run():
+        change_detector = cdc.ChangeDetector(hashes)
+        for df in frames:
+            change_detector.changes(df)
+        change_detector.deletions()
+        return sum(len(df.index) for df in frames)
+
+    return run
+
+
+def case_load(base_url, size, options):
+    """
+    Load of the transformed dataframes to the temporary table through the job orchestrator and the configured loader backend.
+    """
+
+    from lines_pipeline import bigquery_jobs, loaders
+    from benchmarks import fake_bigquery
+
+    frames = transformed_frames(base_url, ENDPOINT)
+
+    def run():
+        client = fake_bigquery.FakeBigQueryClient(job_latency=options["job_latency"])
+        sink = loaders.RecordingSink() if options["loader_backend"] == "streaming" else None
+        orchestrator = bigquery_jobs.JobOrchestrator(client, "project.dataset.lines", "project.dw_temporary.lines", "", loader_backend=options["loader_backend"], sink=sink)
+        try:
+            return orchestrator.load_frames(iter(frames))
+        finally:
+            orchestrator.close()
+
+    return run
+
+
+def case_merge(base_url, size, options):
+    """
+    Generation of the MERGE statements and submission of the MERGE and DROP script job, dry run included.
+    """
+
+    from lines_pipeline import bigquery_jobs, merge, schema
+    from benchmarks import fake_bigquery
+
+    layout = schema.LINES.layout("current_and_history")
+    key_range = merge.KeyRange(schema.LINES.key)
+    for df in transformed_frames(base_url, ENDPOINT):
+        key_range.update(df)
+
+    def run():
+        client = fake_bigquery.FakeBigQueryClient(job_latency=options["job_latency"])
+        orchestrator = bigquery_jobs.JobOrchestrator(client, "project.dataset.lines", "project.dw_temporary.lines", "")
+        try:
+            statements = merge.merge_statements(schema.LINES, "project.dataset.lines", "project.dw_temporary.lines", layout)
+            parameters = merge.key_range_parameters(schema.LINES, layout, key_range.min_key, key_range.max_key)
+            orchestrator.estimate_merge_bytes(statements, parameters)
+            orchestrator.merge_and_drop(statements, parameters)
+        finally:
+            orchestrator.close()
+        return size
+
+    return run
+
+
+def run_script(base_url, endpoint, environment, fake_client):
+    """
+    Method used to run extract_and_load.py in process against the stub and the fake client, returning its output.
+    """
+
+    from google.cloud import bigquery
+    from lines_pipeline import bigquery_jobs
+
+    # Every run starts without table metadata cached, as a fresh process would
+    bigquery_jobs._TABLE_CACHE.clear()
+
+    # The script builds its client from a service account file, the fake is returned instead
+    output = io.StringIO()
+    environment = dict(environment, SOURCE_API_BASE_URL=base_url, SOURCE_API_ENDPOINT=endpoint)
+
+    exit_code = 0
+    try:
+        with mock.patch.dict(os.environ, environment), mock.patch.object(bigquery.Client, "from_service_account_json", lambda *args, **kwargs: fake_client), contextlib.redirect_stdout(output):
+            runpy.run_path(SCRIPT_PATH, run_name="__main__")
+    except SystemExit as e:
+        exit_code = e.code
+
+    # The script exits with the code of the failed stage, a run is successful once the temporary table is deleted
+    if exit_code or "Temporary table deleted" not in output.getvalue():
+        raise RuntimeError("extract_and_load.py failed (exit code %s):\n%s" % (exit_code, output.getvalue()))
+
+    return output.getvalue()
+
+
+def case_end_to_end(base_url, size, options):
+    """
+    extract_and_load.py end to end, in full mode: conditional request, streamed extract, transform, load, MERGE and DROP.
+    """
+
+    from benchmarks import fake_bigquery
+
+    workspace = tempfile.mkdtemp(prefix="lines_benchmark_")
+    atexit.register(shutil.rmtree, workspace, True)
+
+    def run():
+        # A fresh response cache per run, otherwise the stub answers 304 and the run is skipped
+        environment = {
+            "GCP_TABLE": "lines",
+            "LOAD_MODE": "full",
+            "LOADER_BACKEND": options["loader_backend"],
+            "TABLE_LAYOUT": "current_and_history",
+            "RESPONSE_CACHE_DIRECTORY": tempfile.mkdtemp(dir=workspace),
+            "CDC_SNAPSHOT_PATH": os.path.join(workspace, "lines_hashes.parquet"),
+            "CHECKPOINT_DIRECTORY": os.path.join(workspace, "checkpoints"),
+        }
+        run_script(base_url, ENDPOINT, environment, fake_bigquery.FakeBigQueryClient(job_latency=options["job_latency"]))
+        return size
+
+    return run
+
+
+def case_end_to_end_incremental(base_url, size, options):
+    """
+    extract_and_load.py end to end, in incremental mode: a later catalogue compared with the snapshot of the first one, only changes are shipped.
+    """
+
+    from benchmarks import fake_bigquery
+
+    workspace = tempfile.mkdtemp(prefix="lines_benchmark_")
+    atexit.register(shutil.rmtree, workspace, True)
+    snapshot_path = os.path.join(workspace, "lines_hashes.parquet")
+    environment = {"GCP_TABLE": "lines", "LOAD_MODE": "incremental", "LOADER_BACKEND": options["loader_backend"], "TABLE_LAYOUT": "current_and_history", "CDC_SNAPSHOT_PATH": snapshot_path,
+                   "CHECKPOINT_DIRECTORY": os.path.join(workspace, "checkpoints")}
+
+    # Build the snapshot of the first catalogue once, every run starts from it
+    run_script(base_url, ENDPOINT, dict(environment, RESPONSE_CACHE_DIRECTORY=tempfile.mkdtemp(dir=workspace)), fake_bigquery.FakeBigQueryClient())
+    shutil.copy(snapshot_path, snapshot_path + ".reference")
+
+    def run():
+        shutil.copy(snapshot_path + ".reference", snapshot_path)
+        run_script(base_url, MUTATED_ENDPOINT, dict(environment, RESPONSE_CACHE_DIRECTORY=tempfile.mkdtemp(dir=workspace)), fake_bigquery.FakeBigQueryClient(job_latency=options["job_latency"]))
+        return size
+
+    return run
+
+
+# Cases of the benchmark, in the order of the flow
+CASES = {
+    "extract": case_extract,
+    "fan_out": case_fan_out,
+    "validate": case_validate,
+    "transform": case_transform,
+    "parallel_transform": case_parallel_transform,
+    "cdc": case_cdc,
+    "load": case_load,
+    "merge": case_merge,
+    "end_to_end": case_end_to_end,
+    "end_to_end_incremental": case_end_to_end_incremental,
+}
+
+
+def percentile(values, rank):
+    """
+    Method used to return the nearest-rank percentile of a list of values.
+    """
+
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(rank / 100.0 * len(ordered) + 0.5)) - 1))
+
+    return ordered[index]
+
+
+def run_case(name, base_url, size, repeat, options):
+    """
+    Method used to run a case in the current interpreter (called in the fresh interpreter started by measure_case), returning its measure.
+    The first run warms the imports and caches up and is not measured, the second one sets the number of runs looped in each timing.
+    """
+
+    run = CASES[name](size_base_url(base_url, size), size, options)
+    rss_before = instrumentation.peak_rss_bytes()
+    run()
+
+    start = time.perf_counter()
+    run()
+    loops = max(1, min(MAX_LOOPS, int(math.ceil(MIN_RUN_SECONDS / max(time.perf_counter() - start, 1e-9)))))
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            rows = run()
+        timings.append((time.perf_counter() - start) / loops)
+
+    peak_rss = instrumentation.peak_rss_bytes()
+    median = percentile(timings, 50)
+
+    return {
+        "rows": rows,
+        "loops": loops,
+        "rows_per_second": rows / median if median else None,
+        "p50_seconds": median,
+        "p95_seconds": percentile(timings, 95),
+        "p99_seconds": percentile(timings, 99),
+        "peak_rss_bytes": peak_rss,
+        "peak_rss_increase_bytes": peak_rss - rss_before if peak_rss is not None else None,
+    }
+
+
+def measure_case(name, base_url, size, repeat, options):
+    """
+    Method used to run a case in a fresh interpreter, returning its measure or None when a module is missing.
+    """
+
+    command = [sys.executable, "-m", "benchmarks.pipeline_benchmark", "--run-case", name, "--base-url", base_url, "--sizes", str(size), "--repeat", str(repeat),
+               "--job-latency", str(options["job_latency"]), "--loader-backend", options["loader_backend"]]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=PIPELINE_FOLDER)
+
+    if result.returncode != 0:
+        if "ModuleNotFoundError" in result.stderr:
+            return None
+        raise RuntimeError(result.stderr)
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def case_tolerance(key, tolerance=None):
+    """
+    Method used to return the tolerance of a case (<case>@<size>): the --tolerance given on the command line, or the tolerance of the case.
+    """
+
+    if tolerance is not None:
+        return tolerance
+
+    return CASE_TOLERANCES.get(key.split("@")[0], DEFAULT_TOLERANCE)
+
+
+def compare(results, baseline, tolerance=None):
+    """
+    Method used to compare the median throughput and the peak memory of the results with the baseline, returning the regressions beyond the tolerance of each case.
+    """
+
+    failures = []
+    for key, measure in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            continue
+
+        allowed = case_tolerance(key, tolerance)
+
+        comparable = reference.get("p50_seconds", 0) >= MIN_COMPARABLE_SECONDS
+        if comparable and measure["rows_per_second"] and reference.get("rows_per_second") and measure["rows_per_second"] < reference["rows_per_second"] * (1 - allowed):
+            failures.append("%s: %.0f rows/s, baseline %.0f rows/s (tolerance %d%%)" % (key, measure["rows_per_second"], reference["rows_per_second"], allowed * 100))
+
+        if measure["peak_rss_bytes"] and reference.get("peak_rss_bytes") and measure["peak_rss_bytes"] > reference["peak_rss_bytes"] * (1 + allowed):
+            failures.append("%s: peak RSS %.1f MiB, baseline %.1f MiB (tolerance %d%%)" % (key, measure["peak_rss_bytes"] / 2 ** 20, reference["peak_rss_bytes"] / 2 ** 20, allowed * 100))
+
+    return failures
+
+
+def main(arguments):
+    options = {"job_latency": arguments.job_latency, "loader_backend": arguments.loader_backend}
+
+    # Payloads of the first and of a later run, per size, served under /<size>/
+    payloads = {}
+    for size in arguments.sizes:
+        data = synthetic.synthetic_lines(size)
+        payloads["/%d%s" % (size, ENDPOINT)] = synthetic.payload(data)
+        payloads["/%d%s" % (size, MUTATED_ENDPOINT)] = synthetic.payload(synthetic.mutate_lines(data))
+        if "fan_out" in arguments.cases:
+            payloads.update(synthetic.line_details(dict(list(data.items())[:FAN_OUT_LINES]), endpoint="/%d%s" % (size, ENDPOINT)))
+
+    settings = {"repeat": arguments.repeat, "sizes": arguments.sizes, "cases": arguments.cases, "api_latency": arguments.api_latency, "api_bandwidth": arguments.api_bandwidth,
+                "job_latency": arguments.job_latency, "loader_backend": arguments.loader_backend}
+    machine = machine_info()
+    results = {}
+
+    # Baseline of the comparison, never used when it was measured with other settings, nor on another machine unless allowed
+    baseline = {}
+    mismatch = None
+    other_machine = None
+    if not arguments.save_baseline and os.path.exists(arguments.baseline):
+        with open(arguments.baseline, encoding="utf-8") as baseline_file:
+            stored = json.load(baseline_file)
+        mismatch = ["%s=%s (baseline %s)" % (setting, settings[setting], stored.get("settings", {}).get(setting)) for setting in COMPARED_SETTINGS if stored.get("settings", {}).get(setting) != settings[setting]]
+        other_machine = machine_mismatch(stored.get("machine"), machine)
+        if not mismatch and (not other_machine or arguments.allow_other_machine):
+            baseline = stored.get("results", {})
+
+    print("%-32s %12s %14s %12s %10s %10s %12s %12s" % ("case", "lines", "rows/s", "payload MB/s", "p50 (s)", "p95 (s)", "peak RSS", "baseline"))
+
+    with stub_api.StubApiServer(payloads, latency=arguments.api_latency, bandwidth=arguments.api_bandwidth) as server:
+        for name in arguments.cases:
+            for size in arguments.sizes:
+                key = "%s@%d" % (name, size)
+                measure = measure_case(name, server.base_url, size, arguments.repeat, options)
+
+                if measure is None:
+                    print("%-32s %12d %14s  %s" % (name, size, "-", "skipped, a module is missing (google-cloud-bigquery not installed?)"))
+                    continue
+
+                results[key] = measure
+                megabytes = len(payloads["/%d%s" % (size, ENDPOINT)]) / 1e6
+                reference = baseline.get(key, {}).get("rows_per_second")
+                print("%-32s %12d %14.0f %12.1f %10.4f %10.4f %9.1fMiB %12s" % (
+                    name, size, measure["rows_per_second"], megabytes / measure["p50_seconds"], measure["p50_seconds"], measure["p95_seconds"],
+                    (measure["peak_rss_bytes"] or 0) / 2 ** 20, "%+.0f%%" % ((measure["rows_per_second"] / reference - 1) * 100) if reference else "-"
+                ))
+
+    # The baseline only holds the results of this run, with the settings they were measured with
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump({"machine": machine, "settings": settings, "results": results}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print("Baseline written: %s" % arguments.baseline)
+        return 0
+
+    if mismatch:
+        print("NOT COMPARED: the baseline was measured with other settings: %s, rerun with its settings or record a new baseline with --save-baseline" % ", ".join(mismatch))
+        return 1
+
+    if other_machine:
+        if not arguments.allow_other_machine:
+            print("NOT COMPARED: the baseline was measured on another machine: %s, record a baseline on this machine with --save-baseline (or pass --allow-other-machine to compare anyway)" % ", ".join(other_machine))
+            return 1
+        print("WARNING: the baseline was measured on another machine: %s, throughputs are not comparable across hardware" % ", ".join(other_machine))
+
+    if arguments.repeat < MIN_COMPARED_REPEAT:
+        print("WARNING: medians of %d runs are noisy, use --repeat %d or more for a reliable comparison" % (arguments.repeat, MIN_COMPARED_REPEAT))
+
+    missing = [key for key in results if key not in baseline]
+    if missing:
+        print("NOT COMPARED: no baseline for %s" % ", ".join(missing))
+
+    failures = compare(results, baseline, arguments.tolerance)
+    for failure in failures:
+        print("REGRESSION: %s" % failure)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the pipeline stages and of the script end to end.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="number of lines of the synthetic payloads")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES), help="cases to run")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="measured runs per case, after one warm-up run")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="time to first byte of the stub API, in seconds")
+    parser.add_argument("--api-bandwidth", type=float, default=None, help="bandwidth of the stub API, in bytes per second")
+    parser.add_argument("--job-latency", type=float, default=0.0, help="duration of each job of the fake BigQuery client, in seconds")
+    parser.add_argument("--loader-backend", choices=["batch", "streaming"], default="batch", help="loader backend of the load and end to end cases")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file the results are compared with")
+    parser.add_argument("--save-baseline", action="store_true", help="replace the baseline with the results and the settings of this run instead of comparing")
+    parser.add_argument("--allow-other-machine", action="store_true", help="compare with a baseline measured on another machine, only warning about it")
+    parser.add_argument("--tolerance", type=float, default=None, help="allowed throughput drop and peak memory growth against the baseline, for every case (defaults to the tolerance of each case)")
+    parser.add_argument("--run-case", choices=list(CASES), help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    # Fresh interpreter started by measure_case: run a single case and print its measure as JSON
+    if arguments.run_case:
+        options = {"job_latency": arguments.job_latency, "loader_backend": arguments.loader_backend}
+        print(json.dumps(run_case(arguments.run_case, arguments.base_url, arguments.sizes[0], arguments.repeat, options)))
+        sys.exit(0)
+
+    sys.exit(main(arguments))
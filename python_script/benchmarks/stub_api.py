@@ -0,0 +1,114 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Local HTTP stub of the OVAPI, serving synthetic payloads so the extraction can be benchmarked without the network.
+Bodies are streamed in chunks, gzip-compressed when the client accepts it, and carry an ETag honoured through If-None-Match.
+latency (time to first byte) and bandwidth (bytes per second) can be set to emulate a remote API.
+"""
+
+# Modules import
+import gzip
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Size of the chunks written to the socket
+CHUNK_SIZE = 64 * 1024
+
+
+class _Body:
+    """
+    Body served on a path, with its compressed version and validator computed once.
+    """
+
+    def __init__(self, content) -> None:
+        self.content = content
+        self.gzipped = gzip.compress(content, compresslevel=6)
+        self.etag = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are written separately: without TCP_NODELAY, delayed ACKs add ~40ms to every keep-alive request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # Keep the benchmark output readable
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        body = server.bodies.get(self.path)
+
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if self.headers.get("If-None-Match") == body.etag:
+            self.send_response(304)
+            self.send_header("ETag", body.etag)
+            self.end_headers()
+            return
+
+        gzipped = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        content = body.gzipped if gzipped else body.content
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", body.etag)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+
+        # Stream the body, throttled to the configured bandwidth
+        for start in range(0, len(content), CHUNK_SIZE):
+            chunk = content[start:start + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            if server.bandwidth:
+                time.sleep(len(chunk) / server.bandwidth)
+
+
+class StubApiServer:
+    """
+    Threaded HTTP server bound to an ephemeral local port, serving {path: payload bytes}.
+    Used as a context manager: the server runs in a background thread and base_url points to it.
+    """
+
+    def __init__(self, payloads, latency=0.0, bandwidth=None) -> None:
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.bodies = {path: _Body(content) for path, content in payloads.items()}
+        self._server.latency = latency
+        self._server.bandwidth = bandwidth
+        self._server.requests = 0
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-api", daemon=True)
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%d" % self._server.server_address[1]
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    def set_payload(self, path, content):
+        self._server.bodies[path] = _Body(content)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
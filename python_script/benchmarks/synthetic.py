@@ -0,0 +1,123 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Synthetic OVAPI /line/ payloads used by the benchmarks, generated offline and reproducible from a seed.
+Keys follow the <DataOwnerCode>_<LinePlanningNumber>_<LineDirection> shape of the API, with a few large operators owning most of the lines,
+most lines communicated in both directions, and the occasional unknown transport type or missing field.
+"""
+
+# Modules import
+import json
+import random
+
+# Operators of the catalogue, their share of the lines and the transport types they run (the first one being the most frequent)
+OPERATORS = [
+    ("ARR", 0.22, ["BUS", "TRAIN"]),
+    ("QBUZZ", 0.18, ["BUS", "TRAM"]),
+    ("CXX", 0.15, ["BUS"]),
+    ("EBS", 0.10, ["BUS"]),
+    ("RET", 0.09, ["BUS", "TRAM", "METRO", "BOAT"]),
+    ("GVB", 0.08, ["BUS", "TRAM", "METRO", "BOAT"]),
+    ("HTM", 0.06, ["TRAM", "BUS"]),
+    ("KEOLIS", 0.05, ["BUS", "TRAIN"]),
+    ("NS", 0.04, ["TRAIN"]),
+    ("WSF", 0.03, ["BOAT", "FERRY"]),
+]
+
+# Share of the lines communicated in one direction only, with an unknown transport type or without destination
+ONE_DIRECTION_RATIO = 0.1
+UNKNOWN_TRANSPORT_TYPE_RATIO = 0.01
+MISSING_DESTINATION_RATIO = 0.005
+
+
+def synthetic_lines(size, seed=42):
+    """
+    Method used to generate an OVAPI-shaped /line/ payload (dict keyed by line identifier) of the given number of lines.
+    """
+
+    rng = random.Random(seed)
+    owners = [owner for owner, _, _ in OPERATORS]
+    weights = [weight for _, weight, _ in OPERATORS]
+    transport_types = {owner: types for owner, _, types in OPERATORS}
+    next_planning_number = dict.fromkeys(owners, 0)
+
+    data = {}
+    while len(data) < size:
+        data_owner_code = rng.choices(owners, weights)[0]
+
+        # Planning numbers are unique per operator, night and express lines carry a letter prefix
+        next_planning_number[data_owner_code] += rng.randint(1, 3)
+        number = next_planning_number[data_owner_code]
+        line_planning_number = rng.choice(["", "", "", "", "N", "M"]) + str(number)
+        line_public_number = line_planning_number if rng.random() < 0.8 else str(number % 1000)
+
+        # Transport types are skewed towards the main one of the operator
+        operator_types = transport_types[data_owner_code]
+        transport_type = operator_types[0] if rng.random() < 0.7 else rng.choice(operator_types)
+        if rng.random() < UNKNOWN_TRANSPORT_TYPE_RATIO:
+            transport_type = None
+
+        destinations = ["Centraal Station", "Station " + str(rng.randint(1, 400)), "Ziekenhuis", "Busstation " + str(rng.randint(1, 200)), "P+R " + str(rng.randint(1, 50))]
+        directions = [1] if rng.random() < ONE_DIRECTION_RATIO else [1, 2]
+
+        for line_direction in directions:
+            if len(data) >= size:
+                break
+
+            line = {
+                "LineWheelchairAccessible": rng.choice(["ACCESSIBLE", "NOTACCESSIBLE", "UNKNOWN"]),
+                "TransportType": transport_type,
+                "DestinationName50": rng.choice(destinations),
+                "DataOwnerCode": data_owner_code,
+                "DestinationCode": str(rng.randint(1000, 99999)),
+                "LinePublicNumber": line_public_number,
+                "LinePlanningNumber": line_planning_number,
+                "LineName": data_owner_code + " " + line_public_number + " " + rng.choice(destinations),
+                "LineDirection": line_direction,
+            }
+            if rng.random() < MISSING_DESTINATION_RATIO:
+                del line["DestinationName50"]
+
+            data[data_owner_code + "_" + line_planning_number + "_" + str(line_direction)] = line
+
+    return data
+
+
+def mutate_lines(data, changed_ratio=0.02, deleted_ratio=0.005, inserted_ratio=0.005, seed=7):
+    """
+    Method used to derive the payload of a later run: a share of the lines changes destination, some disappear and some new ones appear.
+    Used to benchmark the incremental mode against a snapshot of the original payload.
+    """
+
+    rng = random.Random(seed)
+    mutated = {}
+
+    for pk_line_id, line in data.items():
+        draw = rng.random()
+        if draw < deleted_ratio:
+            continue
+        if draw < deleted_ratio + changed_ratio:
+            line = dict(line, DestinationName50="Omleiding " + str(rng.randint(1, 100)))
+        mutated[pk_line_id] = line
+
+    for pk_line_id, line in synthetic_lines(int(len(data) * inserted_ratio), seed=seed).items():
+        mutated["NEW" + pk_line_id] = dict(line, DataOwnerCode="NEW" + line["DataOwnerCode"])
+
+    return mutated
+
+
+def payload(data):
+    """
+    Method used to serialise a payload the way the API sends it (compact JSON object, UTF-8).
+    """
+
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def line_details(data, endpoint="/line/"):
+    """
+    Method used to build the per-line detail payloads of a catalogue ({<endpoint><line id>: payload}), shaped as the /line/<id> resource of the API.
+    """
+
+    return {endpoint + pk_line_id: payload({pk_line_id: {"Line": line}}) for pk_line_id, line in data.items()}
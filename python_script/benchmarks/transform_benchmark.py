@@ -0,0 +1,80 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark of the transform step: per-line Python loop (historical implementation) against the column-wise transform.
+Run from the python_script folder: python3 -m benchmarks.transform_benchmark [sizes...]
+"""
+
+# Modules import
+import sys
+import time
+import uuid
+import pandas as pd
+
+# Custom modules
+from benchmarks.synthetic import synthetic_lines
+from lines_pipeline import transform
+
+# Default number of synthetic lines to benchmark
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+def loop_transform(data):
+    """
+    Historical transform: one Python iteration per line and a list of tuples copied into a dataframe.
+    """
+
+    rows = []
+    for pk_line_id, line_data in data.items():
+        line_name = line_data.get("LineName", None)
+        transport_type = line_data.get("TransportType") if line_data.get("TransportType") in ['BUS', 'TRAIN', 'METRO', 'BOAT', 'TRAM'] else None
+        line_public_number = line_data.get("LinePublicNumber", None)
+        data_owner_code = line_data.get("DataOwnerCode", None)
+        destination_name_50 = line_data.get("DestinationName50", None)
+        line_planning_number = line_data.get("LinePlanningNumber", None)
+        line_direction = line_data.get("LineDirection", None)
+        source_system = "http://v0.ovapi.nl/line/"
+        uuid_line = str(uuid.uuid4())
+        rows.append((uuid_line, pk_line_id, line_name, transport_type, line_public_number, data_owner_code, destination_name_50, line_planning_number, line_direction, source_system))
+
+    return pd.DataFrame(rows, columns=transform.OUTPUT_COLUMNS)
+
+
+def columnar_transform(data):
+    """
+    Column-wise transform shared by the script and the DAG.
+    """
+
+    return transform.transform_lines(transform.records_to_frame(data))
+
+
+def measure(function, data, repeat=3):
+    """
+    Method used to return the best wall-clock time of several runs.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def main(sizes):
+    print("%10s %18s %18s %8s" % ("lines", "loop rows/s", "columnar rows/s", "speedup"))
+
+    for size in sizes:
+        data = synthetic_lines(size)
+        repeat = 1 if size >= 1000000 else 3
+
+        loop_seconds = measure(loop_transform, data, repeat)
+        columnar_seconds = measure(columnar_transform, data, repeat)
+
+        print("%10d %18.0f %18.0f %7.1fx" % (size, size / loop_seconds, size / columnar_seconds, loop_seconds / columnar_seconds))
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
@@ -4,231 +4,382 @@
 # Import packages
 import os
 import sys
-import uuid
-import requests
-import pandas as pd
-from google.cloud import bigquery, exceptions
-
-# Import keyfile
-service_account_json = os.environ.get("GCP_SERVICE_ACCOUNT_FILEPATH", "default_file_path")
-
-# Set the project, dataset and table name
-gcp_project = os.environ.get("GCP_PROJECT", "default_gcp_project")
-gcp_dataset = os.environ.get("GCP_DATASET", "default_gcp_dataset")
-gcp_table = os.environ.get("GCP_TABLE", "default_gcp_table")
-
-# Build GCP destination and temporary destination using project, dataset and table names
-gcp_destination = gcp_project + "." + gcp_dataset + "." + gcp_table
-gcp_temporary = gcp_project + ".dw_temporary." + gcp_table
-
-# Set the base URL and endpoint for the API
-base_url = os.environ.get("SOURCE_API_BASE_URL", "default_base_url")
-endpoint = os.environ.get("SOURCE_API_ENDPOINT", "default_endpoint")
-
-# Send the request to the API
-response = requests.get(base_url + endpoint)
-
-# Check if the request was successful
-if response.status_code == 200:
-
-    # Extract the data from the response
-    data = response.json()
-
-    # Create a list to store the data
-    rows = []
-
-    # Iterate over the lines in the data
-    for pk_line_id, line_data in data.items():
-        # Extract the fields we are interested in
-        line_name = line_data.get("LineName", None)
-        transport_type = line_data.get("TransportType") if line_data.get("TransportType") in ['BUS', 'TRAIN', 'METRO', 'BOAT', 'TRAM'] else None
-        line_public_number = line_data.get("LinePublicNumber", None)
-        data_owner_code = line_data.get("DataOwnerCode", None)
-        destination_name_50 = line_data.get("DestinationName50", None)
-        line_planning_number = line_data.get("LinePlanningNumber", None)
-        line_direction = line_data.get("LineDirection", None)
-
-        # Add technical columns such as the source system and unique identifier generated through the ETL
-        source_system = "http://v0.ovapi.nl/line/"
-        uuid_line = str(uuid.uuid4())
-
-        # Add the data to the list
-        rows.append((uuid_line, pk_line_id, line_name, transport_type, line_public_number, data_owner_code, destination_name_50, line_planning_number, line_direction, source_system))
-
-    # Convert the list to a Pandas dataframe
-    df = pd.DataFrame(rows, columns=["uuid_line", "pk_line_id", "line_name", "transport_type", "line_public_number", "data_owner_code", "destination_name_50", "line_planning_number", "line_direction", "source_system"])
-
-    # Connect to BigQuery
-    client = bigquery.Client.from_service_account_json(service_account_json)
-
-    # Create the table if it doesn't exist
-    create_table_sql = """
-        CREATE TABLE IF NOT EXISTS """ + gcp_destination + """ (
-          uuid_line STRING NOT NULL OPTIONS (description = 'A unique identifier generated through the ETL process.'),
-          pk_line_id STRING NOT NULL OPTIONS (description = 'Primary key of the table. A line is a predetermined route along several timingpoints.'),
-          line_name STRING OPTIONS (description = 'Name of the line.'),
-          transport_type STRING OPTIONS (description = 'Type of transport, it has to be one of: BUS, TRAIN, METRO, BOAT, TRAM.'),
-          line_public_number STRING OPTIONS (description = 'Line number used when communicated with travellers. Communicated as STRING from source of truth.'),
-          data_owner_code STRING NOT NULL OPTIONS (description = 'Data owner code.'),
-          destination_name_50 STRING OPTIONS (description = 'Destination name.'),
-          line_planning_number STRING NOT NULL OPTIONS (description = 'Line planning number. Communicated as STRING from source of truth.'),
-          line_direction INTEGER NOT NULL OPTIONS (description = 'Direction of the line.'),
-          load_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP() OPTIONS (description = 'Technical data corresponding to latest load date and time.'),
-          source_system STRING NOT NULL OPTIONS (description = 'Source system from which the data has been extracted.'))
-          PARTITION BY DATE(load_timestamp)
-          CLUSTER BY line_public_number
-          OPTIONS (
-            description = 'Consume the public API for “Transport for The Netherlands” which provides information about OVAPI, country-wide public transport',
-            labels = [('org_unit', 'transport_for_netherlands'), ('information_type', 'ovapi')]
-          );
+import datetime
+from google.cloud import bigquery
+
+# Import pipeline modules
+from lines_pipeline import bigquery_jobs, cdc, checkpoint, extract, http_client, instrumentation, merge, parallel_transform, response_cache, schema, staging, validation
+
+
+class Settings:
     """
+    Settings of a run of the script, read from the environment variables (see .env.dist).
+    """
+
+    def __init__(self, environ=None) -> None:
+        environ = os.environ if environ is None else environ
+
+        # Import keyfile
+        self.service_account_json = environ.get("GCP_SERVICE_ACCOUNT_FILEPATH", "default_file_path")
+
+        # Set the project, dataset and table name
+        self.gcp_project = environ.get("GCP_PROJECT", "default_gcp_project")
+        self.gcp_dataset = environ.get("GCP_DATASET", "default_gcp_dataset")
+        self.gcp_table = environ.get("GCP_TABLE", "default_gcp_table")
+
+        # Build GCP destination and temporary destination using project, dataset and table names
+        self.gcp_destination = self.gcp_project + "." + self.gcp_dataset + "." + self.gcp_table
+        self.gcp_temporary = self.gcp_project + ".dw_temporary." + self.gcp_table
+
+        # Set the base URL and endpoint for the API, and the number of concurrent requests of the extraction engine
+        self.base_url = environ.get("SOURCE_API_BASE_URL", "default_base_url")
+        self.endpoint = environ.get("SOURCE_API_ENDPOINT", "default_endpoint")
+        self.max_workers = int(environ.get("SOURCE_API_MAX_WORKERS") or http_client.DEFAULT_MAX_WORKERS)
+
+        # Set the number of lines per streamed batch
+        self.batch_size = int(environ.get("EXTRACT_BATCH_SIZE") or extract.DEFAULT_BATCH_SIZE)
+
+        # Set the transform parallelism: raw batches are transformed by worker processes once the payload reaches the threshold, in process below it
+        self.transform_max_workers = int(environ.get("TRANSFORM_MAX_WORKERS") or parallel_transform.DEFAULT_MAX_WORKERS)
+        self.transform_min_rows = int(environ.get("TRANSFORM_MIN_ROWS") or parallel_transform.DEFAULT_MIN_ROWS)
+
+        # Set the quarantine file of the lines breaking the constraints of the table
+        self.quarantine_path = environ.get("QUARANTINE_PATH") or "quarantine/" + self.gcp_table + "_" + datetime.datetime.now().strftime("%Y%m%dT%H%M%S") + ".parquet"
+
+        # Set the load mode: "full" merges the whole catalogue, "incremental" only ships lines that changed since the latest merged snapshot
+        self.load_mode = environ.get("LOAD_MODE") or "full"
+        self.snapshot_path = environ.get("CDC_SNAPSHOT_PATH") or "snapshots/" + self.gcp_table + "_hashes.parquet"
+
+        # Set the table layout (partitioning, clustering, history table), see lines_pipeline/schema.py
+        self.table_layout = schema.LINES.layout(environ.get("TABLE_LAYOUT") or "legacy")
+
+        # Set the loader backend: "batch" runs one load job per frame, "streaming" sends Arrow record batches through the Storage Write API as they are produced
+        self.loader_backend = environ.get("LOADER_BACKEND") or "batch"
+
+        # Set the exports of the metrics: Prometheus text file and StatsD
+        self.metrics_prometheus_path = environ.get("METRICS_PROMETHEUS_PATH")
+        self.metrics_statsd_host = environ.get("METRICS_STATSD_HOST")
+        self.metrics_statsd_port = int(environ.get("METRICS_STATSD_PORT") or 8125)
+
+        # Set the cache of the raw API responses and its eviction policy
+        self.cache_directory = environ.get("RESPONSE_CACHE_DIRECTORY") or "cache/"
+        self.cache_max_bytes = int(environ.get("RESPONSE_CACHE_MAX_BYTES") or response_cache.DEFAULT_MAX_BYTES)
+        self.cache_max_age = int(environ.get("RESPONSE_CACHE_MAX_AGE") or response_cache.DEFAULT_MAX_AGE)
 
-    try:
-        # Run the query
-        create_job = client.query(create_table_sql)
-
-        # Wait for the job to complete
-        create_job.result()
-
-        print("Table created or the table already exist: %s" % gcp_destination)
-
-    except exceptions.BadRequest as e:
-        # Catch any errors relating to Bad Request that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    except exceptions.Forbidden as e:
-        # Catch any errors relating to permission and rights that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    except Exception as e:
-        # Catch any other errors that might occur and print the error message
-        print(e)
-        sys.exit()
-
-
-    try:
-        # Load the data from the dataframe to the table
-        load_job = client.load_table_from_dataframe(df, gcp_temporary, job_config=bigquery.LoadJobConfig(write_disposition="WRITE_TRUNCATE"))
-
-        # Wait for the job to complete
-        load_job.result()
-
-        print("Data loaded successfully to temporary table: %s" % gcp_temporary)
-
-    except exceptions.BadRequest as e:
-        # Catch any errors relating to Bad Request that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    except exceptions.Forbidden as e:
-        # Catch any errors relating to permission and rights that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    except Exception as e:
-        # Catch any other errors that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    # Merge data stored into temporary table to the destination table
-    merge_sql = """
-        MERGE """ + gcp_destination + """ B
-        USING """ + gcp_temporary + """ N
-        ON B.pk_line_id = N.pk_line_id
-        WHEN MATCHED THEN
-          UPDATE SET
-            uuid_line = N.uuid_line,
-            line_name = N.line_name,
-            transport_type = N.transport_type,
-            line_public_number = N.line_public_number,
-            data_owner_code = N.data_owner_code,
-            destination_name_50 = N.destination_name_50,
-            line_planning_number = N.line_planning_number,
-            line_direction = N.line_direction,
-            load_timestamp = CURRENT_TIMESTAMP(),
-            source_system = N.source_system
-        WHEN NOT MATCHED THEN
-          INSERT (
-            uuid_line,
-            pk_line_id,
-            line_name,
-            transport_type,
-            line_public_number,
-            data_owner_code,
-            destination_name_50,
-            line_planning_number,
-            line_direction,
-            load_timestamp,
-            source_system
-          ) VALUES(
-            N.uuid_line,
-            N.pk_line_id,
-            N.line_name,
-            N.transport_type,
-            N.line_public_number,
-            N.data_owner_code,
-            N.destination_name_50,
-            N.line_planning_number,
-            N.line_direction,
-            CURRENT_TIMESTAMP(),
-            N.source_system
-          ) """
-
-    try:
-        # Merge the data from temporary table to destination table
-        merge_job = client.query(merge_sql)
-
-        # Wait for the job to complete
-        merge_job.result()
-
-        print("Data merged successfully to the destination table %s" % gcp_destination)
-
-    except exceptions.BadRequest as e:
-        # Catch any errors relating to Bad Request that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    except exceptions.Forbidden as e:
-        # Catch any errors relating to permission and rights that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    except Exception as e:
-        # Catch any other errors that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    # Delete the temporary table
-    delete_temporary_table_sql = """
-        DROP TABLE """ + gcp_temporary + """;
+        # Set the directory of the checkpoints of the run
+        self.checkpoint_directory = environ.get("CHECKPOINT_DIRECTORY") or "checkpoints/"
+
+
+class ExtractAndLoad:
+    """
+    Run of the script: extract the lines from the API, transform them, load them to the temporary table and merge them to the destination table.
+    Each stage is checkpointed, a rerun of the same payload resumes after the last completed stage, and every failure is reported with the exit code of its stage.
+    client_factory builds the BigQuery client from the service account file (bigquery.Client.from_service_account_json by default).
     """
 
-    try:
-        # Merge the data from temporary table to destination table
-        delete_job = client.query(delete_temporary_table_sql)
-
-        # Wait for the job to complete
-        delete_job.result()
-
-        print("Temporary table deleted: %s" % gcp_temporary)
-
-    except exceptions.BadRequest as e:
-        # Catch any errors relating to Bad Request that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    except exceptions.Forbidden as e:
-        # Catch any errors relating to permission and rights that might occur and print the error message
-        print(e)
-        sys.exit()
-
-    except Exception as e:
-        # Catch any other errors that might occur and print the error message
-        print(e)
-        sys.exit()
-else:
-    # Print an error message if the request was not successful
-    print("Error: API request failed with status code {}".format(response.status_code))
-    sys.exit()
+    def __init__(self, settings, client_factory=None) -> None:
+        self.settings = settings
+        self.client_factory = client_factory
+
+        # Set the extraction engine: pooled keep-alive session with timeouts and backoff retries
+        self.extractor = http_client.ParallelExtractor(settings.base_url, max_workers=settings.max_workers)
+
+        # Set the transform, in worker processes for large payloads
+        self.transformer = parallel_transform.ParallelTransformer(max_workers=settings.transform_max_workers, min_rows=settings.transform_min_rows)
+
+        # Set the validation: lines breaking the constraints of the table (required values, castable values, allowed values, duplicate keys) are written to a quarantine file with their reasons instead of being loaded
+        self.validator = validation.BatchValidator(schema.LINES)
+        self.quarantine = validation.QuarantineWriter(settings.quarantine_path)
+
+        # In incremental mode, the lines are compared with the snapshot of the latest merged hashes
+        self.change_detector = cdc.ChangeDetector(cdc.load_snapshot(settings.snapshot_path)) if settings.load_mode == "incremental" else None
+
+        # Set the instrumentation: per-stage metrics logged as JSON lines, optionally written as a Prometheus text file and sent to StatsD
+        self.metrics = instrumentation.PipelineMetrics("lines", labels={"table": settings.gcp_table})
+
+        # Set the cache of the raw API responses (compressed bodies and ETag/Last-Modified validators)
+        self.cache = response_cache.ResponseCache(settings.cache_directory, max_bytes=settings.cache_max_bytes, max_age=settings.cache_max_age)
+
+        # Set the checkpoints of the run: each completed stage (raw payload, transformed Parquet files, loaded temporary table, merge) is persisted,
+        # and a rerun of the same payload resumes after the last completed stage instead of downloading and transforming it again
+        self.checkpoints = checkpoint.CheckpointStore(settings.checkpoint_directory, settings.gcp_table)
+
+        # Range of the keys loaded to the temporary table, used as constant pruning predicate by the MERGE
+        self.key_range = merge.KeyRange(schema.LINES.key)
+
+        self.response = None
+        self.orchestrator = None
+
+    @property
+    def url(self):
+        return self.extractor.url(self.settings.endpoint)
+
+    def start(self):
+        """
+        Method used to send the conditional request and start (or resume) the run of the payload. Returns False when there is nothing to load.
+        """
+
+        # Send a conditional request: the body is streamed from the network, or replayed from the cache when a previous run did not complete
+        # (error statuses, connection, timeout and retry errors fail the extract stage)
+        with self.checkpoints.stage("extract"):
+            self.response = self.cache.get(self.extractor, self.settings.endpoint)
+
+        # Nothing changed since the latest successful run, skip the transform and the load entirely
+        if self.response.unchanged:
+            print("API response not modified since the latest successful run, nothing to load")
+            return False
+
+        print("API response %s" % self.response.status)
+
+        # Start the run of this payload, or resume the pending run of the same payload and settings (a payload without validators cannot be identified, its run is never resumed)
+        payload_validators = {name: value for name, value in self.response.headers.items() if value} or {"downloaded_at": datetime.datetime.now().isoformat()}
+        resumed_stage = self.checkpoints.start(checkpoint.run_key(
+            url=self.url,
+            validators=payload_validators,
+            destination=self.settings.gcp_destination,
+            load_mode=self.settings.load_mode,
+            layout=self.settings.table_layout.name,
+            snapshot_path=self.settings.snapshot_path
+        ))
+
+        if resumed_stage:
+            print("Resuming run %s after the %s stage" % (self.checkpoints.run_key, resumed_stage))
+
+        return True
+
+    def connect(self):
+        """
+        Method used to connect to BigQuery and start the background check of the destination table, a failure fails the load stage (e.g. invalid keyfile).
+        """
+
+        # Create the table (and its history table, depending on the layout) if it doesn't exist, only run when the metadata check did not find it
+        create_table_sql = ";\n".join(merge.create_table_statements(schema.LINES, self.settings.gcp_destination, self.settings.table_layout)) + ";"
+
+        with self.checkpoints.stage("load"):
+            client = (self.client_factory or bigquery.Client.from_service_account_json)(self.settings.service_account_json)
+
+            # Set the job orchestration on the single BigQuery client, the destination table check (metadata, DDL only when missing) runs in the background
+            self.orchestrator = bigquery_jobs.JobOrchestrator(client, self.settings.gcp_destination, self.settings.gcp_temporary, create_table_sql, loader_backend=self.settings.loader_backend, metrics=self.metrics)
+            self.orchestrator.start_destination_table_check()
+
+    def transformed_frames(self, writer):
+        """
+        Method used to stream the API response and yield the transformed dataframes to load to the temporary table.
+        Each dataframe is also written to the transformed Parquet files of the checkpoint, the extract and transform stages are checkpointed once the response is exhausted.
+        """
+
+        metrics = self.metrics
+        change_detector = self.change_detector
+        loaded = False
+
+        # The current shard of the Parquet files is closed as is when the stream fails
+        with self.checkpoints.stage("transform"), writer:
+            # Time the production of each batch (download and parsing) as the extract stage, its errors being reported as extract failures
+            batches = extract.iter_response_batches(self.response, batch_size=self.settings.batch_size, metrics=metrics)
+            batches = metrics.iter_stage("extract", self.checkpoints.iter_stage("extract", batches), rows=lambda batch: batch.num_rows)
+
+            # Split the rejected lines of each batch to the quarantine, only valid lines are transformed and loaded
+            batches = self.validator.validate_batches(batches, quarantine=self.quarantine, metrics=metrics)
+
+            # Time the transform of each batch (in worker processes for large payloads) as the transform stage, the extract and validate stages nested in it being excluded
+            frames = metrics.iter_stage("transform", self.transformer.transform_batches(batches), rows=lambda df: len(df.index))
+
+            for df in frames:
+                # In incremental mode, only the lines that changed since the latest merged snapshot are shipped
+                if change_detector:
+                    with metrics.stage("cdc") as stage:
+                        stage.add(rows_in=len(df.index))
+                        df = change_detector.changes(df)
+                        stage.add(rows_out=len(df.index))
+
+                # The first frame is always loaded so that the temporary table exists, even when nothing changed
+                if loaded and df.empty:
+                    continue
+
+                loaded = True
+                self.key_range.update(df)
+                writer.write(df)
+                yield df
+
+            # In incremental mode, lines that are not returned by the API anymore are shipped as deletions (quarantined lines are kept as they were)
+            if change_detector:
+                change_detector.retain(self.validator.quarantined_keys())
+                deleted_df = change_detector.deletions()
+                if not deleted_df.empty:
+                    self.key_range.update(deleted_df)
+                    writer.write(deleted_df)
+                    yield deleted_df
+
+                # Keep the hashes of this run aside, they become the reference once the MERGE succeeded
+                cdc.save_snapshot(change_detector.current_hashes(), self.settings.snapshot_path)
+
+            self.quarantine.close()
+
+        self.checkpoints.complete("extract", status=self.response.status, payload=self.cache.body_path(self.url) if self.response.headers else None)
+        self.checkpoints.complete(
+            "transform",
+            paths=writer.paths,
+            rows=writer.rows_written,
+            min_key=self.key_range.min_key,
+            max_key=self.key_range.max_key,
+            quarantined=self.quarantine.rows_written,
+            quarantine_path=self.settings.quarantine_path,
+            quarantine_report=self.validator.report(),
+            changes=change_detector.counts if change_detector else None
+        )
+
+    def transform_and_load(self):
+        """
+        Method used to stream the API response, transform it and load each frame to the temporary table as soon as it is ready.
+        When the load fails, the rest of the response is still transformed so the rerun resumes from the transformed Parquet files.
+        """
+
+        writer = staging.StagingParquetWriter(os.path.join(self.checkpoints.run_directory, "transformed"), schema.schema_fields(schema.LINES, incremental=self.change_detector is not None))
+        frames = self.transformed_frames(writer)
+
+        try:
+            with self.checkpoints.stage("load"):
+                row_count = self.orchestrator.load_frames(frames)
+
+        except checkpoint.StageFailed as e:
+            if e.stage == "load":
+                for _ in frames:
+                    pass
+            raise
+
+        finally:
+            # The quarantine file is complete even when the transform failed
+            self.quarantine.close()
+
+        self.checkpoints.complete("load", rows=row_count)
+
+    def load_checkpointed_frames(self):
+        """
+        Method used to load the transformed Parquet files of the checkpoint to the temporary table, without downloading and transforming the response again.
+        """
+
+        with self.checkpoints.stage("load"):
+            row_count = self.orchestrator.load_frames(staging.read_frames(self.checkpoints.output("transform")["paths"]))
+
+        self.checkpoints.complete("load", rows=row_count)
+
+    def merge_to_destination(self):
+        """
+        Method used to merge the temporary table to the destination table, drop it and promote the CDC snapshot and the cached response.
+        Rerunning the stage is idempotent: the MERGE of an already merged temporary table leaves the destination table as it is.
+        """
+
+        settings = self.settings
+        orchestrator = self.orchestrator
+
+        with self.checkpoints.stage("merge"):
+            # Wait for the background check of the destination table
+            orchestrator.wait_destination_table()
+
+            print("Table created or the table already exist: %s" % settings.gcp_destination)
+
+            if self.change_detector and not self.change_detector.has_changes():
+                # Nothing changed since the latest run, the destination table is left untouched and only the temporary table is dropped
+                orchestrator.merge_and_drop()
+
+                print("No change detected, merge skipped for the destination table %s" % settings.gcp_destination)
+
+            else:
+                # Merge data stored into temporary table to the destination table, statements are generated from the schema definition and the table layout
+                merge_statements = merge.merge_statements(schema.LINES, settings.gcp_destination, settings.gcp_temporary, settings.table_layout, incremental=self.change_detector is not None)
+                merge_parameters = merge.key_range_parameters(schema.LINES, settings.table_layout, self.key_range.min_key, self.key_range.max_key)
+
+                # Report the bytes the MERGE is going to process, to check the scan cost stays flat as the table grows
+                print("MERGE dry-run: %d bytes to be processed" % orchestrator.estimate_merge_bytes(merge_statements, merge_parameters))
+
+                # Merge the data from temporary table to destination table and drop the temporary table in a single script job
+                orchestrator.merge_and_drop(merge_statements, merge_parameters)
+
+                print("Data merged successfully to the destination table %s" % settings.gcp_destination)
+
+            print("Temporary table deleted: %s" % settings.gcp_temporary)
+
+            # The hashes of this run are now the reference for the next incremental run
+            if self.change_detector:
+                cdc.commit_snapshot(settings.snapshot_path)
+
+            # The cached response has been processed, an unchanged response will now skip the next run
+            self.cache.commit(self.url)
+
+        self.checkpoints.complete("merge")
+
+    def process(self):
+        """
+        Method used to run the stages that did not complete yet: transform and load (or reload from the checkpoint), then merge.
+        """
+
+        checkpoints = self.checkpoints
+
+        if not checkpoints.completed("transform"):
+            # Fresh run (or a run that failed before its response was fully transformed): stream, transform and load
+            self.transform_and_load()
+
+        else:
+            # The response has already been transformed, it is neither downloaded nor read from the cache again
+            self.response.close()
+
+            transformed = checkpoints.output("transform")
+            self.key_range.min_key, self.key_range.max_key = transformed["min_key"], transformed["max_key"]
+            if self.change_detector:
+                self.change_detector.counts.update(transformed["changes"])
+
+            # The temporary table is reloaded from the Parquet files when the load did not complete, or when it is gone before the MERGE completed (a failed lookup fails the load stage)
+            with checkpoints.stage("load"):
+                reload = not checkpoints.completed("load") or (not checkpoints.completed("merge") and not self.orchestrator.temporary_table_exists())
+
+            if reload:
+                self.load_checkpointed_frames()
+
+        transformed = checkpoints.output("transform")
+        print("Data loaded successfully to temporary table: %s (%d lines)" % (self.settings.gcp_temporary, checkpoints.output("load")["rows"]))
+
+        if transformed["quarantined"]:
+            print("Lines quarantined to %s: %d (%s)" % (transformed["quarantine_path"], transformed["quarantined"], transformed["quarantine_report"]))
+
+        if self.change_detector:
+            counts = self.change_detector.counts
+            print("Changes detected: %d inserted, %d updated, %d deleted" % (counts[cdc.CHANGE_INSERT], counts[cdc.CHANGE_UPDATE], counts[cdc.CHANGE_DELETE]))
+
+        if not checkpoints.completed("merge"):
+            self.merge_to_destination()
+
+        # The run is complete, its checkpoints and transformed files are removed
+        checkpoints.clear()
+
+    def run(self):
+        """
+        Method used to run the flow and return the exit code of the script: 0 on success (or when there is nothing to load), the code of the failed stage otherwise.
+        """
+
+        exit_code = checkpoint.EXIT_SUCCESS
+
+        try:
+            if self.start():
+                self.connect()
+                self.process()
+
+        except checkpoint.StageFailed as e:
+            # Print the error message, the checkpoints of the completed stages are kept for the next run
+            print("Error: %s" % e)
+            exit_code = e.exit_code
+
+        finally:
+            if self.orchestrator is not None:
+                self.orchestrator.close()
+
+            # Report the wall-clock latency of each stage, and export the metrics of the run
+            settings = self.settings
+            print("Stage latencies: %s" % self.metrics.report())
+            self.metrics.export(prometheus_path=settings.metrics_prometheus_path, statsd_host=settings.metrics_statsd_host, statsd_port=settings.metrics_statsd_port)
+
+        return exit_code
+
+
+# The run only starts when the script is executed: the worker processes of the transform (forkserver or spawn start method) import it without running it
+if __name__ == "__main__":
+    sys.exit(ExtractAndLoad(Settings()).run())
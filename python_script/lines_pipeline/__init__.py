@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared building blocks of the OVAPI lines ETL.
+Modules are imported by the standalone script (python_script/extract_and_load.py) and by the Airflow DAG,
+in which case the package is deployed to the Composer dags folder next to the custom_operator folder.
+"""
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import datetime
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+# This module is imported at DAG parse time: it only depends on the standard library
+
+# Column added to the backfilled rows with the day they were extracted for, used to keep the latest version of each key
+BACKFILL_DATE_FIELD = {"name": "backfill_date", "type": "DATE", "mode": "REQUIRED", "description": "Day the line has been extracted for by the backfill."}
+
+# Default number of days extracted concurrently
+DEFAULT_MAX_WORKERS = 4
+
+
+def date_range(start_date, end_date):
+    """
+    Method used to list the days between two dates (inclusive), dates being datetime.date or YYYY-MM-DD strings.
+    """
+
+    if isinstance(start_date, str):
+        start_date = datetime.date.fromisoformat(start_date)
+    if isinstance(end_date, str):
+        end_date = datetime.date.fromisoformat(end_date)
+
+    if end_date < start_date:
+        raise ValueError("The end date %s is before the start date %s" % (end_date, start_date))
+
+    return [start_date + datetime.timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def extracted_days(days, date_parameter=None):
+    """
+    Method used to list the days of a range that have to be extracted.
+    Without a date parameter the API only serves its current state (e.g. the /line/ catalogue): every day would download the same payload,
+    so it is extracted once, for the last day of the range (the day kept by the deduplicated MERGE).
+    """
+
+    return list(days) if date_parameter else list(days)[-1:]
+
+
+def dated_endpoint(endpoint, date_parameter, day):
+    """
+    Method used to add the date parameter selecting a day to an endpoint, e.g. /line/?date=2022-12-20.
+    """
+
+    return endpoint + ("&" if "?" in endpoint else "?") + urllib.parse.urlencode({date_parameter: day.isoformat()})
+
+
+def stage_days(days, stage_day, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Method used to stage several days concurrently, with at most max_workers days in flight.
+    stage_day is called with each day and its results are returned keyed by day, the first error is raised once the running days are done.
+    """
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backfill") as executor:
+        return dict(zip(days, executor.map(stage_day, days)))
+
+
+def deduplicated_source(table_schema, temporary):
+    """
+    Method used to build the source of the backfill MERGE: the rows of all the backfilled days loaded to one temporary table,
+    deduplicated by key with the latest day winning.
+    """
+
+    return (
+        "(SELECT * EXCEPT (" + BACKFILL_DATE_FIELD["name"] + ") FROM " + temporary + " WHERE TRUE"
+        + " QUALIFY ROW_NUMBER() OVER (PARTITION BY " + table_schema.key + " ORDER BY " + BACKFILL_DATE_FIELD["name"] + " DESC) = 1)"
+    )
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+from concurrent.futures import ThreadPoolExecutor
+from google.cloud import bigquery, exceptions
+
+# Custom modules
+from lines_pipeline import instrumentation, loaders, merge
+
+# Table metadata already fetched by this process, keyed by table id
+_TABLE_CACHE = {}
+
+
+class JobOrchestrator:
+    """
+    Run the BigQuery side of the ETL with a single client: destination table check, loads to the temporary table, MERGE and DROP.
+    The client is injected so the flow can run against a fake exposing get_table, query and load_table_from_dataframe,
+    and the streaming loader backend accepts a sink (e.g. loaders.RecordingSink) in place of the Storage Write API.
+    Each stage is recorded in metrics (lines_pipeline.instrumentation.PipelineMetrics), with the statistics of its BigQuery jobs.
+    """
+
+    def __init__(self, client, destination, temporary, create_table_sql, loader_backend="batch", sink=None, metrics=None) -> None:
+        self.client = client
+        self.destination = destination
+        self.temporary = temporary
+        self.create_table_sql = create_table_sql
+        self.loader_backend = loader_backend
+        self.sink = sink
+        self.metrics = metrics or instrumentation.PipelineMetrics("lines")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bigquery")
+        self._table_check = None
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def get_destination_table(self):
+        """
+        Method used to return the destination table metadata (schema included), or None when it does not exist.
+        Metadata is cached for the lifetime of the process so the check costs one API call at most.
+        """
+
+        if self.destination not in _TABLE_CACHE:
+            try:
+                _TABLE_CACHE[self.destination] = self.client.get_table(self.destination)
+            except exceptions.NotFound:
+                return None
+
+        return _TABLE_CACHE[self.destination]
+
+    def ensure_destination_table(self):
+        """
+        Method used to create the destination table through a DDL job only when the metadata check says it is missing.
+        Returns True when the table has been created.
+        """
+
+        with self.metrics.stage("table_check"):
+            if self.get_destination_table() is not None:
+                return False
+
+            query_job = self.client.query(self.create_table_sql)
+            query_job.result()
+            self.metrics.record_job("table_check", query_job)
+            _TABLE_CACHE.pop(self.destination, None)
+
+            return True
+
+    def start_destination_table_check(self):
+        """
+        Method used to run ensure_destination_table in the background, so it overlaps with the extraction and the load jobs.
+        """
+
+        self._table_check = self._executor.submit(self.ensure_destination_table)
+
+        return self._table_check
+
+    def wait_destination_table(self):
+        """
+        Method used to wait for the background table check, raising its error if any.
+        """
+
+        if self._table_check is None:
+            return self.ensure_destination_table()
+
+        return self._table_check.result()
+
+    def temporary_table_exists(self):
+        """
+        Method used to check the temporary table is still there, e.g. before resuming a run at the MERGE (the table is dropped by the MERGE script job).
+        """
+
+        try:
+            self.client.get_table(self.temporary)
+        except exceptions.NotFound:
+            return False
+
+        return True
+
+    def load_frames(self, frames):
+        """
+        Method used to load an iterable of dataframes to the temporary table as they are produced, through the configured loader backend.
+        Returns the number of rows loaded.
+        """
+
+        loader = loaders.build_loader(self.loader_backend, self.client, self.temporary, sink=self.sink)
+
+        with self.metrics.stage("load") as stage:
+            for df in frames:
+                stage.add(rows_in=len(df.index))
+                loader.write(df)
+
+            row_count = loader.close()
+
+        for load_job in getattr(loader, "jobs", []):
+            self.metrics.record_job("load", load_job)
+
+        return row_count
+
+    def estimate_merge_bytes(self, merge_statements, query_parameters=()):
+        """
+        Method used to report the bytes the MERGE statements will process, through dry-run jobs.
+        """
+
+        with self.metrics.stage("merge_dry_run"):
+            return merge.dry_run_bytes(self.client, merge_statements, query_parameters)
+
+    def merge_and_drop(self, merge_statements=(), query_parameters=()):
+        """
+        Method used to run the MERGE statements (in a transaction) and drop the temporary table as a single multi-statement script job.
+        When merge_statements is empty, only the temporary table is dropped.
+        """
+
+        statements = []
+        if merge_statements:
+            statements += ["BEGIN TRANSACTION"] + [statement.strip() for statement in merge_statements] + ["COMMIT TRANSACTION"]
+
+        # DDL on permanent tables is not allowed inside a transaction, the DROP runs right after the COMMIT
+        statements.append("DROP TABLE IF EXISTS " + self.temporary)
+
+        with self.metrics.stage("merge_and_drop"):
+            query_job = self.client.query(";\n".join(statements) + ";", job_config=bigquery.QueryJobConfig(query_parameters=list(query_parameters)))
+            result = query_job.result()
+
+        # Statistics of the script job cover the MERGE and the DROP
+        self.metrics.record_job("merge_and_drop", query_job)
+
+        return result
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import numpy as np
+import pandas as pd
+
+# Custom modules
+from lines_pipeline import schema, transform
+
+# Business columns taken into account in the content hash, technical columns (uuid_line, load_timestamp, source_system) are left out
+HASH_COLUMNS = [column.name for column in schema.LINES.business_columns]
+
+# Values of the change_type column shipped to the temporary table
+CHANGE_INSERT = schema.CHANGE_INSERT
+CHANGE_UPDATE = schema.CHANGE_UPDATE
+CHANGE_DELETE = schema.CHANGE_DELETE
+
+# Suffix of the snapshot written by a run and promoted once the MERGE succeeded
+PENDING_SUFFIX = ".pending"
+
+
+def hash_lines(df):
+    """
+    Method used to compute a stable content hash (uint64) per line over the business columns.
+    Values are compared as strings so the hash does not depend on the dtype a column happened to be built with.
+    """
+
+    if df.empty:
+        return pd.Series([], index=pd.Index([], name="pk_line_id"), dtype="uint64", name="row_hash")
+
+    hashes = pd.util.hash_pandas_object(df[HASH_COLUMNS].astype("string"), index=False)
+
+    return pd.Series(hashes.to_numpy(), index=pd.Index(df["pk_line_id"].to_numpy(), name="pk_line_id"), name="row_hash")
+
+
+def load_snapshot(path):
+    """
+    Method used to read the snapshot of the latest merged hashes, an empty snapshot is returned on the first run.
+    """
+
+    if not os.path.exists(path):
+        return hash_lines(pd.DataFrame())
+
+    snapshot = pd.read_parquet(path)
+
+    return snapshot.set_index("pk_line_id")["row_hash"]
+
+
+def pending_path(path, run_tag=None):
+    """
+    Method used to build the path of the pending snapshot of a run: <path>.pending, or <path>.<run tag>.pending so concurrent runs never share it.
+    """
+
+    return path + ("." + run_tag if run_tag else "") + PENDING_SUFFIX
+
+
+def save_snapshot(hashes, path, run_tag=None):
+    """
+    Method used to write the hashes of the current run next to the snapshot, to be promoted by commit_snapshot (with the same run tag).
+    """
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    hashes.reset_index().to_parquet(pending_path(path, run_tag), index=False)
+
+
+def commit_snapshot(path, run_tag=None):
+    """
+    Method used to promote the pending snapshot of a run once its changes have been merged to the destination table.
+    """
+
+    if os.path.exists(pending_path(path, run_tag)):
+        os.replace(pending_path(path, run_tag), path)
+
+
+class ChangeDetector:
+    """
+    Compare transformed batches with the snapshot of the latest run and only keep inserted, updated and deleted lines.
+    """
+
+    def __init__(self, snapshot) -> None:
+        self.snapshot = snapshot
+        self._snapshot_hashes = snapshot.to_numpy()
+        self.counts = {CHANGE_INSERT: 0, CHANGE_UPDATE: 0, CHANGE_DELETE: 0}
+        self._hashes = []
+
+    def changes(self, df):
+        """
+        Method used to filter a transformed batch down to its inserted and updated lines, flagged by a change_type column.
+        """
+
+        hashes = hash_lines(df)
+        self._hashes.append(hashes)
+
+        # Keys unknown to the snapshot are inserts, known keys are updates when their hash moved
+        # (the positions of the keys in the hash table of the snapshot index are looked up once, hashes are then compared by position
+        # so uint64 hashes are never upcast to float by a reindex)
+        positions = self.snapshot.index.get_indexer(hashes.index)
+        known = positions >= 0
+        inserted = ~known
+        updated = np.zeros(len(hashes.index), dtype=bool)
+        updated[known] = self._snapshot_hashes[positions[known]] != hashes.to_numpy()[known]
+
+        changed = inserted | updated
+        changed_df = df[changed].copy()
+        changed_df["change_type"] = np.where(inserted[changed], CHANGE_INSERT, CHANGE_UPDATE)
+
+        self.counts[CHANGE_INSERT] += int(inserted.sum())
+        self.counts[CHANGE_UPDATE] += int(updated.sum())
+
+        return changed_df
+
+    def retain(self, keys):
+        """
+        Method used to carry the snapshot hashes of lines over to the next snapshot without shipping them (e.g. lines quarantined by the validation),
+        so they are not deleted and are compared again on the next run. Keys already seen during the run are left as is.
+        """
+
+        keys = pd.Index(keys).difference(self.current_hashes().index)
+        self._hashes.append(self.snapshot[self.snapshot.index.isin(keys)])
+
+    def deletions(self):
+        """
+        Method used to build the batch of lines present in the snapshot but not returned by the API anymore.
+        Only the key is known, business columns are left null but typed through the regular transform.
+        """
+
+        deleted_keys = self.snapshot.index.difference(self.current_hashes().index)
+        self.counts[CHANGE_DELETE] += len(deleted_keys)
+
+        raw_df = pd.DataFrame({"pk_line_id": deleted_keys.to_numpy()}).reindex(columns=["pk_line_id"] + [column for column, _ in transform.SOURCE_FIELDS])
+        df = transform.transform_lines(raw_df)
+        df["change_type"] = CHANGE_DELETE
+
+        return df
+
+    def current_hashes(self):
+        """
+        Method used to return the hashes of every line seen during the run, i.e. the next snapshot.
+        """
+
+        if not self._hashes:
+            return hash_lines(pd.DataFrame())
+
+        return pd.concat(self._hashes)
+
+    def has_changes(self):
+        return any(self.counts.values())
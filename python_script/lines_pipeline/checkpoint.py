@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import json
+import time
+import shutil
+import hashlib
+import contextlib
+
+# Stages of the standalone flow, in order: raw payload (kept by the response cache), transformed Parquet files, loaded temporary table, merged destination table
+STAGES = ["extract", "transform", "load", "merge"]
+
+# Exit codes of the standalone script: success (or nothing to load), failure outside of the stages, and one code per failed stage
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_CODES = {"extract": 2, "transform": 3, "load": 4, "merge": 5}
+
+
+def run_key(**identity):
+    """
+    Method used to derive the key of a run from what determines its output (payload validators, destination, load mode, layout...).
+    Two runs of the same payload with the same settings share their key, so the second one resumes the first.
+    """
+
+    return hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class StageFailed(Exception):
+    """
+    Error raised by a stage of the flow, carrying the stage and the exit code of the script.
+    """
+
+    def __init__(self, stage, error) -> None:
+        super().__init__("%s stage failed: %s" % (stage, error))
+        self.stage = stage
+        self.exit_code = EXIT_CODES.get(stage, EXIT_FAILURE)
+
+
+class CheckpointStore:
+    """
+    Checkpoints of the pending run of a pipeline: a JSON manifest holding the output of every completed stage (e.g. paths of the transformed
+    Parquet files, loaded rows, range of the keys), replaced atomically after each stage, and a directory holding the artifacts of the run.
+    A run started with the key of the pending run resumes after its last completed stage, any other key discards the pending run.
+    Stages are keyed by <run key>:<stage>, so completing a stage twice leaves the same checkpoint.
+    """
+
+    def __init__(self, directory, name) -> None:
+        self.directory = directory
+        self.name = name
+        self.run_key = None
+        self.stages = {}
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, self.name + ".json")
+
+    @property
+    def run_directory(self):
+        return os.path.join(self.directory, self.name + "_" + self.run_key)
+
+    def _read(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as manifest_file:
+                return json.load(manifest_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self):
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as manifest_file:
+            json.dump({"run_key": self.run_key, "stages": self.stages}, manifest_file, sort_keys=True)
+
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def start(self, key):
+        """
+        Method used to start the run of a key, or to resume it when it is the pending run. Returns the last completed stage, None for a new run.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        manifest = self._read()
+        if manifest is not None and manifest["run_key"] == key:
+            self.stages = manifest["stages"]
+        else:
+            # Artifacts of another payload (or of other settings) are never reused
+            if manifest is not None:
+                shutil.rmtree(os.path.join(self.directory, self.name + "_" + manifest["run_key"]), ignore_errors=True)
+            self.stages = {}
+
+        self.run_key = key
+        os.makedirs(self.run_directory, exist_ok=True)
+        self._write()
+
+        return self.last_completed()
+
+    def stage_key(self, stage):
+        return self.run_key + ":" + stage
+
+    def completed(self, stage):
+        return stage in self.stages and self.stages[stage]["key"] == self.stage_key(stage)
+
+    def last_completed(self):
+        completed = [stage for stage in STAGES if self.completed(stage)]
+
+        return completed[-1] if completed else None
+
+    def output(self, stage):
+        return self.stages[stage]["output"]
+
+    def complete(self, stage, **output):
+        """
+        Method used to persist the checkpoint of a completed stage with its output (JSON serialisable values).
+        """
+
+        self.stages[stage] = {"key": self.stage_key(stage), "completed_at": time.time(), "output": output}
+        self._write()
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """
+        Method used to run a stage, its errors being raised as StageFailed (errors of a nested stage keep their own stage).
+        """
+
+        try:
+            yield
+        except StageFailed:
+            raise
+        except Exception as e:
+            raise StageFailed(stage, e) from e
+
+    def iter_stage(self, stage, iterable):
+        """
+        Method used to attribute the errors raised while producing the items of an iterable to a stage (e.g. the download of a streamed payload).
+        """
+
+        iterator = iter(iterable)
+        while True:
+            with self.stage(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def clear(self):
+        """
+        Method used to remove the manifest and the artifacts of the run once its last stage completed.
+        """
+
+        shutil.rmtree(self.run_directory, ignore_errors=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.manifest_path)
+
+        self.stages = {}
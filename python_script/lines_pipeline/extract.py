@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import json
+import codecs
+import pyarrow as pa
+
+# Custom modules
+from lines_pipeline import schema
+
+# Default number of lines held in memory before a batch is handed over to the caller
+DEFAULT_BATCH_SIZE = 50000
+
+# Default size of the chunks read from the HTTP body
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Mapping between the columns we build and the field names communicated by the OVAPI /line/ endpoint
+SOURCE_FIELDS = schema.LINES.source_fields
+
+# Arrow schema of the raw batches, every value is kept as a STRING and typed later on by the transform step
+RAW_SCHEMA = pa.schema([pa.field("pk_line_id", pa.string())] + [pa.field(column, pa.string()) for column, _ in SOURCE_FIELDS])
+
+# Whitespace allowed between JSON tokens
+_WHITESPACE = " \t\n\r"
+
+
+class IncompleteBodyError(ValueError):
+    """
+    Raised when the HTTP body ends before the top-level JSON object is closed.
+    """
+
+
+def iter_line_objects(chunks):
+    """
+    Method used to parse the OVAPI /line/ payload incrementally.
+    It consumes an iterable of bytes chunks (typically response.iter_content()) and yields (pk_line_id, line_data) pairs one at a time,
+    so only the current chunk and the current line object are held in memory.
+    """
+
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+
+    buffer = ""
+    position = 0
+    exhausted = False
+
+    def read_more():
+        # Drop what has already been consumed and append the next decoded chunk to the buffer
+        nonlocal buffer, position, exhausted
+        buffer = buffer[position:]
+        position = 0
+        try:
+            buffer += utf8_decoder.decode(next(chunks))
+        except StopIteration:
+            buffer += utf8_decoder.decode(b"", final=True)
+            exhausted = True
+
+    def next_token():
+        # Skip whitespaces and return the next significant character without consuming it
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if exhausted:
+                raise IncompleteBodyError("Unexpected end of the API response body")
+            read_more()
+
+    def next_value():
+        # Decode the next JSON value, reading more chunks while the value is truncated by the end of the buffer
+        nonlocal position
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+                read_more()
+                continue
+            # A value ending exactly at the end of the buffer (e.g. a number) might continue in the next chunk
+            if end == len(buffer) and not exhausted:
+                read_more()
+                continue
+            position = end
+            return value
+
+    if next_token() != "{":
+        raise ValueError("The API response is expected to be a JSON object keyed by line identifier")
+    position += 1
+
+    if next_token() == "}":
+        return
+
+    while True:
+        next_token()
+        pk_line_id = next_value()
+
+        if next_token() != ":":
+            raise ValueError("Malformed API response: expected ':' after line identifier %s" % pk_line_id)
+        position += 1
+
+        next_token()
+        line_data = next_value()
+
+        yield pk_line_id, line_data
+
+        separator = next_token()
+        position += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError("Malformed API response: unexpected character %r after line %s" % (separator, pk_line_id))
+
+
+def _to_string_array(values):
+    """
+    Method used to build a STRING Arrow array, falling back to a stringification when the source communicated non-string values (e.g. LineDirection).
+    """
+
+    try:
+        return pa.array(values, type=pa.string())
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+class LineBatchBuilder:
+    """
+    Columnar buffer used to build Arrow record batches of raw lines without going through a list of Python tuples.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE) -> None:
+        self.batch_size = batch_size
+        self._reset()
+
+    def _reset(self):
+        # One preallocated list per column, filled by position
+        self._columns = {field.name: [None] * self.batch_size for field in RAW_SCHEMA}
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def is_full(self):
+        return self._length >= self.batch_size
+
+    def append(self, pk_line_id, line_data):
+        index = self._length
+        self._columns["pk_line_id"][index] = pk_line_id
+        for column, source_field in SOURCE_FIELDS:
+            self._columns[column][index] = line_data.get(source_field)
+        self._length += 1
+
+    def flush(self):
+        """
+        Method used to turn the buffered lines into a pyarrow.RecordBatch and reset the buffer.
+        """
+
+        length = self._length
+        arrays = [_to_string_array(self._columns[field.name][:length]) for field in RAW_SCHEMA]
+        self._reset()
+        return pa.RecordBatch.from_arrays(arrays, schema=RAW_SCHEMA)
+
+
+def iter_line_batches(chunks, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Method used to stream the OVAPI /line/ payload into fixed-size Arrow record batches.
+    The first batch is yielded as soon as batch_size lines have been parsed, before the download completes.
+    At least one batch is always yielded (possibly empty) so that downstream steps receive the schema.
+    """
+
+    builder = LineBatchBuilder(batch_size)
+    yielded = False
+
+    for pk_line_id, line_data in iter_line_objects(chunks):
+        builder.append(pk_line_id, line_data)
+        if builder.is_full():
+            yielded = True
+            yield builder.flush()
+
+    if len(builder) or not yielded:
+        yield builder.flush()
+
+
+def stream_line_batches(session, url, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, metrics=None, **kwargs):
+    """
+    Method used to send the request to the API in streaming mode and yield Arrow record batches of raw lines.
+    session can be the requests module, a requests.Session or a lines_pipeline.http_client.ParallelExtractor (url being then an endpoint).
+    """
+
+    with session.get(url, stream=True, **kwargs) as response:
+        # Check if the request was successful
+        response.raise_for_status()
+
+        yield from iter_response_batches(response, batch_size, chunk_size, metrics=metrics)
+
+
+def iter_response_batches(response, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, metrics=None):
+    """
+    Method used to yield Arrow record batches of raw lines from a streamed response, a requests.Response or a lines_pipeline.response_cache.CachedResponse.
+    With metrics (lines_pipeline.instrumentation.PipelineMetrics), the bytes of the body are counted in the extract stage.
+    """
+
+    # iter_content decodes gzip/deflate transfer encodings on the fly
+    chunks = response.iter_content(chunk_size=chunk_size)
+    if metrics is not None:
+        chunks = metrics.count_bytes("extract", chunks)
+    yield from iter_line_batches(chunks, batch_size)
+
+    # Read the end of the body (trailing whitespace) so that a cached response is complete and stored
+    for _ in chunks:
+        pass
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import threading
+import requests
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 60)
+
+# Default number of requests in flight overall and per host
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PER_HOST_LIMIT = 8
+
+# Default retry policy, waiting backoff * 2 ** (retry - 1) seconds between retries
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+# Status codes worth a retry
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def build_session(pool_size=DEFAULT_MAX_WORKERS, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    Method used to build a requests.Session with a keep-alive connection pool, timeout/backoff retries and compression accepted.
+    """
+
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES, allowed_methods=frozenset(["GET", "HEAD"]), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+
+    return session
+
+
+class ParallelExtractor:
+    """
+    Extraction engine fanning GET requests out over a bounded thread pool sharing one pooled session.
+    Endpoints are appended to base_url (SOURCE_API_BASE_URL) as the script always did, absolute URLs are used as is.
+    """
+
+    def __init__(self, base_url, session=None, max_workers=DEFAULT_MAX_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT, timeout=DEFAULT_TIMEOUT) -> None:
+        self.base_url = base_url
+        self.session = session or build_session(pool_size=max_workers)
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self._host_semaphores = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def url(self, endpoint):
+        return endpoint if "://" in endpoint else self.base_url + endpoint
+
+    def _host_semaphore(self, url):
+        # One semaphore per host, created on first use
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+
+    def get(self, endpoint, **kwargs):
+        """
+        Method used to send a single GET request through the pooled session, honouring the per-host limit.
+        The response is returned as is, kwargs are passed to requests (e.g. stream=True).
+        A streamed response keeps its connection, and its slot of the per-host limit, until it is closed.
+        """
+
+        url = self.url(endpoint)
+        kwargs.setdefault("timeout", self.timeout)
+        semaphore = self._host_semaphore(url)
+
+        semaphore.acquire()
+        try:
+            response = self.session.get(url, **kwargs)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        if not kwargs.get("stream"):
+            # The body has already been read by requests, the connection is back in the pool
+            semaphore.release()
+            return response
+
+        # The slot is released once, however many times the response is closed
+        close = response.close
+        released = threading.Lock()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if released.acquire(blocking=False):
+                    semaphore.release()
+
+        response.close = close_and_release
+
+        return response
+
+    def fetch_json(self, endpoint):
+        """
+        Method used to GET an endpoint and return its decoded JSON body, raising requests.HTTPError when the request was not successful.
+        The body is read and decoded while the slot of the per-host limit is held.
+        """
+
+        with self.get(endpoint, stream=True) as response:
+            response.raise_for_status()
+
+            return response.json()
+
+    def iter_fetch(self, endpoints):
+        """
+        Method used to fetch many endpoints concurrently, yielding (endpoint, data) pairs as soon as each request completes.
+        The first failure is raised once the requests already in flight are done, pending ones are cancelled.
+        """
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="extract") as executor:
+            futures = {executor.submit(self.fetch_json, endpoint): endpoint for endpoint in endpoints}
+
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def fetch_all(self, endpoints):
+        """
+        Method used to fetch many endpoints concurrently and return a dict keyed by endpoint.
+        """
+
+        return dict(self.iter_fetch(endpoints))
+
+
+def line_detail_endpoints(endpoint, line_ids):
+    """
+    Method used to build the per-line detail endpoints (e.g. /line/ARR_28167_1) from the catalogue endpoint and line identifiers.
+    """
+
+    return [endpoint.rstrip("/") + "/" + line_id for line_id in line_ids]
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import contextlib
+
+# This module is imported by the DAG files and the custom operators: it only depends on the standard library
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Counters recorded per stage, on top of the wall-clock and CPU times
+COUNTERS = ["rows_in", "rows_out", "bytes_downloaded", "bytes_written", "bytes_processed", "slot_ms", "jobs"]
+
+# Help text of each exported metric (every metric is exported as a gauge holding the total of the run)
+METRIC_HELP = {
+    "calls": "Number of times the stage ran.",
+    "wall_seconds": "Wall-clock time spent in the stage, nested stages excluded.",
+    "cpu_seconds": "CPU time of the process while the stage was running, nested stages excluded.",
+    "peak_rss_bytes": "Peak resident set size of the process at the end of the stage.",
+    "rows_in": "Rows received by the stage.",
+    "rows_out": "Rows produced by the stage.",
+    "bytes_downloaded": "Bytes downloaded from the API.",
+    "bytes_written": "Bytes written to the staging files.",
+    "bytes_processed": "Bytes processed by the BigQuery jobs.",
+    "slot_ms": "Slot milliseconds consumed by the BigQuery jobs.",
+    "jobs": "Number of BigQuery jobs.",
+}
+
+
+def _label_value(value):
+    # Backslashes, double quotes and line feeds are escaped in the label values of the Prometheus text format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def peak_rss_bytes():
+    """
+    Method used to return the peak resident set size of the process so far, in bytes (None when the platform does not expose it).
+    """
+
+    # On Linux ru_maxrss survives fork and exec (a task forked from a large worker reports the peak of the worker), VmHWM is the peak of this process only
+    try:
+        with open("/proc/self/status", encoding="ascii") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is expressed in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMetrics:
+    """
+    Metrics of a stage of the flow, accumulated over every time the stage runs.
+    wall_seconds and cpu_seconds exclude the time spent in nested stages (e.g. extract and transform running inside the streamed load),
+    cpu_seconds is the CPU time of the whole process (every thread) while the stage was running.
+    A stage can be updated from several threads (e.g. the days of a backfill), every update holds the lock of the stage.
+    """
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss_bytes = None
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, **counters):
+        with self._lock:
+            for counter, value in counters.items():
+                self.counters[counter] = self.counters.get(counter, 0) + (value or 0)
+
+    def record(self, wall_seconds, cpu_seconds, peak_rss_bytes=None):
+        """
+        Method used to record one run of the stage.
+        """
+
+        with self._lock:
+            self.calls += 1
+            self.wall_seconds += wall_seconds
+            self.cpu_seconds += cpu_seconds
+            if peak_rss_bytes is not None:
+                self.peak_rss_bytes = max(self.peak_rss_bytes or 0, peak_rss_bytes)
+
+    def as_dict(self):
+        with self._lock:
+            return dict(
+                stage=self.name,
+                calls=self.calls,
+                wall_seconds=round(self.wall_seconds, 6),
+                cpu_seconds=round(self.cpu_seconds, 6),
+                peak_rss_bytes=self.peak_rss_bytes,
+                **self.counters
+            )
+
+
+class PipelineMetrics:
+    """
+    Instrumentation of the flow: per-stage wall-clock time, CPU time, peak RSS, rows, bytes and BigQuery job statistics.
+    Metrics are exported as structured JSON log lines, as Prometheus text exposition or sent to StatsD.
+    """
+
+    def __init__(self, pipeline, labels=None) -> None:
+        self.pipeline = pipeline
+        self.labels = labels or {}
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = StageMetrics(name)
+            return self.stages[name]
+
+    @property
+    def latencies(self):
+        return {name: stage.wall_seconds for name, stage in self.stages.items()}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Method used to time a stage, the StageMetrics of the stage is yielded so counters can be added to it.
+        """
+
+        stage = self.get(name)
+        stack = self._local.__dict__.setdefault("stack", [])
+
+        # Time spent in nested stages is taken out of the enclosing one
+        frame = {"nested_wall": 0.0, "nested_cpu": 0.0}
+        stack.append(frame)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+
+        try:
+            yield stage
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            stack.pop()
+
+            if stack:
+                stack[-1]["nested_wall"] += wall
+                stack[-1]["nested_cpu"] += cpu
+
+            stage.record(wall - frame["nested_wall"], cpu - frame["nested_cpu"], peak_rss_bytes())
+
+    def iter_stage(self, name, iterable, rows=None):
+        """
+        Method used to time the production of the items of an iterable as a stage (e.g. the batches of a streamed extraction).
+        rows, when given, is a function returning the number of rows of an item, added to rows_out.
+        """
+
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stage:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                if rows is not None:
+                    stage.add(rows_out=rows(item))
+            yield item
+
+    def count_bytes(self, name, chunks, counter="bytes_downloaded"):
+        """
+        Method used to count the bytes of an iterable of chunks in a counter of a stage, chunks being passed through.
+        """
+
+        stage = self.get(name)
+        for chunk in chunks:
+            stage.add(**{counter: len(chunk)})
+            yield chunk
+
+    def record_job(self, name, job):
+        """
+        Method used to add the statistics of a finished BigQuery job (bytes processed, slot milliseconds, loaded rows) to a stage.
+        """
+
+        self.get(name).add(
+            jobs=1,
+            bytes_processed=getattr(job, "total_bytes_processed", None),
+            slot_ms=getattr(job, "slot_millis", None),
+            rows_out=getattr(job, "output_rows", None),
+        )
+
+    def report(self):
+        return ", ".join("%s: %.2fs" % (name, stage.wall_seconds) for name, stage in self.stages.items())
+
+    def json_lines(self):
+        """
+        Method used to render the metrics as structured JSON log lines, one per stage.
+        """
+
+        return [json.dumps(dict(event="stage_metrics", pipeline=self.pipeline, **self.labels, **stage.as_dict()), sort_keys=True) for stage in self.stages.values()]
+
+    def _samples(self):
+        # (metric, stage, value) of every numeric metric
+        for stage in self.stages.values():
+            for metric, value in stage.as_dict().items():
+                if metric != "stage" and value is not None:
+                    yield metric, stage.name, value
+
+    def prometheus_text(self, prefix="lines_pipeline"):
+        """
+        Method used to render the metrics in the Prometheus text exposition format (e.g. for the node_exporter textfile collector).
+        """
+
+        labels = "".join(',%s="%s"' % (key, _label_value(value)) for key, value in sorted(self.labels.items()))
+
+        # Samples are grouped by metric, each group preceded by its HELP and TYPE lines
+        samples = {}
+        for metric, stage, value in self._samples():
+            samples.setdefault(metric, []).append((stage, value))
+
+        lines = []
+        for metric, metric_samples in samples.items():
+            name = prefix + "_" + metric
+            lines.append("# HELP %s %s" % (name, METRIC_HELP.get(metric, metric.replace("_", " ") + ".")))
+            lines.append("# TYPE %s gauge" % name)
+            for stage, value in metric_samples:
+                lines.append('%s{pipeline="%s",stage="%s"%s} %s' % (name, _label_value(self.pipeline), _label_value(stage), labels, value))
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix="lines_pipeline"):
+        """
+        Method used to write the Prometheus text exposition to a file, replaced atomically.
+        """
+
+        with open(path + ".tmp", "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.prometheus_text(prefix))
+
+        os.replace(path + ".tmp", path)
+
+    def send_statsd(self, host, port=8125, prefix="lines_pipeline"):
+        """
+        Method used to send the metrics to a StatsD server as gauges, over UDP (fire and forget).
+        """
+
+        statsd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for metric, stage, value in self._samples():
+                statsd_socket.sendto(("%s.%s.%s.%s:%s|g" % (prefix, self.pipeline, stage, metric, value)).encode("ascii"), (host, int(port)))
+        finally:
+            statsd_socket.close()
+
+    def export(self, log=print, prometheus_path=None, statsd_host=None, statsd_port=8125):
+        """
+        Method used to emit the JSON log lines through log and, when configured, the Prometheus text file and the StatsD gauges.
+        """
+
+        for line in self.json_lines():
+            log(line)
+
+        if prometheus_path:
+            self.write_prometheus(prometheus_path)
+
+        if statsd_host:
+            self.send_statsd(statsd_host, statsd_port)
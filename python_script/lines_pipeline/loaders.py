@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import pyarrow as pa
+from google.cloud import bigquery
+
+# Default number of rows per record batch sent by the streaming loader
+DEFAULT_CHUNK_ROWS = 10000
+
+# First google-cloud-bigquery-storage release whose AppendRowsStream accepts Arrow rows (AppendRowsRequest.ArrowData exists since 2.27.0,
+# but the writer of the earlier releases reads proto_rows.writer_schema from every request template)
+MIN_STORAGE_VERSION = (2, 30, 0)
+
+# BigQuery types of the Arrow types produced by the transform step
+BIGQUERY_TYPES = {
+    pa.string(): "STRING",
+    pa.int64(): "INTEGER",
+    pa.float64(): "FLOAT",
+    pa.bool_(): "BOOLEAN",
+    pa.date32(): "DATE",
+}
+
+
+def _normalise_schema(schema):
+    """
+    Method used to replace the Arrow types pandas produces but BigQuery does not expect (dictionary for categoricals, large_string for str) by plain ones.
+    """
+
+    fields = []
+    for field in schema:
+        field_type = field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+        if pa.types.is_large_string(field_type):
+            field_type = pa.string()
+        fields.append(pa.field(field.name, field_type, nullable=field.nullable))
+
+    return pa.schema(fields)
+
+
+def bigquery_schema(schema):
+    """
+    Method used to translate an Arrow schema into a list of BigQuery SchemaField.
+    """
+
+    fields = []
+    for field in schema:
+        field_type = "TIMESTAMP" if pa.types.is_timestamp(field.type) else BIGQUERY_TYPES[field.type]
+        fields.append(bigquery.SchemaField(field.name, field_type, mode="NULLABLE" if field.nullable else "REQUIRED"))
+
+    return fields
+
+
+class BatchLoader:
+    """
+    Historical backend: one load job per dataframe through load_table_from_dataframe.
+    The first dataframe truncates the table, the following ones are appended.
+    """
+
+    def __init__(self, client, table) -> None:
+        self.client = client
+        self.table = table
+        self.row_count = 0
+        self._load_jobs = []
+
+    @property
+    def jobs(self):
+        return list(self._load_jobs)
+
+    def write(self, df):
+        write_disposition = "WRITE_APPEND" if self._load_jobs else "WRITE_TRUNCATE"
+        load_job = self.client.load_table_from_dataframe(df, self.table, job_config=bigquery.LoadJobConfig(write_disposition=write_disposition))
+
+        # Appends must not start before the truncation is done, following jobs run while the next dataframes are produced
+        if not self._load_jobs:
+            load_job.result()
+
+        self._load_jobs.append(load_job)
+        self.row_count += len(df.index)
+
+    def close(self):
+        # Wait for the jobs to complete
+        for load_job in self._load_jobs:
+            load_job.result()
+
+        return self.row_count
+
+
+class StreamingLoader:
+    """
+    Streaming backend: dataframes are converted to Arrow record batches of chunk_rows rows and sent to a sink as soon as they are produced.
+    """
+
+    def __init__(self, sink, chunk_rows=DEFAULT_CHUNK_ROWS) -> None:
+        self.sink = sink
+        self.chunk_rows = chunk_rows
+        self.row_count = 0
+        self.schema = None
+
+    def write(self, df):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        # The sink is opened with the schema of the first dataframe
+        if self.schema is None:
+            self.schema = _normalise_schema(table.schema)
+            self.sink.open(self.schema)
+
+        for batch in table.cast(self.schema).to_batches(max_chunksize=self.chunk_rows):
+            self.sink.append(batch)
+            self.row_count += batch.num_rows
+
+    def close(self):
+        self.sink.commit()
+
+        return self.row_count
+
+
+def storage_write_modules():
+    """
+    Method used to import the Storage Write API modules (bigquery_storage_v1, its types and its writer), checking the installed release supports Arrow appends.
+    Imported on demand so the batch backend does not depend on the Storage API package.
+    """
+
+    from importlib import metadata
+
+    try:
+        version = metadata.version("google-cloud-bigquery-storage")
+        from google.cloud import bigquery_storage_v1
+        from google.cloud.bigquery_storage_v1 import types, writer
+    except (ImportError, metadata.PackageNotFoundError) as e:
+        raise ImportError("The streaming loader backend requires google-cloud-bigquery-storage>=%s" % ".".join(map(str, MIN_STORAGE_VERSION))) from e
+
+    if tuple(int(part) for part in version.split(".")[:3] if part.isdigit()) < MIN_STORAGE_VERSION:
+        raise ImportError("The streaming loader backend requires google-cloud-bigquery-storage>=%s (Arrow appends), %s is installed" % (".".join(map(str, MIN_STORAGE_VERSION)), version))
+
+    return bigquery_storage_v1, types, writer
+
+
+class StorageWriteSink:
+    """
+    Sink sending Arrow record batches through the BigQuery Storage Write API.
+    The table is recreated on open, rows are appended to a pending stream and committed atomically on commit.
+    Requires google-cloud-bigquery-storage (MIN_STORAGE_VERSION or later), checked when the sink is built.
+    """
+
+    def __init__(self, client, table, write_client=None) -> None:
+        self.client = client
+        self.table = table
+        self.write_client = write_client
+        self._storage, self._types, self._writer = storage_write_modules()
+        self._stream = None
+        self._write_stream = None
+        self._parent = None
+        self._futures = []
+
+    def schema_request(self, write_stream, schema):
+        """
+        Method used to build the request template of the connection, carrying the writer schema sent once with its first request.
+        """
+
+        return self._types.AppendRowsRequest(
+            write_stream=write_stream,
+            arrow_rows=self._types.AppendRowsRequest.ArrowData(writer_schema=self._types.ArrowSchema(serialized_schema=schema.serialize().to_pybytes())),
+        )
+
+    def rows_request(self, batch):
+        """
+        Method used to build the request appending an Arrow record batch.
+        """
+
+        return self._types.AppendRowsRequest(
+            arrow_rows=self._types.AppendRowsRequest.ArrowData(rows=self._types.ArrowRecordBatch(serialized_record_batch=batch.serialize().to_pybytes()))
+        )
+
+    def open(self, schema):
+        # Recreate the table, the equivalent of the WRITE_TRUNCATE disposition of the batch backend
+        self.client.delete_table(self.table, not_found_ok=True)
+        table = self.client.create_table(bigquery.Table(self.table, schema=bigquery_schema(schema)))
+
+        self.write_client = self.write_client or self._storage.BigQueryWriteClient()
+        self._parent = self.write_client.table_path(table.project, table.dataset_id, table.table_id)
+        self._write_stream = self.write_client.create_write_stream(parent=self._parent, write_stream=self._types.WriteStream(type_=self._types.WriteStream.Type.PENDING))
+
+        self._stream = self._writer.AppendRowsStream(self.write_client, self.schema_request(self._write_stream.name, schema))
+
+    def append(self, batch):
+        # Requests are pipelined, acknowledgements are checked on commit
+        self._futures.append(self._stream.send(self.rows_request(batch)))
+
+    def commit(self):
+        if self._stream is None:
+            return
+
+        for future in self._futures:
+            future.result()
+        self._stream.close()
+
+        self.write_client.finalize_write_stream(name=self._write_stream.name)
+        response = self.write_client.batch_commit_write_streams(self._types.BatchCommitWriteStreamsRequest(parent=self._parent, write_streams=[self._write_stream.name]))
+
+        if response.stream_errors:
+            raise RuntimeError("Storage Write API commit failed: %s" % response.stream_errors)
+
+
+class RecordingSink:
+    """
+    In-process sink recording the batches it receives, used to run the streaming backend without BigQuery.
+    """
+
+    def __init__(self) -> None:
+        self.schema = None
+        self.batches = []
+        self.committed = False
+
+    def open(self, schema):
+        self.schema = schema
+
+    def append(self, batch):
+        self.batches.append(batch)
+
+    def commit(self):
+        self.committed = True
+
+    def to_table(self):
+        return pa.Table.from_batches(self.batches, schema=self.schema)
+
+
+def build_loader(backend, client, table, chunk_rows=DEFAULT_CHUNK_ROWS, sink=None):
+    """
+    Method used to build the loader of the configured backend: "batch" (load jobs) or "streaming" (Storage Write API, or the given sink).
+    """
+
+    if backend == "batch":
+        return BatchLoader(client, table)
+
+    if backend == "streaming":
+        return StreamingLoader(sink or StorageWriteSink(client, table), chunk_rows=chunk_rows)
+
+    raise ValueError("Unknown loader backend: %s" % backend)
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import functools
+
+# Custom modules
+from lines_pipeline.schema import CHANGE_DELETE, VERSION_COLUMNS
+
+# This module is imported at DAG parse time: google-cloud-bigquery is only imported by the functions running jobs
+
+# Query parameters bounding the keys loaded in the temporary table, used as constant pruning predicates
+KEY_RANGE_PARAMETERS = ("@min_key", "@max_key")
+
+
+class KeyRange:
+    """
+    Track the range of the keys loaded to the temporary table, used as constant pruning predicate by the MERGE.
+    """
+
+    def __init__(self, key) -> None:
+        self.key = key
+        self.min_key = None
+        self.max_key = None
+
+    def update(self, df):
+        """
+        Method used to widen the range with the keys of a dataframe.
+        """
+
+        if df.empty:
+            return
+
+        keys = df[self.key].dropna()
+        if keys.empty:
+            return
+
+        self.min_key = keys.min() if self.min_key is None else min(self.min_key, keys.min())
+        self.max_key = keys.max() if self.max_key is None else max(self.max_key, keys.max())
+
+
+def history_table(table_id, layout):
+    """
+    Method used to return the identifier of the history table of a layout, None when the layout has no history table.
+    """
+
+    return table_id + layout.history_suffix if layout.history_suffix else None
+
+
+def _create_table(table_schema, table_id, partition_by, cluster_by, extra_columns=()):
+    columns = []
+    for column in table_schema.columns + extra_columns:
+        definition = "  " + column.name + " " + column.type
+        if column.required:
+            definition += " NOT NULL"
+        if column.default:
+            definition += " DEFAULT " + column.default
+        definition += " OPTIONS (description = '" + column.description.replace("'", "\\'") + "')"
+        columns.append(definition)
+
+    sql = "CREATE TABLE IF NOT EXISTS " + table_id + " (\n" + ",\n".join(columns) + ")\n"
+    if partition_by:
+        sql += "  PARTITION BY " + partition_by + "\n"
+    if cluster_by:
+        sql += "  CLUSTER BY " + ", ".join(cluster_by) + "\n"
+
+    labels = ", ".join("('%s', '%s')" % label for label in table_schema.labels)
+    sql += "  OPTIONS (\n    description = '" + table_schema.description.replace("'", "\\'") + "',\n    labels = [" + labels + "]\n  )"
+
+    return sql
+
+
+@functools.lru_cache(maxsize=None)
+def create_table_statements(table_schema, table_id, layout):
+    """
+    Method used to generate the CREATE TABLE statements of the destination table (and of its history table) for a layout.
+    Statements are cached per table, layout and identifiers.
+    """
+
+    statements = [_create_table(table_schema, table_id, layout.partition_by, layout.cluster_by, VERSION_COLUMNS if layout.versioned else ())]
+
+    if layout.history_suffix:
+        statements.append(_create_table(table_schema, history_table(table_id, layout), layout.history_partition_by, layout.history_cluster_by))
+
+    return tuple(statements)
+
+
+def _value(column):
+    return column.merge_expression or "N." + column.name
+
+
+def _unchanged_predicate(table_schema):
+    # Null-safe equality of every business column
+    return " AND ".join("B." + column.name + " IS NOT DISTINCT FROM N." + column.name for column in table_schema.business_columns)
+
+
+def _pruning_predicate(key, key_range, alias):
+    # Constant predicate restricting a reference of the target (its alias) to the range of loaded keys, empty without key range
+    if not key_range:
+        return ""
+
+    return " AND " + alias + "." + key + " BETWEEN " + key_range[0] + " AND " + key_range[1]
+
+
+def _row_hash(table_schema, alias):
+    # Fingerprint of the business columns, the key and the technical columns are left out as for the CDC hash
+    return "FARM_FINGERPRINT(TO_JSON_STRING(STRUCT(" + ", ".join(alias + "." + column.name for column in table_schema.business_columns) + ")))"
+
+
+def _versioned_merge(table_schema, target, source, key_range, incremental):
+    """
+    Method used to generate the MERGE of a versioned layout (slowly changing dimension of type 2) in a single statement, so the closed version
+    and the new one share the same CURRENT_TIMESTAMP(). The source is read twice: once keyed on the line to close the current version of
+    changed (or deleted) lines and insert new lines, and once with a null key to insert the new version of changed lines.
+    Unchanged lines match with the same hash and are not written. Both references of the target are restricted to the key range, if any.
+    """
+
+    key = table_schema.key
+    version_columns = [column.name for column in VERSION_COLUMNS]
+    not_deleted = "S.change_type != '" + CHANGE_DELETE + "'" if incremental else ""
+
+    # Current versions whose hash moved, their new version is inserted next to the closed one
+    changed_join = (
+        "JOIN " + target + " C ON C." + key + " = S." + key + " AND C.valid_to IS NULL" + _pruning_predicate(key, key_range, "C")
+        + " AND C.row_hash != S.row_hash"
+    )
+
+    using = (
+        "(\n  WITH S AS (SELECT H.*, " + _row_hash(table_schema, "H") + " AS row_hash FROM " + source + " H)\n"
+        + "  SELECT S." + key + " AS merge_key, S.* FROM S\n"
+        + "  UNION ALL\n"
+        + "  SELECT CAST(NULL AS STRING) AS merge_key, S.* FROM S " + changed_join + ("\n  WHERE " + not_deleted if not_deleted else "")
+        + "\n)"
+    )
+
+    on_clause = "ON B." + key + " = N.merge_key AND B.valid_to IS NULL" + _pruning_predicate(key, key_range, "B")
+
+    close_condition = "B.row_hash != N.row_hash"
+    if incremental:
+        close_condition = "(N.change_type = '" + CHANGE_DELETE + "' OR " + close_condition + ")"
+
+    insert_condition = " AND N.change_type != '" + CHANGE_DELETE + "'" if incremental else ""
+    clauses = [
+        "WHEN MATCHED AND " + close_condition + " THEN\n  UPDATE SET\n    valid_to = CURRENT_TIMESTAMP()",
+        "WHEN NOT MATCHED" + insert_condition + " THEN\n  INSERT (\n"
+        + ",\n".join("    " + name for name in table_schema.column_names + version_columns)
+        + "\n  ) VALUES(\n"
+        + ",\n".join("    " + _value(column) for column in table_schema.columns)
+        + ",\n    CURRENT_TIMESTAMP(),\n    NULL,\n    N.row_hash\n  )",
+    ]
+
+    return "MERGE " + target + " B\nUSING " + using + " N\n" + on_clause + "\n" + "\n".join(clauses)
+
+
+@functools.lru_cache(maxsize=None)
+def merge_statements(table_schema, target, source, layout, incremental=False, key_range=KEY_RANGE_PARAMETERS):
+    """
+    Method used to generate the statements merging the temporary table into the destination table.
+
+    - When the first clustering column of the layout is the key, the target is restricted to the range of loaded keys
+      (key_range holds two constant SQL expressions, query parameters by default) so BigQuery only reads the matching blocks.
+    - Matched rows are only updated when a business column changed, so unchanged lines are never rewritten.
+    - In incremental mode, rows flagged as deleted by change_type are removed and never inserted.
+    - With a history table, every new version is first appended to the history table.
+    - With a versioned layout, the current version of changed lines is closed and their new version inserted (see _versioned_merge).
+    Statements are cached per table, layout, identifiers and options.
+    """
+
+    key = table_schema.key
+    update_columns = [column for column in table_schema.columns if column.name != key]
+    statements = []
+
+    # Range of loaded keys restricting the target, when the layout prunes on the key
+    if not layout.prunes_on(key):
+        key_range = None
+
+    if layout.versioned:
+        return (_versioned_merge(table_schema, target, source, key_range, incremental),)
+
+    pruning_predicate = _pruning_predicate(key, key_range, "B")
+
+    # Versions that differ from the current state are appended to the history table before the current state moves
+    if layout.history_suffix:
+        conditions = ["NOT EXISTS (SELECT 1 FROM " + target + " B WHERE B." + key + " = N." + key + pruning_predicate + " AND " + _unchanged_predicate(table_schema) + ")"]
+        if incremental:
+            conditions.insert(0, "N.change_type != '" + CHANGE_DELETE + "'")
+        statements.append(
+            "INSERT INTO " + history_table(target, layout) + " (" + ", ".join(table_schema.column_names) + ")\n"
+            + "SELECT " + ", ".join(_value(column) for column in table_schema.columns) + "\n"
+            + "FROM " + source + " N\n"
+            + "WHERE " + "\n  AND ".join(conditions)
+        )
+
+    on_clause = "ON B." + key + " = N." + key
+    if pruning_predicate:
+        on_clause += "\n " + pruning_predicate
+
+    clauses = []
+    if incremental:
+        clauses.append("WHEN MATCHED AND N.change_type = '" + CHANGE_DELETE + "' THEN\n  DELETE")
+
+    clauses.append(
+        "WHEN MATCHED AND NOT (" + _unchanged_predicate(table_schema) + ") THEN\n  UPDATE SET\n"
+        + ",\n".join("    " + column.name + " = " + _value(column) for column in update_columns)
+    )
+
+    insert_condition = " AND N.change_type != '" + CHANGE_DELETE + "'" if incremental else ""
+    clauses.append(
+        "WHEN NOT MATCHED" + insert_condition + " THEN\n  INSERT (\n"
+        + ",\n".join("    " + column.name for column in table_schema.columns)
+        + "\n  ) VALUES(\n"
+        + ",\n".join("    " + _value(column) for column in table_schema.columns)
+        + "\n  )"
+    )
+
+    statements.append("MERGE " + target + " B\nUSING " + source + " N\n" + on_clause + "\n" + "\n".join(clauses))
+
+    return tuple(statements)
+
+
+def as_of_query(table_schema, table_id, as_of="@as_of"):
+    """
+    Method used to generate the query of the state of a versioned table at a point in time (as_of being a constant TIMESTAMP expression,
+    a query parameter by default). Partitions of versions starting after as_of are pruned.
+    """
+
+    return (
+        "SELECT " + ", ".join(table_schema.column_names) + "\n"
+        + "FROM " + table_id + "\n"
+        + "WHERE valid_from <= " + as_of + "\n"
+        + "  AND (valid_to IS NULL OR valid_to > " + as_of + ")"
+    )
+
+
+def key_history_query(table_schema, table_id, key="@key"):
+    """
+    Method used to generate the query of every version of a line of a versioned table (key being a constant expression, a query parameter by default).
+    The table is clustered on the key, so only the blocks of the line are read in each partition.
+    """
+
+    return (
+        "SELECT " + ", ".join(table_schema.column_names + [column.name for column in VERSION_COLUMNS]) + "\n"
+        + "FROM " + table_id + "\n"
+        + "WHERE " + table_schema.key + " = " + key + "\n"
+        + "ORDER BY valid_from"
+    )
+
+
+def key_range_parameters(table_schema, layout, min_key, max_key):
+    """
+    Method used to build the query parameters matching KEY_RANGE_PARAMETERS, empty when the layout does not prune on the key.
+    """
+
+    if not layout.prunes_on(table_schema.key):
+        return []
+
+    from google.cloud import bigquery
+
+    return [bigquery.ScalarQueryParameter("min_key", "STRING", min_key), bigquery.ScalarQueryParameter("max_key", "STRING", max_key)]
+
+
+def key_range_query_params(table_schema, layout, min_key, max_key):
+    """
+    Method used to build the query parameters matching KEY_RANGE_PARAMETERS in the format of the BigQuery REST API (e.g. query_params of the
+    Airflow BigQuery operator), the values may be templates rendered when the task runs. Empty when the layout does not prune on the key.
+    """
+
+    if not layout.prunes_on(table_schema.key):
+        return []
+
+    return [
+        {"name": name, "parameterType": {"type": "STRING"}, "parameterValue": {"value": value}}
+        for name, value in [("min_key", min_key), ("max_key", max_key)]
+    ]
+
+
+def dry_run_bytes(client, statements, query_parameters=()):
+    """
+    Method used to estimate the bytes processed by statements through dry-run jobs (no slot time, no cost).
+    """
+
+    from google.cloud import bigquery
+
+    total_bytes = 0
+    for statement in statements:
+        job = client.query(statement, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False, query_parameters=list(query_parameters)))
+        total_bytes += job.total_bytes_processed or 0
+
+    return total_bytes
+
+
+def write_sql_resources(table_schema, directory, destination="destination_project.destintation_dataset", temporary="destination_project.temporary_dataset"):
+    """
+    Method used to write the reference SQL scripts of a table (DDL, full, incremental and pruned MERGE, versioned layout) generated from its definition.
+    Returns the paths of the written files.
+    """
+
+    target = destination + "." + table_schema.name
+    source = temporary + "." + table_schema.name
+    legacy = table_schema.layout("legacy")
+    scd2 = table_schema.layout("scd2")
+
+    scripts = {
+        table_schema.name + "_ddl.sql": create_table_statements(table_schema, target, legacy),
+        "merge_dml.sql": merge_statements(table_schema, target, source, legacy),
+        "merge_incremental_dml.sql": merge_statements(table_schema, target, source, legacy, incremental=True),
+        "merge_pruned_dml.sql": merge_statements(table_schema, target, source, table_schema.layout("current_and_history")),
+        table_schema.name + "_scd2_ddl.sql": create_table_statements(table_schema, target, scd2),
+        "merge_scd2_dml.sql": merge_statements(table_schema, target, source, scd2, incremental=True),
+        table_schema.name + "_scd2_queries.sql": (as_of_query(table_schema, target), key_history_query(table_schema, target)),
+    }
+
+    paths = []
+    for file_name, statements in scripts.items():
+        path = os.path.join(directory, file_name)
+        with open(path, "w", encoding="utf-8") as sql_file:
+            sql_file.write(";\n".join(statements) + ";\n")
+        paths.append(path)
+
+    return paths
+
+
+if __name__ == "__main__":
+    # Regenerate the scripts of /sql_resources: python -m lines_pipeline.merge ../sql_resources
+    import sys
+    from lines_pipeline import schema
+
+    for table_name in schema.TABLES:
+        for path in write_sql_resources(schema.get_table_schema(table_name), sys.argv[1] if len(sys.argv) > 1 else "."):
+            print("Written: %s" % path)
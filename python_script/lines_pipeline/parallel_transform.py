@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import shutil
+import tempfile
+import itertools
+import collections
+import multiprocessing
+import pyarrow as pa
+from concurrent.futures import ProcessPoolExecutor
+
+# Custom modules
+from lines_pipeline import transform
+
+# Default number of worker processes, and number of raw lines below which the transform runs in process (small runs do not pay the pool startup)
+DEFAULT_MAX_WORKERS = os.cpu_count() or 1
+DEFAULT_MIN_ROWS = 200000
+
+# tmpfs mount backing POSIX shared memory, partitions are exchanged as Arrow IPC files memory-mapped from there
+SHARED_MEMORY_DIRECTORY = "/dev/shm"
+
+
+def shared_memory_directory():
+    """
+    Method used to return the directory the partitions are exchanged through, the temporary directory when there is no shared memory mount.
+    """
+
+    if os.path.isdir(SHARED_MEMORY_DIRECTORY) and os.access(SHARED_MEMORY_DIRECTORY, os.W_OK):
+        return SHARED_MEMORY_DIRECTORY
+
+    return tempfile.gettempdir()
+
+
+def write_ipc(path, data):
+    """
+    Method used to write an Arrow RecordBatch or Table as an Arrow IPC stream file.
+    """
+
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_stream(sink, data.schema) as writer:
+            writer.write(data)
+
+
+def read_ipc(path):
+    """
+    Method used to read an Arrow IPC stream file without copy: the returned Table references the memory-mapped file,
+    which stays mapped (even once removed) as long as the Table is alive.
+    """
+
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_stream(source).read_all()
+
+
+def transform_partition(input_path, output_path):
+    """
+    Method used by the worker processes to transform a partition of raw lines written by the parent, the transformed lines are written back as Arrow.
+    Returns the path of the transformed partition.
+    """
+
+    raw = read_ipc(input_path)
+    os.remove(input_path)
+
+    # Columns are converted one block each and released from the table as they are, instead of being consolidated into a copy
+    df = transform.transform_lines(raw.to_pandas(split_blocks=True, self_destruct=True))
+    write_ipc(output_path, pa.Table.from_pandas(df, preserve_index=False))
+
+    return output_path
+
+
+class ParallelTransformer:
+    """
+    Transform the raw record batches of the extract step over a pool of processes, one batch being one partition.
+    Partitions go to the workers and come back as Arrow IPC files in shared memory, memory-mapped on both sides instead of pickled,
+    and the transformed dataframes are yielded in the order of the raw batches while the next partitions are transformed.
+    The first min_rows lines are transformed in process and yielded as they arrive, the pool only takes the following batches,
+    so small payloads never start it, as do all payloads when max_workers is 1.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, min_rows=DEFAULT_MIN_ROWS, start_method=None) -> None:
+        self.max_workers = max_workers
+        self.min_rows = min_rows
+
+        # The pool is started while HTTP and BigQuery threads are running: a forked worker could inherit a lock held by one of them,
+        # forkserver forks the workers from a single-threaded server (the main module, e.g. the script, has to be guarded by __main__), spawn is the fallback elsewhere
+        self.start_method = start_method or ("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+    def transform_batches(self, batches):
+        """
+        Method used to transform an iterable of raw record batches (see lines_pipeline.extract) into the dataframes loaded to the temporary table.
+        """
+
+        batches = iter(batches)
+
+        # Batches are transformed in process and yielded right away until the payload is known to be large enough for the pool
+        rows = 0
+        for batch in batches:
+            if self.max_workers > 1 and rows >= self.min_rows:
+                yield from self._transform_in_pool(itertools.chain([batch], batches))
+                return
+
+            rows += batch.num_rows
+            yield transform.transform_batch(batch)
+
+    def _transform_in_pool(self, batches):
+        directory = tempfile.mkdtemp(prefix="lines_transform_", dir=shared_memory_directory())
+        context = multiprocessing.get_context(self.start_method)
+        in_flight = collections.deque()
+
+        # The fork server imports pandas and pyarrow once, the workers forked from it do not import them again
+        if self.start_method == "forkserver":
+            context.set_forkserver_preload([__name__])
+
+        def collect():
+            # The transformed partition is memory-mapped and removed, the mapping lives until the dataframe is built:
+            # one block per column (no consolidation copy), each column being released from the mapping once converted
+            output_path = in_flight.popleft().result()
+            table = read_ipc(output_path)
+            os.remove(output_path)
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as executor:
+                for index, batch in enumerate(batches):
+                    input_path = os.path.join(directory, "%06d.raw.arrow" % index)
+                    write_ipc(input_path, batch)
+                    in_flight.append(executor.submit(transform_partition, input_path, os.path.join(directory, "%06d.arrow" % index)))
+
+                    # At most two partitions per worker are in flight, so memory stays bounded on large payloads
+                    if len(in_flight) >= 2 * self.max_workers:
+                        yield collect()
+
+                while in_flight:
+                    yield collect()
+
+        finally:
+            for future in in_flight:
+                future.cancel()
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import json
+import time
+import gzip
+import hashlib
+import tempfile
+import contextlib
+
+# Default eviction policy: total size of the cached bodies and age of an entry
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+# Default size of the chunks read from the HTTP body or from the cached body
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# How the body of a response is obtained
+DOWNLOADED = "downloaded"
+REPLAYED = "replayed"
+UNCHANGED = "unchanged"
+
+
+class CachedResponse:
+    """
+    Response returned by ResponseCache.get, exposing the body through iter_content() as requests does.
+    - downloaded: the body comes from the network and is written to the cache while it is read.
+    - replayed: the server answered 304 Not Modified and the body is read from the cache (e.g. retried run).
+    - unchanged: the server answered 304 Not Modified for a body already processed successfully, there is nothing to do.
+    """
+
+    def __init__(self, status, cache=None, url=None, response=None, path=None, headers=None) -> None:
+        self.status = status
+        self.cache = cache
+        self.url = url
+        self.response = response
+        self.path = path
+        self.headers = headers or {}
+
+    @property
+    def unchanged(self):
+        return self.status == UNCHANGED
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+
+    def iter_content(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        if self.status == UNCHANGED:
+            return
+
+        if self.status == REPLAYED:
+            with gzip.open(self.path, "rb") as body:
+                yield from iter(lambda: body.read(chunk_size), b"")
+            return
+
+        try:
+            if self.cache is None:
+                yield from self.response.iter_content(chunk_size=chunk_size)
+                return
+
+            # Body is only stored once it has been read entirely, each writer has its own temporary file (runs of the same URL may overlap)
+            temporary_path = self.cache.temporary_path(self.url)
+            try:
+                with gzip.open(temporary_path, "wb", compresslevel=1) as body:
+                    for chunk in self.response.iter_content(chunk_size=chunk_size):
+                        body.write(chunk)
+                        yield chunk
+
+                self.cache.store(self.url, temporary_path, self.headers)
+
+            finally:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temporary_path)
+
+        finally:
+            self.close()
+
+
+class ResponseCache:
+    """
+    Local cache of raw API responses keyed by URL: gzip-compressed bodies and their validators (ETag, Last-Modified).
+    Requests are sent as conditional requests when an entry exists. A stored body stays pending until commit() is called
+    once it has been processed successfully: a 304 then means there is nothing to do, while a 304 on a pending entry replays the cached body.
+    Only responses carrying a validator are stored. Entries older than max_age are dropped when they are looked up and when a body is stored,
+    the entry of the body being stored is never evicted.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def body_path(self, url):
+        return os.path.join(self.directory, self._key(url) + ".body.gz")
+
+    def metadata_path(self, url):
+        return os.path.join(self.directory, self._key(url) + ".json")
+
+    def temporary_path(self, url):
+        """
+        Method used to create a new temporary file in the cache directory, renamed into place once complete.
+        """
+
+        descriptor, path = tempfile.mkstemp(prefix=self._key(url) + ".", suffix=".tmp", dir=self.directory)
+        os.close(descriptor)
+
+        return path
+
+    def _write_metadata(self, url, entry):
+        # Written to a temporary file then renamed, concurrent readers never see a partial entry
+        temporary_path = self.temporary_path(url)
+        with open(temporary_path, "w", encoding="utf-8") as metadata_file:
+            json.dump(entry, metadata_file)
+        os.replace(temporary_path, self.metadata_path(url))
+
+    def _remove(self, url):
+        for path in (self.body_path(url), self.metadata_path(url)):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    def entry(self, url):
+        """
+        Method used to return the metadata of the entry of a URL, None when there is no usable entry (an expired entry is removed).
+        """
+
+        try:
+            with open(self.metadata_path(url), encoding="utf-8") as metadata_file:
+                entry = json.load(metadata_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if not os.path.exists(self.body_path(url)):
+            return None
+
+        if time.time() - entry["stored_at"] > self.max_age:
+            self._remove(url)
+            return None
+
+        return entry
+
+    def get(self, session, url, **kwargs):
+        """
+        Method used to send a conditional GET request and return a CachedResponse.
+        session can be a requests.Session or a lines_pipeline.http_client.ParallelExtractor (url being then an endpoint).
+        """
+
+        full_url = session.url(url) if hasattr(session, "url") else url
+        entry = self.entry(full_url)
+
+        # Send the validators of the cached body
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = session.get(url, stream=True, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry:
+            response.close()
+            return CachedResponse(UNCHANGED if entry["committed"] else REPLAYED, path=self.body_path(full_url), headers={"etag": entry.get("etag"), "last_modified": entry.get("last_modified")})
+
+        # Check if the request was successful, the connection is given back when it was not
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+
+        validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        if not validators["etag"] and not validators["last_modified"]:
+            return CachedResponse(DOWNLOADED, response=response)
+
+        return CachedResponse(DOWNLOADED, cache=self, url=full_url, response=response, headers=validators)
+
+    def store(self, url, temporary_path, validators):
+        """
+        Method used to promote a fully read body as the pending entry of a URL, then apply the eviction policy to the other entries.
+        """
+
+        size = os.path.getsize(temporary_path)
+        os.replace(temporary_path, self.body_path(url))
+        self._write_metadata(url, dict(validators, url=url, stored_at=time.time(), size=size, committed=False))
+
+        self.evict(keep=url)
+
+    def commit(self, url):
+        """
+        Method used to flag the entry of a URL as processed successfully, a 304 Not Modified will then skip the run.
+        """
+
+        entry = self.entry(url)
+        if entry is None:
+            return
+
+        entry["committed"] = True
+        self._write_metadata(url, entry)
+
+    def evict(self, keep=None):
+        """
+        Method used to drop the entries older than max_age, then the oldest entries until the bodies fit in max_bytes.
+        The entry of the URL keep (the body of the current run) is never dropped.
+        """
+
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name), encoding="utf-8") as metadata_file:
+                    entries.append(json.load(metadata_file))
+            except (FileNotFoundError, ValueError):
+                continue
+
+        entries.sort(key=lambda entry: entry["stored_at"])
+        total_bytes = sum(entry["size"] for entry in entries)
+        now = time.time()
+
+        for entry in entries:
+            if entry["url"] == keep or (now - entry["stored_at"] <= self.max_age and total_bytes <= self.max_bytes):
+                continue
+
+            self._remove(entry["url"])
+            total_bytes -= entry["size"]
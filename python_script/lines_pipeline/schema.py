@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import functools
+from dataclasses import dataclass, field
+
+# This module is imported at DAG parse time: it only depends on the standard library, pandas and pyarrow are imported when an artifact needs them
+
+# Values of the change_type column shipped to the temporary table in incremental mode
+CHANGE_INSERT = "I"
+CHANGE_UPDATE = "U"
+CHANGE_DELETE = "D"
+
+# Column flagging the change detected for each row of the temporary table in incremental mode
+CHANGE_TYPE_FIELD = {"name": "change_type", "type": "STRING", "mode": "REQUIRED", "description": "Change detected for the line: I(nserted), U(pdated) or D(eleted)."}
+
+# Patterns the raw (STRING) values of the API have to match to be cast to their column type by the transform, INTEGER values fit in an INT64
+_RAW_PATTERNS = {
+    "INTEGER": r"^[+-]?[0-9]{1,18}(\.0*)?$",
+    "INT64": r"^[+-]?[0-9]{1,18}(\.0*)?$",
+    "FLOAT": r"^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$",
+    "FLOAT64": r"^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$",
+}
+
+
+@dataclass(frozen=True)
+class Column:
+    """
+    Column of a destination table.
+    merge_expression replaces the value coming from the temporary table in the MERGE (e.g. CURRENT_TIMESTAMP() for load_timestamp).
+    technical columns are produced by the ETL and left out when deciding whether a row changed.
+    source_field is the field name communicated by the API, allowed_values the closed list of values accepted for the column.
+    Columns with a default value are filled by BigQuery and absent from the loaded dataframes.
+    """
+
+    name: str
+    type: str
+    mode: str = "NULLABLE"
+    description: str = ""
+    default: str = None
+    merge_expression: str = None
+    technical: bool = False
+    source_field: str = None
+    allowed_values: tuple = ()
+
+    @property
+    def required(self):
+        return self.mode == "REQUIRED"
+
+    @property
+    def loaded(self):
+        return self.default is None
+
+
+@dataclass(frozen=True)
+class TableLayout:
+    """
+    Physical layout of a destination table: partitioning expression, clustering columns and optional history table.
+    With a history table, the destination only holds the current state of each key and every merged version is appended to <table><history_suffix>.
+    A versioned layout keeps every version of each key in the destination itself (slowly changing dimension of type 2), see VERSION_COLUMNS.
+    """
+
+    name: str
+    partition_by: str = None
+    cluster_by: tuple = ()
+    history_suffix: str = None
+    history_partition_by: str = None
+    history_cluster_by: tuple = ()
+    versioned: bool = False
+
+    def prunes_on(self, column):
+        # Clustering prunes blocks on a constant range of the first clustering column
+        return bool(self.cluster_by) and self.cluster_by[0] == column
+
+
+@dataclass(frozen=True)
+class TableSchema:
+    """
+    Definition of a destination table.
+    """
+
+    name: str
+    key: str
+    columns: tuple
+    description: str = ""
+    labels: tuple = ()
+    layouts: dict = field(default_factory=dict, compare=False)
+
+    @property
+    def column_names(self):
+        return [column.name for column in self.columns]
+
+    @property
+    def business_columns(self):
+        return [column for column in self.columns if not column.technical and column.name != self.key]
+
+    @property
+    def loaded_columns(self):
+        return [column for column in self.columns if column.loaded]
+
+    @property
+    def source_fields(self):
+        return [(column.name, column.source_field) for column in self.columns if column.source_field]
+
+    def column(self, name):
+        for column in self.columns:
+            if column.name == name:
+                return column
+        raise KeyError("Unknown column %s for table %s" % (name, self.name))
+
+    def layout(self, name):
+        if name not in self.layouts:
+            raise ValueError("Unknown layout %s for table %s, expected one of: %s" % (name, self.name, ", ".join(self.layouts)))
+        return self.layouts[name]
+
+
+# Columns added to the destination table by a versioned layout: validity interval of each version and content hash of its business columns
+VERSION_COLUMNS = (
+    Column("valid_from", "TIMESTAMP", "REQUIRED", "Start of the validity of this version of the line, the time it has been merged.", technical=True),
+    Column("valid_to", "TIMESTAMP", "NULLABLE", "End of the validity of this version of the line, null for the current version.", technical=True),
+    Column("row_hash", "INT64", "REQUIRED", "Fingerprint of the business columns of this version, compared to detect changes.", technical=True),
+)
+
+# Layouts of the lines table:
+# - legacy: historical layout, every MERGE scans the whole table and updates move rows between partitions
+# - cluster_on_key: unpartitioned and clustered on the key, the MERGE prunes blocks to the range of loaded keys
+# - current_and_history: current state clustered on the key, plus an append-only history partitioned by load date
+# - scd2: every version of each line with its validity interval, partitioned on valid_from and clustered on the key, only changed keys are written
+LINES_LAYOUTS = {
+    "legacy": TableLayout("legacy", partition_by="DATE(load_timestamp)", cluster_by=("line_public_number",)),
+    "cluster_on_key": TableLayout("cluster_on_key", cluster_by=("pk_line_id",)),
+    "current_and_history": TableLayout(
+        "current_and_history",
+        cluster_by=("pk_line_id",),
+        history_suffix="_history",
+        history_partition_by="DATE(load_timestamp)",
+        history_cluster_by=("pk_line_id",),
+    ),
+    "scd2": TableLayout("scd2", partition_by="DATE(valid_from)", cluster_by=("pk_line_id",), versioned=True),
+}
+
+LINES = TableSchema(
+    name="lines",
+    key="pk_line_id",
+    columns=(
+        Column("uuid_line", "STRING", "REQUIRED", "A unique identifier generated through the ETL process.", technical=True),
+        Column("pk_line_id", "STRING", "REQUIRED", "Primary key of the table. A line is a predetermined route along several timingpoints."),
+        Column("line_name", "STRING", "NULLABLE", "Name of the line.", source_field="LineName"),
+        Column("transport_type", "STRING", "NULLABLE", "Type of transport, it has to be one of: BUS, TRAIN, METRO, BOAT, TRAM.", source_field="TransportType", allowed_values=("BUS", "TRAIN", "METRO", "BOAT", "TRAM")),
+        Column("line_public_number", "STRING", "NULLABLE", "Line number used when communicated with travellers. Communicated as STRING from source of truth.", source_field="LinePublicNumber"),
+        Column("data_owner_code", "STRING", "REQUIRED", "Data owner code.", source_field="DataOwnerCode"),
+        Column("destination_name_50", "STRING", "NULLABLE", "Destination name.", source_field="DestinationName50"),
+        Column("line_planning_number", "STRING", "REQUIRED", "Line planning number. Communicated as STRING from source of truth.", source_field="LinePlanningNumber"),
+        Column("line_direction", "INTEGER", "REQUIRED", "Direction of the line.", source_field="LineDirection"),
+        Column("load_timestamp", "TIMESTAMP", "NULLABLE", "Technical data corresponding to latest load date and time.", default="CURRENT_TIMESTAMP()", merge_expression="CURRENT_TIMESTAMP()", technical=True),
+        Column("source_system", "STRING", "REQUIRED", "Source system from which the data has been extracted.", technical=True),
+    ),
+    description="Consume the public API for “Transport for The Netherlands” which provides information about OVAPI, country-wide public transport",
+    labels=(("org_unit", "transport_for_netherlands"), ("information_type", "ovapi")),
+    layouts=LINES_LAYOUTS,
+)
+
+# Registry of the tables loaded by the pipelines, keyed by table name
+TABLES = {
+    LINES.name: LINES,
+}
+
+
+def get_table_schema(name):
+    """
+    Method used to return the definition of a registered table.
+    """
+
+    if name not in TABLES:
+        raise ValueError("Unknown table %s, expected one of: %s" % (name, ", ".join(TABLES)))
+
+    return TABLES[name]
+
+
+# Artifacts generated from a table definition are cached for the lifetime of the process, so building them at DAG parse time costs one generation per table
+
+
+@functools.lru_cache(maxsize=None)
+def _schema_fields(table_schema, incremental):
+    fields = []
+    for column in table_schema.columns:
+        schema_field = {"name": column.name, "type": column.type, "mode": column.mode, "description": column.description}
+        if column.default:
+            schema_field["defaultValueExpression"] = column.default
+
+        # In incremental mode deleted lines only carry their key and the technical columns, columns coming from the API are relaxed to NULLABLE
+        if incremental and column.source_field:
+            schema_field["mode"] = "NULLABLE"
+        fields.append(schema_field)
+
+    if incremental:
+        fields.append(dict(CHANGE_TYPE_FIELD))
+
+    return tuple(fields)
+
+
+def schema_fields(table_schema, incremental=False):
+    """
+    Method used to generate the BigQuery schema_fields of a table, or of its temporary table in incremental mode (relaxed modes and change_type column).
+    A new list of new dicts is returned on each call so callers can alter it.
+    """
+
+    return [dict(schema_field) for schema_field in _schema_fields(table_schema, incremental)]
+
+
+def _batch_validator_source(table_schema):
+    # One block of vectorised checks per column read from the API (the key and the columns with a source field), unrolled so the validator does not loop over the definition for every batch
+    lines = ["def validate(batch):", "    checks = []"]
+
+    for column in table_schema.columns:
+        if column.name != table_schema.key and not column.source_field:
+            continue
+
+        checks = []
+        if column.required:
+            checks.append("    checks.append((%r, pc.is_null(values)))" % (column.name + ": missing required value"))
+
+        # Null values are left to the required check
+        if column.type in _RAW_PATTERNS:
+            checks.append("    checks.append((%r, pc.invert(pc.fill_null(pc.match_substring_regex(values, %r), True))))" % (column.name + ": not a valid " + column.type, _RAW_PATTERNS[column.type]))
+
+        if column.allowed_values:
+            checks.append("    checks.append((%r, pc.invert(pc.fill_null(pc.is_in(values, value_set=pa.array(%r)), True))))" % (column.name + ": value not allowed", list(column.allowed_values)))
+
+        if checks:
+            lines.append("    values = batch.column(%r)" % column.name)
+            lines.extend(checks)
+
+    lines.append("    return checks")
+
+    return "\n".join(lines) + "\n"
+
+
+@functools.lru_cache(maxsize=None)
+def batch_validator(table_schema):
+    """
+    Method used to compile the vectorised validator of the raw record batches of a table (see lines_pipeline.extract), derived from the DDL constraints:
+    a function taking a batch and returning (reason, boolean array flagging the offending rows) pairs for required values, castable values and allowed values.
+    The checks are generated as Python source and compiled once per table.
+    """
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    namespace = {"pa": pa, "pc": pc}
+    exec(compile(_batch_validator_source(table_schema), "<batch_validator %s>" % table_schema.name, "exec"), namespace)
+
+    return namespace["validate"]
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Default Parquet settings of the staging files
+DEFAULT_CODEC = "zstd"
+DEFAULT_ROW_GROUP_SIZE = 100000
+DEFAULT_MAX_FILE_BYTES = 256 * 1024 * 1024
+
+# Low-cardinality columns written with dictionary encoding
+DEFAULT_DICTIONARY_COLUMNS = ["transport_type", "data_owner_code", "source_system"]
+
+# Arrow types matching the BigQuery types used in schema_fields
+ARROW_TYPES = {
+    "STRING": pa.string(),
+    "INTEGER": pa.int64(),
+    "INT64": pa.int64(),
+    "FLOAT": pa.float64(),
+    "FLOAT64": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+    "BOOL": pa.bool_(),
+    "DATE": pa.date32(),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+
+def arrow_schema(schema_fields, columns=None):
+    """
+    Method used to translate BigQuery schema_fields into an Arrow schema, REQUIRED fields becoming non-nullable.
+    When columns is given, only those fields are kept (e.g. load_timestamp is filled by BigQuery and absent from the files).
+    """
+
+    fields = []
+    for field in schema_fields:
+        if columns is not None and field["name"] not in columns:
+            continue
+        fields.append(pa.field(field["name"], ARROW_TYPES[field["type"]], nullable=field.get("mode", "NULLABLE") != "REQUIRED"))
+
+    return pa.schema(fields)
+
+
+class StagingParquetWriter:
+    """
+    Stream record batches into compressed Parquet staging files, rolling over to numbered shards
+    (<prefix>.00000.parquet, <prefix>.00001.parquet, ...) once a file reaches max_file_bytes so BigQuery can ingest them in parallel.
+    """
+
+    def __init__(self, prefix, schema_fields, codec=DEFAULT_CODEC, compression_level=None, row_group_size=DEFAULT_ROW_GROUP_SIZE, max_file_bytes=DEFAULT_MAX_FILE_BYTES, dictionary_columns=DEFAULT_DICTIONARY_COLUMNS) -> None:
+        self.prefix = prefix
+        self.schema_fields = schema_fields
+        self.codec = codec
+        self.compression_level = compression_level
+        self.row_group_size = row_group_size
+        self.max_file_bytes = max_file_bytes
+        self.dictionary_columns = dictionary_columns
+        self.schema = None
+        self.paths = []
+        self.rows_written = 0
+        self.bytes_written = 0
+        self._sink = None
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # On failure the current shard is closed as is, buffered rows are dropped
+        if exc_type is not None:
+            self._pending = []
+            self._close_shard()
+        else:
+            self.close()
+
+    def shard_path(self, shard):
+        return "%s.%05d.parquet" % (self.prefix, shard)
+
+    def _open(self):
+        # Open the next numbered shard
+        path = self.shard_path(len(self.paths))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._sink = pa.OSFile(path, "wb")
+        self._writer = pq.ParquetWriter(
+            self._sink,
+            self.schema,
+            compression=self.codec,
+            compression_level=self.compression_level,
+            use_dictionary=[column for column in self.dictionary_columns if column in self.schema.names],
+        )
+        self.paths.append(path)
+
+    def _close_shard(self):
+        if self._writer is not None:
+            self._writer.close()
+            self.bytes_written += self._sink.tell()
+            self._sink.close()
+            self._writer = None
+            self._sink = None
+
+    def write(self, data):
+        """
+        Method used to write a pandas DataFrame, an Arrow Table or an Arrow RecordBatch to the staging files.
+        """
+
+        if self.schema is None:
+            # The schema is taken from schema_fields, restricted to the columns actually produced by the pipeline
+            self.schema = arrow_schema(self.schema_fields, columns=list(data.columns) if hasattr(data, "columns") else data.schema.names)
+
+        if isinstance(data, pa.RecordBatch):
+            table = pa.Table.from_batches([data]).select(self.schema.names).cast(self.schema)
+        elif isinstance(data, pa.Table):
+            table = data.select(self.schema.names).cast(self.schema)
+        else:
+            table = pa.Table.from_pandas(data, schema=self.schema, preserve_index=False)
+
+        # Small batches are buffered so that row groups are written at their configured size
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+
+        if self._pending_rows >= self.row_group_size:
+            self._flush(final=False)
+
+    def _flush(self, final):
+        # Write full row groups, one at a time so the size limit is checked between row groups
+        table = pa.concat_tables(self._pending)
+        self._pending = []
+        self._pending_rows = 0
+
+        for offset in range(0, table.num_rows, self.row_group_size):
+            row_group = table.slice(offset, self.row_group_size)
+
+            # An incomplete trailing row group is kept for the next write unless the writer is closing
+            if row_group.num_rows < self.row_group_size and not final:
+                self._pending.append(row_group)
+                self._pending_rows = row_group.num_rows
+                break
+
+            if self._writer is None:
+                self._open()
+
+            self._writer.write_table(row_group, row_group_size=self.row_group_size)
+            self.rows_written += row_group.num_rows
+
+            if self._sink.tell() >= self.max_file_bytes:
+                self._close_shard()
+
+    def close(self):
+        """
+        Method used to close the current shard, an empty file is written when no row has been produced so the load step always finds a file.
+        """
+
+        if self._pending:
+            self._flush(final=True)
+
+        if not self.paths:
+            if self.schema is None:
+                self.schema = arrow_schema(self.schema_fields)
+            self._open()
+
+        self._close_shard()
+
+        return self.paths
+
+
+def read_frames(paths, batch_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Method used to read staging files back as dataframes of batch_size rows, integers being read as nullable Int64 as the transform produces them.
+    At least one dataframe is yielded (empty when the files have no row), so a load of the frames always creates its table.
+    """
+
+    types_mapper = {pa.int64(): pd.Int64Dtype()}.get
+
+    empty = True
+    for path in paths:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            empty = False
+            yield batch.to_pandas(types_mapper=types_mapper)
+
+    if empty and paths:
+        yield pq.read_table(paths[0]).to_pandas(types_mapper=types_mapper)
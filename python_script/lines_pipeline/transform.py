@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import numpy as np
+import pandas as pd
+
+# Custom modules
+from lines_pipeline import schema
+from lines_pipeline.extract import SOURCE_FIELDS
+
+# Transport types documented by the source of truth, any other value is nulled
+TRANSPORT_TYPES = list(schema.LINES.column("transport_type").allowed_values)
+TRANSPORT_TYPE_DTYPE = pd.CategoricalDtype(TRANSPORT_TYPES)
+
+# Source system from which the data has been extracted
+SOURCE_SYSTEM = "http://v0.ovapi.nl/line/"
+
+# Columns of the dataframe loaded to the temporary table, in order (load_timestamp is filled by BigQuery)
+OUTPUT_COLUMNS = [column.name for column in schema.LINES.loaded_columns]
+
+# Columns read from the API and loaded as is: STRING columns without allowed values (other columns are cast or checked below)
+PASSTHROUGH_COLUMNS = [column.name for column in schema.LINES.columns if column.source_field and column.type == "STRING" and not column.allowed_values]
+
+# Positions of the dashes in the canonical textual representation of a UUID
+_UUID_DASHES = [8, 12, 16, 20]
+
+
+def records_to_frame(data):
+    """
+    Method used to load the raw records returned by the API (a dict keyed by line identifier) into a raw dataframe in one step.
+    """
+
+    # Build every column from the list of records at once, missing fields are filled with nulls
+    df = pd.DataFrame(list(data.values()), columns=[source_field for _, source_field in SOURCE_FIELDS])
+    df.columns = [column for column, _ in SOURCE_FIELDS]
+
+    # The line identifier is the key of each record
+    df.insert(0, "pk_line_id", list(data.keys()))
+
+    return df
+
+
+def generate_uuids(size):
+    """
+    Method used to generate a batch of random (version 4) UUIDs as strings without a Python call per row.
+    """
+
+    if size == 0:
+        return np.array([], dtype=object)
+
+    # Draw all the random bytes at once and set the version and variant bits as uuid.uuid4() does
+    raw = np.frombuffer(os.urandom(16 * size), dtype=np.uint8).reshape(size, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+
+    # Hex encode every byte then insert the dashes of the canonical representation
+    hexadecimal = np.frombuffer(raw.tobytes().hex().encode("ascii"), dtype="S1").reshape(size, 32)
+    canonical = np.insert(hexadecimal, _UUID_DASHES, b"-", axis=1)
+
+    return canonical.view("S36").ravel().astype("U36").astype(object)
+
+
+def transform_lines(raw):
+    """
+    Method used to transform a raw dataframe of lines into the dataframe loaded to the temporary table.
+    Every rule is applied column-wise on the whole frame.
+    """
+
+    df = pd.DataFrame(index=raw.index)
+    df["uuid_line"] = generate_uuids(len(raw.index))
+    df["pk_line_id"] = raw["pk_line_id"]
+
+    for column in PASSTHROUGH_COLUMNS:
+        df[column] = raw[column]
+
+    # Unknown transport types fall outside of the categories and become null
+    df["transport_type"] = raw["transport_type"].where(raw["transport_type"].isin(TRANSPORT_TYPES)).astype(TRANSPORT_TYPE_DTYPE)
+
+    # Direction is communicated as a number (or numeric string) by the API, cast to the INTEGER column type
+    df["line_direction"] = pd.to_numeric(raw["line_direction"], errors="coerce").astype("Int64")
+
+    # Constant technical column
+    df["source_system"] = SOURCE_SYSTEM
+
+    return df[OUTPUT_COLUMNS]
+
+
+def transform_batch(batch):
+    """
+    Method used to transform a raw Arrow record batch (see lines_pipeline.extract) into the dataframe loaded to the temporary table.
+    """
+
+    return transform_lines(batch.to_pandas())
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import collections
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Custom modules
+from lines_pipeline import schema
+
+# Column added to the quarantined rows with the reasons they have been rejected for, separated by "; "
+QUARANTINE_REASON_FIELD = "quarantine_reason"
+
+
+class QuarantineWriter:
+    """
+    Parquet file holding the rejected raw rows and their reasons, only created once a first row is quarantined.
+    """
+
+    def __init__(self, path, codec="zstd") -> None:
+        self.path = path
+        self.codec = codec
+        self.rows_written = 0
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, batch):
+        if batch is None or batch.num_rows == 0:
+            return
+
+        if self._writer is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, batch.schema, compression=self.codec)
+
+        self._writer.write_table(pa.Table.from_batches([batch]))
+        self.rows_written += batch.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class BatchValidator:
+    """
+    Validation stage run on the raw record batches of the extract step, before the transform.
+    The checks derived from the DDL constraints (see lines_pipeline.schema.batch_validator) run column-wise on each batch, and lines whose key
+    has already been seen in the run are flagged as duplicates (the first occurrence wins).
+    Rejected lines are split from the batch with their reasons, so one malformed line never fails the load job.
+    """
+
+    def __init__(self, table_schema) -> None:
+        self.table_schema = table_schema
+        self.validate = schema.batch_validator(table_schema)
+        self.counts = collections.Counter()
+        self.rows_quarantined = 0
+        self._seen_hashes = np.array([], dtype="uint64")
+        self._quarantined_keys = []
+
+    def _duplicates(self, keys, present):
+        # Keys are compared through their 64 bits hashes, kept sorted for the whole run
+        hashes = pd.util.hash_array(keys.to_numpy(zero_copy_only=False))
+
+        duplicated = np.ones(len(hashes), dtype=bool)
+        duplicated[np.unique(hashes, return_index=True)[1]] = False
+        duplicated |= np.isin(hashes, self._seen_hashes, assume_unique=False)
+
+        self._seen_hashes = np.union1d(self._seen_hashes, hashes[present])
+
+        return duplicated & present
+
+    def split(self, batch):
+        """
+        Method used to split a raw record batch into its valid lines and its rejected lines (with a quarantine_reason column, None when every line is valid).
+        """
+
+        checks = [(reason, violations.to_numpy(zero_copy_only=False)) for reason, violations in self.validate(batch)]
+
+        keys = batch.column(self.table_schema.key)
+        present = keys.is_valid().to_numpy(zero_copy_only=False)
+        checks.append((self.table_schema.key + ": duplicate value", self._duplicates(keys, present)))
+
+        rejected = np.logical_or.reduce([violations for _, violations in checks])
+        if not rejected.any():
+            return batch, None
+
+        # Reasons are only built for the rejected lines
+        reasons = [[] for _ in range(int(rejected.sum()))]
+        for reason, violations in checks:
+            offending = np.flatnonzero(violations[rejected])
+            for index in offending:
+                reasons[index].append(reason)
+            if len(offending):
+                self.counts[reason] += len(offending)
+
+        quarantined = batch.filter(pa.array(rejected))
+        quarantined = pa.RecordBatch.from_arrays(
+            quarantined.columns + [pa.array(["; ".join(row_reasons) for row_reasons in reasons], type=pa.string())],
+            names=quarantined.schema.names + [QUARANTINE_REASON_FIELD]
+        )
+
+        self.rows_quarantined += quarantined.num_rows
+        self._quarantined_keys.append(quarantined.column(self.table_schema.key).drop_null())
+
+        return batch.filter(pa.array(~rejected)), quarantined
+
+    def validate_batches(self, batches, quarantine=None, metrics=None):
+        """
+        Method used to yield the valid part of each raw record batch, rejected lines being written to the quarantine (a QuarantineWriter).
+        With metrics (lines_pipeline.instrumentation.PipelineMetrics), each batch is recorded in the validate stage.
+        """
+
+        for batch in batches:
+            if metrics is None:
+                valid, quarantined = self.split(batch)
+            else:
+                with metrics.stage("validate") as stage:
+                    valid, quarantined = self.split(batch)
+                    stage.add(rows_in=batch.num_rows, rows_out=valid.num_rows, rows_quarantined=quarantined.num_rows if quarantined is not None else 0)
+
+            if quarantine is not None:
+                quarantine.write(quarantined)
+
+            yield valid
+
+    def quarantined_keys(self):
+        """
+        Method used to return the keys of the quarantined lines (e.g. to keep them out of the deletions of the incremental mode).
+        """
+
+        if not self._quarantined_keys:
+            return pd.Index([], dtype=object)
+
+        return pd.Index(pa.concat_arrays(self._quarantined_keys).to_pandas().unique())
+
+    def report(self):
+        return ", ".join("%s: %d" % (reason, count) for reason, count in sorted(self.counts.items()))
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import datetime
+
+# Custom modules
+from lines_pipeline import backfill
+
+
+def test_undated_source_is_extracted_once_for_the_last_day():
+    days = backfill.date_range("2022-12-20", "2022-12-25")
+
+    assert backfill.extracted_days(days) == [datetime.date(2022, 12, 25)]
+    assert backfill.extracted_days(days, "date") == days
+
+
+def test_dated_endpoint_selects_the_day():
+    day = datetime.date(2022, 12, 20)
+
+    assert backfill.dated_endpoint("/line/", "date", day) == "/line/?date=2022-12-20"
+    assert backfill.dated_endpoint("/line/?format=json", "date", day) == "/line/?format=json&date=2022-12-20"
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import pandas as pd
+
+# Custom modules
+from lines_pipeline import cdc, transform
+
+
+def line(destination, transport_type="BUS"):
+    return {"LineName": "Line", "TransportType": transport_type, "LinePublicNumber": "1", "DataOwnerCode": "ARR", "DestinationName50": destination, "LinePlanningNumber": "1", "LineDirection": 1}
+
+
+def lines(records):
+    return transform.transform_lines(transform.records_to_frame(records))
+
+
+def test_changes_are_classified_against_the_snapshot():
+    snapshot = cdc.hash_lines(lines({"ARR_1": line("Arnhem"), "ARR_2": line("Ede"), "ARR_3": line("Zeist")}))
+    detector = cdc.ChangeDetector(snapshot)
+
+    # ARR_1 is unchanged, ARR_2 changed destination, ARR_3 disappeared and ARR_4 is new (the technical uuid_line never counts as a change)
+    changed = detector.changes(lines({"ARR_1": line("Arnhem"), "ARR_2": line("Utrecht")}))
+    changed = pd.concat([changed, detector.changes(lines({"ARR_4": line("Tiel", "TRAIN")}))])
+    deleted = detector.deletions()
+
+    assert dict(zip(changed["pk_line_id"], changed["change_type"])) == {"ARR_2": cdc.CHANGE_UPDATE, "ARR_4": cdc.CHANGE_INSERT}
+    assert list(deleted["pk_line_id"]) == ["ARR_3"]
+    assert list(deleted["change_type"]) == [cdc.CHANGE_DELETE]
+    assert deleted["destination_name_50"].isna().all()
+    assert detector.counts == {cdc.CHANGE_INSERT: 1, cdc.CHANGE_UPDATE: 1, cdc.CHANGE_DELETE: 1}
+    assert sorted(detector.current_hashes().index) == ["ARR_1", "ARR_2", "ARR_4"]
+
+
+def test_first_run_inserts_every_line():
+    detector = cdc.ChangeDetector(cdc.load_snapshot("missing_snapshot.parquet"))
+
+    changed = detector.changes(lines({"ARR_1": line("Arnhem"), "ARR_2": line("Ede")}))
+
+    assert list(changed["change_type"]) == [cdc.CHANGE_INSERT, cdc.CHANGE_INSERT]
+    assert detector.deletions().empty
+
+
+def test_retained_keys_are_neither_shipped_nor_deleted():
+    detector = cdc.ChangeDetector(cdc.hash_lines(lines({"ARR_1": line("Arnhem"), "ARR_2": line("Ede")})))
+    detector.changes(lines({"ARR_1": line("Arnhem")}))
+
+    detector.retain(["ARR_2"])
+
+    assert detector.deletions().empty
+    assert detector.current_hashes()["ARR_2"] == detector.snapshot["ARR_2"]
+    assert not detector.has_changes()
+
+
+def test_pending_snapshot_is_promoted_by_its_run(tmp_path):
+    path = str(tmp_path / "snapshots" / "lines_hashes.parquet")
+    first = cdc.hash_lines(lines({"ARR_1": line("Arnhem")}))
+    second = cdc.hash_lines(lines({"ARR_1": line("Ede")}))
+
+    # Two runs keep their hashes aside, tagged with their run, nothing is promoted before the MERGE succeeded
+    cdc.save_snapshot(first, path, run_tag="20221220")
+    cdc.save_snapshot(second, path, run_tag="20221221")
+    assert not os.path.exists(path)
+    assert cdc.load_snapshot(path).empty
+
+    cdc.commit_snapshot(path, run_tag="20221220")
+    assert cdc.load_snapshot(path).equals(first)
+    assert os.path.exists(cdc.pending_path(path, "20221221"))
+
+    cdc.commit_snapshot(path, run_tag="20221221")
+    assert cdc.load_snapshot(path).equals(second)
+    assert not os.path.exists(cdc.pending_path(path, "20221221"))
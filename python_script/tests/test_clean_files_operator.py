@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import sys
+import time
+import datetime
+import pytest
+
+# Folder holding the DAG files and their custom operators
+PIPELINE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAG_FOLDER = os.path.join(os.path.dirname(PIPELINE_FOLDER), "airflow_dag")
+sys.path.insert(0, DAG_FOLDER)
+
+# Custom modules
+from custom_operator import file_storage
+
+TABLE_PREFIX = "dw_test.lines"
+
+
+def write_file(directory, name, size, age=0):
+    """
+    Method used to write a file of size bytes, last modified age seconds ago.
+    """
+
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+
+
+@pytest.fixture
+def data_directory(tmp_path):
+    # Staging files of two days, a backfill, the quarantine files of the same days and the files of another table
+    write_file(tmp_path, TABLE_PREFIX + "_transformed_2024-01-01.00000.parquet", 10)
+    write_file(tmp_path, TABLE_PREFIX + "_transformed_2024-01-01.00001.parquet", 20)
+    write_file(tmp_path, TABLE_PREFIX + "_transformed_2024-01-02.00000.parquet", 30)
+    write_file(tmp_path, TABLE_PREFIX + "_transformed_2024-01-03.00000.parquet", 40)
+    write_file(tmp_path, TABLE_PREFIX + "_backfill_20240104T000000.2024-01-01.00000.parquet", 50)
+    write_file(tmp_path, TABLE_PREFIX + "_quarantine_2024-01-01.parquet", 60)
+    write_file(tmp_path, TABLE_PREFIX + "_quarantine_backfill_20240104T000000_2024-01-01.parquet", 70)
+    write_file(tmp_path, "dw_test.stops_transformed_2024-01-01.00000.parquet", 80)
+
+    return tmp_path
+
+
+@pytest.fixture
+def operator_class():
+    pytest.importorskip("airflow")
+    from custom_operator import custom_clean_files_operator
+
+    return custom_clean_files_operator.CustomCleanFilesOperator
+
+
+def clean(operator_class, directory, **kwargs):
+    """
+    Method used to run the operator over the local storage of a directory, returning its result.
+    """
+
+    kwargs.setdefault("files", ["_transformed_"])
+    operator = operator_class(task_id="clean_files", dataset="dw_test", table_name="lines", storage=file_storage.LocalFileStorage(str(directory)), **kwargs)
+
+    return operator.execute(context={})
+
+
+def test_local_storage_lists_a_prefix_in_a_single_scan(data_directory):
+    storage = file_storage.LocalFileStorage(str(data_directory))
+
+    stored_files = sorted(storage.list(TABLE_PREFIX + "_transformed_2024-01-01."))
+
+    assert [(stored_file.name, stored_file.size) for stored_file in stored_files] == [
+        (TABLE_PREFIX + "_transformed_2024-01-01.00000.parquet", 10),
+        (TABLE_PREFIX + "_transformed_2024-01-01.00001.parquet", 20),
+    ]
+    assert all(stored_file.updated.tzinfo is datetime.timezone.utc for stored_file in stored_files)
+    assert len(storage.list(TABLE_PREFIX)) == 7
+
+
+def test_local_storage_ignores_files_already_deleted(data_directory):
+    storage = file_storage.LocalFileStorage(str(data_directory))
+    name = TABLE_PREFIX + "_transformed_2024-01-03.00000.parquet"
+
+    assert storage.delete([name, "missing.parquet"]) == [name]
+    assert storage.delete([name]) == []
+    assert not (data_directory / name).exists()
+
+
+def test_operator_cleans_a_list_of_dates(operator_class, data_directory):
+    result = clean(operator_class, data_directory, date_str=["2024-01-01", "2024-01-02"], batch_size=1, max_workers=2)
+
+    assert (result["files_deleted"], result["bytes_freed"], result["files_retained"]) == (3, 60, 0)
+    assert sorted(os.listdir(data_directory)) == [
+        "dw_test.lines_backfill_20240104T000000.2024-01-01.00000.parquet",
+        "dw_test.lines_quarantine_2024-01-01.parquet",
+        "dw_test.lines_quarantine_backfill_20240104T000000_2024-01-01.parquet",
+        "dw_test.lines_transformed_2024-01-03.00000.parquet",
+        "dw_test.stops_transformed_2024-01-01.00000.parquet",
+    ]
+
+
+def test_operator_cleans_every_date_and_leaves_the_quarantine_files(operator_class, data_directory):
+    result = clean(operator_class, data_directory, files=["_transformed_", "_backfill_"], date_str=None)
+
+    assert (result["files_deleted"], result["bytes_freed"], result["files_retained"]) == (5, 150, 0)
+    assert sorted(os.listdir(data_directory)) == [
+        "dw_test.lines_quarantine_2024-01-01.parquet",
+        "dw_test.lines_quarantine_backfill_20240104T000000_2024-01-01.parquet",
+        "dw_test.stops_transformed_2024-01-01.00000.parquet",
+    ]
+
+
+def test_operator_retains_files_younger_than_min_age(operator_class, data_directory):
+    write_file(data_directory, TABLE_PREFIX + "_transformed_2024-01-01.00000.parquet", 10, age=7200)
+
+    result = clean(operator_class, data_directory, date_str="2024-01-01", min_age=datetime.timedelta(hours=1))
+
+    assert (result["files_deleted"], result["bytes_freed"], result["files_retained"]) == (1, 10, 1)
+    assert not (data_directory / (TABLE_PREFIX + "_transformed_2024-01-01.00000.parquet")).exists()
+    assert (data_directory / (TABLE_PREFIX + "_transformed_2024-01-01.00001.parquet")).exists()
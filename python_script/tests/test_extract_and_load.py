@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import io
+import os
+import runpy
+import contextlib
+from unittest import mock
+import pytest
+import requests
+
+# Custom modules
+from benchmarks import fake_bigquery, stub_api, synthetic
+from lines_pipeline import bigquery_jobs, checkpoint, extract, parallel_transform, response_cache
+
+# The script loads to BigQuery through google-cloud-bigquery, replaced by the in-memory fake
+bigquery = pytest.importorskip("google.cloud.bigquery")
+
+import extract_and_load
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "extract_and_load.py")
+
+
+@pytest.fixture
+def server():
+    with stub_api.StubApiServer({"/line/": synthetic.payload(synthetic.synthetic_lines(100))}) as stub:
+        yield stub
+
+
+@pytest.fixture
+def environment(server, tmp_path):
+    return {
+        "SOURCE_API_BASE_URL": server.base_url,
+        "SOURCE_API_ENDPOINT": "/line/",
+        "GCP_TABLE": "lines",
+        "TABLE_LAYOUT": "current_and_history",
+        "RESPONSE_CACHE_DIRECTORY": str(tmp_path / "cache"),
+        "CHECKPOINT_DIRECTORY": str(tmp_path / "checkpoints"),
+        "QUARANTINE_PATH": str(tmp_path / "quarantine.parquet"),
+        "CDC_SNAPSHOT_PATH": str(tmp_path / "hashes.parquet"),
+    }
+
+
+@pytest.fixture
+def client():
+    return fake_bigquery.FakeBigQueryClient()
+
+
+def run(environment, client):
+    """
+    Method used to run the flow with the settings of an environment and a BigQuery client, returning its exit code and its output.
+    """
+
+    bigquery_jobs._TABLE_CACHE.clear()
+    output = io.StringIO()
+
+    with contextlib.redirect_stdout(output):
+        exit_code = extract_and_load.ExtractAndLoad(extract_and_load.Settings(environment), client_factory=lambda *args, **kwargs: client).run()
+
+    return exit_code, output.getvalue()
+
+
+def failing_batches(*args, **kwargs):
+    raise requests.exceptions.ChunkedEncodingError("connection broken")
+    yield
+
+
+def test_settings_are_read_from_the_environment(environment):
+    settings = extract_and_load.Settings(dict(environment, GCP_PROJECT="project", GCP_DATASET="dataset", LOAD_MODE="incremental"))
+
+    assert settings.gcp_destination == "project.dataset.lines"
+    assert settings.gcp_temporary == "project.dw_temporary.lines"
+    assert settings.load_mode == "incremental"
+    assert settings.table_layout.name == "current_and_history"
+    assert extract_and_load.Settings({}).loader_backend == "batch"
+
+
+def test_successful_run_clears_its_checkpoints(environment, client, tmp_path):
+    exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_SUCCESS
+    assert "Temporary table deleted" in output
+    assert os.listdir(tmp_path / "checkpoints") == []
+
+    # The processed response is not modified, the next run has nothing to load
+    exit_code, output = run(environment, client)
+    assert exit_code == checkpoint.EXIT_SUCCESS
+    assert "nothing to load" in output
+
+
+def test_connection_error_exits_with_the_extract_code(environment, client):
+    with mock.patch.object(response_cache.ResponseCache, "get", side_effect=requests.exceptions.ConnectionError("connection refused")):
+        exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_CODES["extract"]
+    assert "connection refused" in output
+
+
+def test_broken_stream_exits_with_the_extract_code(environment, client):
+    with mock.patch.object(extract, "iter_response_batches", failing_batches):
+        exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_CODES["extract"]
+    assert "connection broken" in output
+
+
+def test_transform_error_exits_with_the_transform_code(environment, client):
+    with mock.patch.object(parallel_transform.ParallelTransformer, "transform_batches", side_effect=ValueError("transform failed")):
+        exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_CODES["transform"]
+    assert "transform failed" in output
+
+
+def test_client_error_exits_with_the_load_code(environment):
+    def client_factory(*args, **kwargs):
+        raise ValueError("invalid keyfile")
+
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        exit_code = extract_and_load.ExtractAndLoad(extract_and_load.Settings(environment), client_factory=client_factory).run()
+
+    assert exit_code == checkpoint.EXIT_CODES["load"]
+    assert "invalid keyfile" in output.getvalue()
+
+
+def test_load_error_exits_with_the_load_code_and_resumes_from_the_transformed_files(environment, client):
+    with mock.patch.object(bigquery_jobs.JobOrchestrator, "load_frames", side_effect=RuntimeError("load failed")):
+        exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_CODES["load"]
+    assert "load failed" in output
+
+    # The response has been transformed to the checkpoint despite the failed load, the rerun only reloads the Parquet files
+    with mock.patch.object(parallel_transform.ParallelTransformer, "transform_batches", side_effect=AssertionError("transformed again")):
+        exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_SUCCESS
+    assert "Resuming run" in output and "after the transform stage" in output
+    assert "Data loaded successfully" in output and "Temporary table deleted" in output
+
+
+def test_merge_error_exits_with_the_merge_code_and_resumes_without_reloading(environment, client):
+    with mock.patch.object(bigquery_jobs.JobOrchestrator, "merge_and_drop", side_effect=RuntimeError("merge failed")):
+        exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_CODES["merge"]
+    assert "merge failed" in output
+
+    # The temporary table is still there, the rerun only runs the MERGE
+    with mock.patch.object(bigquery_jobs.JobOrchestrator, "load_frames", side_effect=AssertionError("loaded again")), \
+            mock.patch.object(parallel_transform.ParallelTransformer, "transform_batches", side_effect=AssertionError("transformed again")):
+        exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_SUCCESS
+    assert "Resuming run" in output and "after the load stage" in output
+    assert "Temporary table deleted" in output
+
+
+def test_resumed_run_failing_to_find_the_temporary_table_exits_with_the_load_code(environment, client):
+    with mock.patch.object(bigquery_jobs.JobOrchestrator, "merge_and_drop", side_effect=RuntimeError("merge failed")):
+        assert run(environment, client)[0] == checkpoint.EXIT_CODES["merge"]
+
+    with mock.patch.object(bigquery_jobs.JobOrchestrator, "temporary_table_exists", side_effect=RuntimeError("lookup failed")):
+        exit_code, output = run(environment, client)
+
+    assert exit_code == checkpoint.EXIT_CODES["load"]
+    assert "Resuming run" in output and "lookup failed" in output
+
+    exit_code, output = run(environment, client)
+    assert exit_code == checkpoint.EXIT_SUCCESS
+    assert "Temporary table deleted" in output
+
+
+def test_script_exits_with_the_code_of_the_run(environment, client):
+    output = io.StringIO()
+
+    with pytest.raises(SystemExit) as exit_info, mock.patch.dict(os.environ, environment), mock.patch.object(bigquery.Client, "from_service_account_json", lambda *args, **kwargs: client), contextlib.redirect_stdout(output):
+        runpy.run_path(SCRIPT_PATH, run_name="__main__")
+
+    assert exit_info.value.code == checkpoint.EXIT_SUCCESS
+    assert "Temporary table deleted" in output.getvalue()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import threading
+import pytest
+import requests
+
+# Custom modules
+from benchmarks import stub_api, synthetic
+from lines_pipeline import http_client
+
+
+@pytest.fixture
+def catalogue():
+    return synthetic.synthetic_lines(200)
+
+
+@pytest.fixture
+def server(catalogue):
+    with stub_api.StubApiServer(dict(synthetic.line_details(catalogue), **{"/line/": synthetic.payload(catalogue)})) as stub:
+        yield stub
+
+
+def test_fetch_all_crawls_every_line_detail(server, catalogue):
+    with http_client.ParallelExtractor(server.base_url, max_workers=8, per_host_limit=4) as extractor:
+        details = extractor.fetch_all(http_client.line_detail_endpoints("/line/", list(catalogue)))
+
+    assert len(details) == len(catalogue)
+    assert server.requests == len(catalogue)
+    for pk_line_id, line in catalogue.items():
+        assert details["/line/" + pk_line_id] == {pk_line_id: {"Line": line}}
+
+
+def test_fetch_all_raises_the_first_failure(server, catalogue):
+    with http_client.ParallelExtractor(server.base_url, per_host_limit=1) as extractor:
+        with pytest.raises(requests.HTTPError):
+            extractor.fetch_all(http_client.line_detail_endpoints("/line/", list(catalogue)[:5] + ["UNKNOWN_LINE"]))
+
+        # Failed requests give their slot back
+        assert extractor.fetch_json("/line/" + next(iter(catalogue)))
+
+
+def test_streamed_response_holds_its_slot_until_closed(server):
+    with http_client.ParallelExtractor(server.base_url, per_host_limit=1) as extractor:
+        first = extractor.get("/line/", stream=True)
+
+        second = threading.Thread(target=lambda: extractor.get("/line/", stream=True).close())
+        second.start()
+        second.join(timeout=0.5)
+        assert second.is_alive()
+
+        # Closing the response releases the slot once, however many times it is closed (the semaphore is bounded)
+        assert len(b"".join(first.iter_content(65536)))
+        first.close()
+        first.close()
+        second.join(timeout=5)
+        assert not second.is_alive()
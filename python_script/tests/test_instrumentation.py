@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+from concurrent.futures import ThreadPoolExecutor
+
+# Custom modules
+from lines_pipeline import instrumentation
+
+
+def test_stage_updated_from_several_threads():
+    metrics = instrumentation.PipelineMetrics("lines")
+
+    def stage_day(day):
+        for _ in range(2000):
+            with metrics.stage("stage") as stage:
+                stage.add(rows_in=1)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(stage_day, range(8)))
+
+    assert metrics.get("stage").calls == 16000
+    assert metrics.get("stage").counters["rows_in"] == 16000
+
+
+def test_prometheus_text_declares_and_escapes_the_metrics():
+    metrics = instrumentation.PipelineMetrics("lines", labels={"run_id": 'manual__2022-12-20 "retry"\\1\nx'})
+    with metrics.stage("extract") as stage:
+        stage.add(rows_out=3)
+    with metrics.stage("load"):
+        pass
+
+    lines = metrics.prometheus_text().splitlines()
+
+    assert lines.index("# HELP lines_pipeline_rows_out Rows produced by the stage.") + 1 == lines.index("# TYPE lines_pipeline_rows_out gauge")
+    assert len([line for line in lines if line.startswith("# TYPE lines_pipeline_rows_out ")]) == 1
+    assert 'lines_pipeline_rows_out{pipeline="lines",stage="extract",run_id="manual__2022-12-20 \\"retry\\"\\\\1\\nx"} 3' in lines
+    assert 'lines_pipeline_rows_out{pipeline="lines",stage="load",run_id="manual__2022-12-20 \\"retry\\"\\\\1\\nx"} 0' in lines
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import types
+import pytest
+import pandas as pd
+import pyarrow as pa
+
+# Custom modules
+from lines_pipeline import loaders
+
+# The Storage Write API package is optional, only the streaming backend needs it
+pytest.importorskip("google.cloud.bigquery_storage_v1")
+
+
+class FakeClient:
+    """
+    BigQuery client recording the recreation of the temporary table.
+    """
+
+    def __init__(self) -> None:
+        self.calls = []
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self.calls.append(("delete_table", table_id))
+
+    def create_table(self, table):
+        self.calls.append(("create_table", table.table_id, [field.name for field in table.schema]))
+        return table
+
+
+class FakeWriteClient:
+    """
+    Storage Write API client creating pending streams without connecting, the AppendRowsStream only connects on its first send.
+    """
+
+    def table_path(self, project, dataset, table):
+        return "projects/%s/datasets/%s/tables/%s" % (project, dataset, table)
+
+    def create_write_stream(self, parent, write_stream):
+        self.write_stream_type = write_stream.type_
+        return types.SimpleNamespace(name=parent + "/streams/pending")
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"pk_line_id": ["ARR_1_1", "ARR_1_2"], "line_direction": pd.array([1, None], dtype="Int64")})
+
+
+def test_installed_release_supports_arrow_appends():
+    storage, storage_types, writer = loaders.storage_write_modules()
+
+    assert hasattr(storage_types.AppendRowsRequest, "ArrowData")
+    assert "arrow_rows" in storage_types.AppendRowsRequest.meta.fields
+
+
+def test_sink_opens_an_arrow_stream_on_the_recreated_table(frame):
+    client = FakeClient()
+    write_client = FakeWriteClient()
+    sink = loaders.StorageWriteSink(client, "project.dw_temporary.lines", write_client=write_client)
+    schema = loaders._normalise_schema(pa.Table.from_pandas(frame, preserve_index=False).schema)
+
+    sink.open(schema)
+
+    assert client.calls == [("delete_table", "project.dw_temporary.lines"), ("create_table", "lines", ["pk_line_id", "line_direction"])]
+    assert write_client.write_stream_type == sink._types.WriteStream.Type.PENDING
+
+    # The template kept by the writer carries the stream and the Arrow schema, and no proto rows
+    template = sink._stream._initial_request_template
+    assert template.write_stream == "projects/project/datasets/dw_temporary/tables/lines/streams/pending"
+    assert template._pb.WhichOneof("rows") == "arrow_rows"
+    assert pa.ipc.read_schema(pa.py_buffer(template.arrow_rows.writer_schema.serialized_schema)) == schema
+
+
+def test_rows_request_round_trips_the_record_batch(frame):
+    sink = loaders.StorageWriteSink(FakeClient(), "project.dw_temporary.lines", write_client=FakeWriteClient())
+    batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+
+    request = sink.rows_request(batch)
+
+    assert request._pb.WhichOneof("rows") == "arrow_rows"
+    assert not request.write_stream
+    assert pa.ipc.read_record_batch(pa.py_buffer(request.arrow_rows.rows.serialized_record_batch), batch.schema).equals(batch)
+
+
+def test_releases_without_arrow_appends_are_rejected(monkeypatch):
+    from importlib import metadata
+
+    monkeypatch.setattr(metadata, "version", lambda package: "2.26.0")
+
+    with pytest.raises(ImportError, match="2.30.0"):
+        loaders.StorageWriteSink(FakeClient(), "project.dw_temporary.lines")
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import re
+import json
+import sqlite3
+import hashlib
+
+# Custom modules
+from lines_pipeline import merge, schema
+
+SQL_RESOURCES = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "sql_resources")
+
+# Parts of a generated MERGE: target, source, join condition, matched and not matched clauses
+MERGE_PATTERN = re.compile(
+    r"MERGE (?P<target>\S+) B\nUSING (?P<source>.*)\n\) N\nON (?P<on>.*?)\n"
+    r"WHEN MATCHED AND (?P<matched>.*?) THEN\n  UPDATE SET\n(?P<set>.*?)\n"
+    r"WHEN NOT MATCHED(?: AND (?P<not_matched>.*?))? THEN\n  INSERT \((?P<columns>.*?)\) VALUES\((?P<values>.*)\)",
+    re.DOTALL
+)
+
+T1 = "2024-01-01 00:00:00"
+T2 = "2024-01-02 00:00:00"
+T3 = "2024-01-03 00:00:00"
+
+
+def _fingerprint(value):
+    return int.from_bytes(hashlib.sha256(value.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+def versioned_table():
+    """
+    Method used to create the versioned destination table and the temporary table in SQLite, with the BigQuery functions used by the MERGE.
+    """
+
+    connection = sqlite3.connect(":memory:")
+    connection.create_function("STRUCT", -1, lambda *values: json.dumps(values))
+    connection.create_function("TO_JSON_STRING", 1, lambda value: value)
+    connection.create_function("FARM_FINGERPRINT", 1, _fingerprint)
+
+    version_columns = [column.name for column in schema.VERSION_COLUMNS]
+    connection.execute("CREATE TABLE lines (" + ", ".join(schema.LINES.column_names + version_columns) + ")")
+    connection.execute("CREATE TABLE temporary_lines (" + ", ".join(schema.LINES.column_names + ["change_type"]) + ")")
+
+    return connection
+
+
+def run_versioned_merge(connection, rows, now, incremental=True):
+    """
+    Method used to load rows (dicts of the business columns and change_type) to the temporary table and run the SCD2 MERGE of the scd2 layout.
+    The MERGE is translated to SQLite statements: both clauses are evaluated against the destination table as it was before the MERGE.
+    """
+
+    connection.execute("DELETE FROM temporary_lines")
+    for row in rows:
+        row = dict(uuid_line="uuid_" + row["pk_line_id"], source_system="OVAPI", **row)
+        connection.execute("INSERT INTO temporary_lines (" + ", ".join(row) + ") VALUES (" + ", ".join("?" * len(row)) + ")", list(row.values()))
+
+    statement, = merge.merge_statements(schema.LINES, "lines", "temporary_lines", schema.LINES.layout("scd2"), incremental=incremental)
+    parts = MERGE_PATTERN.match(statement.replace("CURRENT_TIMESTAMP()", "@now")).groupdict()
+    parameters = {"now": now, "min_key": min(row["pk_line_id"] for row in rows), "max_key": max(row["pk_line_id"] for row in rows)}
+    not_matched = " AND " + parts["not_matched"] if parts["not_matched"] else ""
+
+    connection.execute("DROP TABLE IF EXISTS N")
+    connection.execute("CREATE TEMP TABLE N AS SELECT * FROM " + parts["source"] + "\n)", parameters)
+    connection.execute("DROP TABLE IF EXISTS inserted")
+    connection.execute("CREATE TEMP TABLE inserted AS SELECT " + parts["values"] + " FROM N WHERE NOT EXISTS (SELECT 1 FROM lines B WHERE " + parts["on"] + ")" + not_matched, parameters)
+    connection.execute("UPDATE lines AS B SET " + parts["set"] + " WHERE EXISTS (SELECT 1 FROM N WHERE " + parts["on"] + " AND " + parts["matched"] + ")", parameters)
+    connection.execute("INSERT INTO lines (" + parts["columns"] + ") SELECT * FROM inserted")
+
+
+def versions(connection):
+    return connection.execute("SELECT pk_line_id, line_name, valid_from, valid_to FROM lines ORDER BY pk_line_id, valid_from").fetchall()
+
+
+def line(pk_line_id, line_name, change_type=schema.CHANGE_INSERT):
+    return {
+        "pk_line_id": pk_line_id,
+        "line_name": line_name,
+        "transport_type": "BUS",
+        "data_owner_code": "ARR",
+        "line_planning_number": pk_line_id,
+        "line_direction": 1,
+        "change_type": change_type,
+    }
+
+
+def test_key_range_is_bound_as_query_parameters():
+    layout = schema.LINES.layout("current_and_history")
+    min_key = "ARR_1' OR TRUE --"
+
+    statements = merge.merge_statements(schema.LINES, "dw_test.lines", "dw_temporary.lines", layout)
+    parameters = merge.key_range_query_params(schema.LINES, layout, min_key, "ARR_9")
+
+    assert all("BETWEEN @min_key AND @max_key" in statement for statement in statements)
+    assert not any(min_key in statement for statement in statements)
+    assert parameters == [
+        {"name": "min_key", "parameterType": {"type": "STRING"}, "parameterValue": {"value": min_key}},
+        {"name": "max_key", "parameterType": {"type": "STRING"}, "parameterValue": {"value": "ARR_9"}},
+    ]
+
+
+def test_no_query_parameters_without_pruning():
+    layout = schema.LINES.layout("legacy")
+
+    assert merge.key_range_query_params(schema.LINES, layout, "ARR_1", "ARR_9") == []
+    assert not any("@min_key" in statement for statement in merge.merge_statements(schema.LINES, "dw_test.lines", "dw_temporary.lines", layout))
+
+
+def test_versioned_merge_restricts_both_references_of_the_target_to_the_key_range():
+    layout = schema.LINES.layout("scd2")
+
+    statement, = merge.merge_statements(schema.LINES, "dw_test.lines", "dw_temporary.lines", layout)
+
+    assert "C.valid_to IS NULL AND C.pk_line_id BETWEEN @min_key AND @max_key" in statement
+    assert "B.valid_to IS NULL AND B.pk_line_id BETWEEN @min_key AND @max_key" in statement
+
+
+def test_versioned_merge_inserts_a_current_version_of_new_lines():
+    connection = versioned_table()
+
+    run_versioned_merge(connection, [line("ARR_1", "Line 1"), line("ARR_2", "Line 2")], T1)
+
+    assert versions(connection) == [("ARR_1", "Line 1", T1, None), ("ARR_2", "Line 2", T1, None)]
+    assert connection.execute("SELECT COUNT(DISTINCT row_hash) FROM lines").fetchone() == (2,)
+
+
+def test_versioned_merge_closes_changed_and_deleted_lines():
+    connection = versioned_table()
+    run_versioned_merge(connection, [line("ARR_1", "Line 1"), line("ARR_2", "Line 2"), line("ARR_3", "Line 3")], T1)
+
+    run_versioned_merge(connection, [
+        line("ARR_1", "Line 1", schema.CHANGE_UPDATE),
+        line("ARR_2", "Line 2 bis", schema.CHANGE_UPDATE),
+        line("ARR_3", "Line 3", schema.CHANGE_DELETE),
+        line("ARR_4", "Line 4"),
+    ], T2)
+
+    assert versions(connection) == [
+        # Same hash: the current version is neither closed nor duplicated
+        ("ARR_1", "Line 1", T1, None),
+        # Changed: the current version is closed and the new one inserted at the same timestamp
+        ("ARR_2", "Line 2", T1, T2),
+        ("ARR_2", "Line 2 bis", T2, None),
+        # Deleted: the current version is closed, no new version
+        ("ARR_3", "Line 3", T1, T2),
+        # New: a current version is inserted
+        ("ARR_4", "Line 4", T2, None),
+    ]
+
+
+def test_versioned_merge_in_full_mode_skips_unchanged_lines():
+    connection = versioned_table()
+    run_versioned_merge(connection, [line("ARR_1", "Line 1"), line("ARR_2", "Line 2")], T1, incremental=False)
+
+    run_versioned_merge(connection, [line("ARR_1", "Line 1"), line("ARR_2", "Line 2 bis")], T2, incremental=False)
+    run_versioned_merge(connection, [line("ARR_1", "Line 1"), line("ARR_2", "Line 2 bis")], T3, incremental=False)
+
+    assert versions(connection) == [("ARR_1", "Line 1", T1, None), ("ARR_2", "Line 2", T1, T2), ("ARR_2", "Line 2 bis", T2, None)]
+
+
+def test_as_of_and_key_history_queries_read_the_versions():
+    connection = versioned_table()
+    run_versioned_merge(connection, [line("ARR_1", "Line 1"), line("ARR_2", "Line 2")], T1)
+    run_versioned_merge(connection, [line("ARR_1", "Line 1 bis", schema.CHANGE_UPDATE), line("ARR_2", "Line 2", schema.CHANGE_DELETE)], T2)
+
+    def as_of(timestamp):
+        rows = connection.execute(merge.as_of_query(schema.LINES, "lines"), {"as_of": timestamp}).fetchall()
+        return sorted((row[1], row[2]) for row in rows)
+
+    assert as_of("2023-12-31 00:00:00") == []
+    assert as_of(T1) == [("ARR_1", "Line 1"), ("ARR_2", "Line 2")]
+    assert as_of(T2) == [("ARR_1", "Line 1 bis")]
+
+    history = connection.execute(merge.key_history_query(schema.LINES, "lines"), {"key": "ARR_1"}).fetchall()
+    assert [(row[2], row[-3], row[-2]) for row in history] == [("Line 1", T1, T2), ("Line 1 bis", T2, None)]
+
+
+def test_as_of_query_prunes_the_partitions_of_later_versions():
+    layout = schema.LINES.layout("scd2")
+    query = merge.as_of_query(schema.LINES, "dw_test.lines")
+
+    # The versioned table is partitioned on valid_from, compared with a constant so BigQuery prunes the partitions after as_of
+    assert layout.partition_by == "DATE(valid_from)"
+    assert "WHERE valid_from <= @as_of\n" in query
+    assert "(valid_to IS NULL OR valid_to > @as_of)" in query
+
+
+def test_sql_resources_match_the_generated_statements(tmp_path):
+    for path in merge.write_sql_resources(schema.LINES, str(tmp_path)):
+        with open(path, encoding="utf-8") as generated, open(os.path.join(SQL_RESOURCES, os.path.basename(path)), encoding="utf-8") as resource:
+            assert generated.read() == resource.read(), os.path.basename(path)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import pyarrow as pa
+import pytest
+
+# Custom modules
+from benchmarks import synthetic
+from lines_pipeline import parallel_transform, transform
+
+
+@pytest.fixture
+def raw_batches():
+    raw = transform.records_to_frame(synthetic.synthetic_lines(4000))
+    table = pa.Table.from_pandas(raw, preserve_index=False)
+
+    return table.to_batches(max_chunksize=1000)
+
+
+def test_pool_matches_the_in_process_transform(raw_batches):
+    transformer = parallel_transform.ParallelTransformer(max_workers=2, min_rows=1000)
+    assert transformer.start_method in ("forkserver", "spawn")
+
+    frames = list(transformer.transform_batches(raw_batches))
+    expected = [transform.transform_batch(batch) for batch in raw_batches]
+
+    assert len(frames) == len(expected)
+    for df, expected_df in zip(frames, expected):
+        assert df.drop(columns="uuid_line").astype(object).equals(expected_df.drop(columns="uuid_line").astype(object))
+
+
+def test_first_frame_is_not_held_back_by_the_read_ahead(raw_batches):
+    consumed = []
+
+    def produce():
+        for batch in raw_batches:
+            consumed.append(batch)
+            yield batch
+
+    frames = parallel_transform.ParallelTransformer(max_workers=2, min_rows=len(raw_batches) * 1000).transform_batches(produce())
+
+    next(frames)
+    assert len(consumed) == 1
+    assert len(list(frames)) == len(raw_batches) - 1
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+# Folders holding the DAG files and the lines_pipeline package (deployed next to the DAG files by Composer)
+PIPELINE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAG_FOLDER = os.path.join(os.path.dirname(PIPELINE_FOLDER), "airflow_dag")
+
+# Modules only needed when a task runs, they must not be imported when a DAG file is parsed
+HEAVY_MODULES = ["pandas", "pyarrow", "google.cloud"]
+
+
+def imported_heavy_modules(module):
+    """
+    Method used to import a module in a fresh interpreter, returning the heavy modules found in sys.modules afterwards.
+    """
+
+    code = "import sys, json, %s; print(json.dumps([module for module in %r if module in sys.modules]))" % (module, HEAVY_MODULES)
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([DAG_FOLDER, PIPELINE_FOLDER]))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=environment, check=True)
+
+    return json.loads(result.stdout)
+
+
+@pytest.mark.parametrize("module", ["lines_pipeline.schema", "lines_pipeline.merge", "lines_pipeline.backfill", "lines_pipeline.instrumentation"])
+def test_parse_time_module_stays_light(module):
+    assert imported_heavy_modules(module) == []
+
+
+def test_dag_module_stays_light():
+    pytest.importorskip("airflow")
+
+    assert imported_heavy_modules("extract_and_load_dag") == []
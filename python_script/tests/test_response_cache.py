@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import os
+import json
+import pytest
+import requests
+
+# Custom modules
+from benchmarks import stub_api
+from lines_pipeline import response_cache
+
+# Payloads served by the stub, large enough to be read in several chunks
+CATALOGUE = b'{"lines": "' + b"x" * 300000 + b'"}'
+OTHER_CATALOGUE = b'{"other": "' + b"y" * 300000 + b'"}'
+
+
+@pytest.fixture
+def server():
+    with stub_api.StubApiServer({"/line/": CATALOGUE, "/other/": OTHER_CATALOGUE}) as stub:
+        yield stub
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as http_session:
+        yield http_session
+
+
+def read(response, chunk_size=65536):
+    return b"".join(response.iter_content(chunk_size=chunk_size))
+
+
+def test_pending_entry_is_replayed_until_committed(server, session, tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path))
+    url = server.base_url + "/line/"
+
+    response = cache.get(session, url)
+    assert response.status == response_cache.DOWNLOADED
+    assert read(response) == CATALOGUE
+
+    replayed = cache.get(session, url)
+    assert replayed.status == response_cache.REPLAYED
+    assert read(replayed) == CATALOGUE
+
+    cache.commit(url)
+    assert cache.get(session, url).unchanged
+    assert server.requests == 3
+
+
+def test_overlapping_downloads_of_a_url_store_an_intact_body(server, session, tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path))
+    url = server.base_url + "/line/"
+
+    # Two runs read the same URL at the same time, their chunks interleaved
+    first = cache.get(session, url).iter_content(chunk_size=4096)
+    second = cache.get(requests.Session(), url).iter_content(chunk_size=4096)
+    first_body, second_body = [next(first)], [next(second)]
+    first_body.extend(first)
+    second_body.extend(second)
+
+    assert b"".join(first_body) == b"".join(second_body) == CATALOGUE
+    assert read(cache.get(session, url)) == CATALOGUE
+    assert not [file_name for file_name in os.listdir(str(tmp_path)) if file_name.endswith(".tmp")]
+
+
+def test_expired_entry_is_dropped_on_lookup(server, session, tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path), max_age=60)
+    url = server.base_url + "/line/"
+    read(cache.get(session, url))
+
+    # Age the entry past max_age
+    with open(cache.metadata_path(url), encoding="utf-8") as metadata_file:
+        entry = json.load(metadata_file)
+    entry["stored_at"] -= 120
+    with open(cache.metadata_path(url), "w", encoding="utf-8") as metadata_file:
+        json.dump(entry, metadata_file)
+
+    assert cache.entry(url) is None
+    assert not os.path.exists(cache.body_path(url))
+    assert cache.get(session, url).status == response_cache.DOWNLOADED
+
+
+def test_eviction_keeps_the_entry_just_stored(server, session, tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path), max_bytes=1)
+    url = server.base_url + "/line/"
+    other_url = server.base_url + "/other/"
+
+    read(cache.get(session, url))
+    assert cache.entry(url) is not None
+
+    # The cache only fits one body: the older entry is evicted, never the one of the current run
+    read(cache.get(session, other_url))
+    assert cache.entry(url) is None
+    assert cache.entry(other_url) is not None
+    assert os.path.exists(cache.body_path(other_url))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import pandas as pd
+
+# Custom modules
+from benchmarks import synthetic, transform_benchmark
+from lines_pipeline import transform
+
+
+def values(series):
+    return [None if pd.isna(value) else value for value in series]
+
+
+def test_columnar_transform_matches_the_per_line_loop():
+    data = synthetic.synthetic_lines(500)
+    data["ARR_BAD_TYPE"] = dict(next(iter(data.values())), TransportType="ZEPPELIN")
+    data["ARR_TEXT_DIRECTION"] = dict(next(iter(data.values())), LineDirection="2")
+    data["ARR_BAD_DIRECTION"] = dict(next(iter(data.values())), LineDirection="north")
+    data["ARR_MISSING"] = {"LinePlanningNumber": "9"}
+
+    expected = transform_benchmark.loop_transform(data)
+    df = transform_benchmark.columnar_transform(data)
+
+    assert list(df.columns) == list(expected.columns) == transform.OUTPUT_COLUMNS
+    assert df["uuid_line"].str.fullmatch(r"[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}").all()
+
+    # Every column but the generated uuid and the direction holds the values of the loop (unknown transport types are null in both)
+    for column in transform.OUTPUT_COLUMNS:
+        if column in ("uuid_line", "line_direction"):
+            continue
+        assert values(df[column]) == values(expected[column]), column
+
+    assert isinstance(df["transport_type"].dtype, pd.CategoricalDtype)
+    assert pd.isna(df.set_index("pk_line_id").loc["ARR_BAD_TYPE", "transport_type"])
+
+    # The loop passed the direction through as sent, the transform casts it to INTEGER and nulls the values that are not integers
+    directions = df.set_index("pk_line_id")["line_direction"]
+    assert str(directions.dtype) == "Int64"
+    assert directions["ARR_TEXT_DIRECTION"] == 2
+    assert pd.isna(directions["ARR_BAD_DIRECTION"])
+    assert pd.isna(directions["ARR_MISSING"])
+    assert (directions.drop(["ARR_TEXT_DIRECTION", "ARR_BAD_DIRECTION", "ARR_MISSING"]) == pd.to_numeric(expected.set_index("pk_line_id")["line_direction"].drop(["ARR_TEXT_DIRECTION", "ARR_BAD_DIRECTION", "ARR_MISSING"]))).all()
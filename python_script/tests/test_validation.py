@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# Modules import
+import json
+import pyarrow.parquet as pq
+
+# Custom modules
+from lines_pipeline import cdc, extract, schema, transform, validation
+
+
+def line(destination="Arnhem", transport_type="BUS", direction="1", **fields):
+    return dict({"LineName": "Line", "TransportType": transport_type, "LinePublicNumber": "1", "DataOwnerCode": "ARR", "DestinationName50": destination, "LinePlanningNumber": "1", "LineDirection": direction}, **fields)
+
+
+def batches(records, batch_size=extract.DEFAULT_BATCH_SIZE):
+    """
+    Method used to parse a /line/ payload into raw record batches, as the extract stage does.
+    """
+
+    return list(extract.iter_line_batches([json.dumps(records).encode("utf-8")], batch_size=batch_size))
+
+
+def validate(validator, records, quarantine=None, batch_size=extract.DEFAULT_BATCH_SIZE):
+    return list(validator.validate_batches(batches(records, batch_size=batch_size), quarantine=quarantine))
+
+
+def test_each_constraint_is_reported_as_a_reason():
+    validator = validation.BatchValidator(schema.LINES)
+
+    valid, quarantined = validator.split(batches({
+        "ARR_1": line(),
+        "ARR_2": line(DataOwnerCode=None),
+        "ARR_3": line(direction="north"),
+        "ARR_4": line(transport_type="ZEPPELIN"),
+        "ARR_5": line(transport_type="PLANE", LinePlanningNumber=None),
+    })[0])
+
+    assert valid.column("pk_line_id").to_pylist() == ["ARR_1"]
+    assert dict(zip(quarantined.column("pk_line_id").to_pylist(), quarantined.column(validation.QUARANTINE_REASON_FIELD).to_pylist())) == {
+        "ARR_2": "data_owner_code: missing required value",
+        "ARR_3": "line_direction: not a valid INTEGER",
+        "ARR_4": "transport_type: value not allowed",
+        "ARR_5": "transport_type: value not allowed; line_planning_number: missing required value",
+    }
+    assert validator.rows_quarantined == 4
+    assert validator.report() == "data_owner_code: missing required value: 1, line_direction: not a valid INTEGER: 1, line_planning_number: missing required value: 1, transport_type: value not allowed: 2"
+
+
+def test_first_occurrence_of_a_duplicate_key_wins_across_batches():
+    validator = validation.BatchValidator(schema.LINES)
+
+    # The payload is streamed line by line, a key repeated in the object is kept by the parser and checked across batches
+    payload = "{" + ", ".join(json.dumps(key) + ": " + json.dumps(record) for key, record in [("ARR_1", line("Arnhem")), ("ARR_2", line("Ede")), ("ARR_1", line("Zeist"))]) + "}"
+    raw = list(extract.iter_line_batches([payload.encode("utf-8")], batch_size=2))
+    split = [validator.split(batch) for batch in raw]
+
+    assert [valid.column("destination_name_50").to_pylist() for valid, _ in split] == [["Arnhem", "Ede"], []]
+    assert split[0][1] is None
+    assert split[1][1].column("destination_name_50").to_pylist() == ["Zeist"]
+    assert split[1][1].column(validation.QUARANTINE_REASON_FIELD).to_pylist() == ["pk_line_id: duplicate value"]
+    assert list(validator.quarantined_keys()) == ["ARR_1"]
+
+
+def test_quarantine_file_holds_the_raw_rejected_lines_and_their_reasons(tmp_path):
+    validator = validation.BatchValidator(schema.LINES)
+    path = str(tmp_path / "quarantine" / "lines.parquet")
+
+    with validation.QuarantineWriter(path) as quarantine:
+        valid = validate(validator, {"ARR_1": line(), "ARR_2": line(direction="2.5"), "ARR_3": line(), "ARR_4": line(transport_type="ZEPPELIN")}, quarantine=quarantine, batch_size=2)
+
+    table = pq.read_table(path)
+
+    assert sum(batch.num_rows for batch in valid) == 2
+    assert quarantine.rows_written == 2
+    assert table.schema.names == extract.RAW_SCHEMA.names + [validation.QUARANTINE_REASON_FIELD]
+    assert table.to_pylist() == [
+        dict(batches({"ARR_2": line(direction="2.5")})[0].to_pylist()[0], quarantine_reason="line_direction: not a valid INTEGER"),
+        dict(batches({"ARR_4": line(transport_type="ZEPPELIN")})[0].to_pylist()[0], quarantine_reason="transport_type: value not allowed"),
+    ]
+
+
+def test_quarantine_file_is_only_created_for_rejected_lines(tmp_path):
+    path = tmp_path / "lines.parquet"
+
+    with validation.QuarantineWriter(str(path)) as quarantine:
+        validate(validation.BatchValidator(schema.LINES), {"ARR_1": line()}, quarantine=quarantine)
+
+    assert quarantine.rows_written == 0
+    assert not path.exists()
+
+
+def test_quarantined_lines_are_neither_shipped_nor_deleted_in_incremental_mode():
+    snapshot = cdc.hash_lines(transform.transform_lines(transform.records_to_frame({"ARR_1": line("Arnhem"), "ARR_2": line("Ede")})))
+    detector = cdc.ChangeDetector(snapshot)
+    validator = validation.BatchValidator(schema.LINES)
+
+    # ARR_2 changed but its new version breaks a constraint, ARR_1 changed and is valid
+    changed = [detector.changes(transform.transform_batch(batch)) for batch in validate(validator, {"ARR_1": line("Utrecht"), "ARR_2": line("Tiel", direction="north")})]
+    detector.retain(validator.quarantined_keys())
+
+    assert [key for df in changed for key in df["pk_line_id"]] == ["ARR_1"]
+    assert detector.deletions().empty
+    assert detector.current_hashes()["ARR_2"] == snapshot["ARR_2"]
+    assert detector.counts == {cdc.CHANGE_INSERT: 0, cdc.CHANGE_UPDATE: 1, cdc.CHANGE_DELETE: 0}
@@ -0,0 +1,8 @@
+SELECT uuid_line, pk_line_id, line_name, transport_type, line_public_number, data_owner_code, destination_name_50, line_planning_number, line_direction, load_timestamp, source_system
+FROM destination_project.destintation_dataset.lines
+WHERE valid_from <= @as_of
+  AND (valid_to IS NULL OR valid_to > @as_of);
+SELECT uuid_line, pk_line_id, line_name, transport_type, line_public_number, data_owner_code, destination_name_50, line_planning_number, line_direction, load_timestamp, source_system, valid_from, valid_to, row_hash
+FROM destination_project.destintation_dataset.lines
+WHERE pk_line_id = @key
+ORDER BY valid_from;
@@ -0,0 +1,46 @@
+INSERT INTO destination_project.destintation_dataset.lines_history (uuid_line, pk_line_id, line_name, transport_type, line_public_number, data_owner_code, destination_name_50, line_planning_number, line_direction, load_timestamp, source_system)
+SELECT N.uuid_line, N.pk_line_id, N.line_name, N.transport_type, N.line_public_number, N.data_owner_code, N.destination_name_50, N.line_planning_number, N.line_direction, CURRENT_TIMESTAMP(), N.source_system
+FROM destination_project.temporary_dataset.lines N
+WHERE NOT EXISTS (SELECT 1 FROM destination_project.destintation_dataset.lines B WHERE B.pk_line_id = N.pk_line_id AND B.pk_line_id BETWEEN @min_key AND @max_key AND B.line_name IS NOT DISTINCT FROM N.line_name AND B.transport_type IS NOT DISTINCT FROM N.transport_type AND B.line_public_number IS NOT DISTINCT FROM N.line_public_number AND B.data_owner_code IS NOT DISTINCT FROM N.data_owner_code AND B.destination_name_50 IS NOT DISTINCT FROM N.destination_name_50 AND B.line_planning_number IS NOT DISTINCT FROM N.line_planning_number AND B.line_direction IS NOT DISTINCT FROM N.line_direction);
+MERGE destination_project.destintation_dataset.lines B
+USING destination_project.temporary_dataset.lines N
+ON B.pk_line_id = N.pk_line_id
+  AND B.pk_line_id BETWEEN @min_key AND @max_key
+WHEN MATCHED AND NOT (B.line_name IS NOT DISTINCT FROM N.line_name AND B.transport_type IS NOT DISTINCT FROM N.transport_type AND B.line_public_number IS NOT DISTINCT FROM N.line_public_number AND B.data_owner_code IS NOT DISTINCT FROM N.data_owner_code AND B.destination_name_50 IS NOT DISTINCT FROM N.destination_name_50 AND B.line_planning_number IS NOT DISTINCT FROM N.line_planning_number AND B.line_direction IS NOT DISTINCT FROM N.line_direction) THEN
+  UPDATE SET
+    uuid_line = N.uuid_line,
+    line_name = N.line_name,
+    transport_type = N.transport_type,
+    line_public_number = N.line_public_number,
+    data_owner_code = N.data_owner_code,
+    destination_name_50 = N.destination_name_50,
+    line_planning_number = N.line_planning_number,
+    line_direction = N.line_direction,
+    load_timestamp = CURRENT_TIMESTAMP(),
+    source_system = N.source_system
+WHEN NOT MATCHED THEN
+  INSERT (
+    uuid_line,
+    pk_line_id,
+    line_name,
+    transport_type,
+    line_public_number,
+    data_owner_code,
+    destination_name_50,
+    line_planning_number,
+    line_direction,
+    load_timestamp,
+    source_system
+  ) VALUES(
+    N.uuid_line,
+    N.pk_line_id,
+    N.line_name,
+    N.transport_type,
+    N.line_public_number,
+    N.data_owner_code,
+    N.destination_name_50,
+    N.line_planning_number,
+    N.line_direction,
+    CURRENT_TIMESTAMP(),
+    N.source_system
+  );
@@ -0,0 +1,44 @@
+MERGE destination_project.destintation_dataset.lines B
+USING (
+  WITH S AS (SELECT H.*, FARM_FINGERPRINT(TO_JSON_STRING(STRUCT(H.line_name, H.transport_type, H.line_public_number, H.data_owner_code, H.destination_name_50, H.line_planning_number, H.line_direction))) AS row_hash FROM destination_project.temporary_dataset.lines H)
+  SELECT S.pk_line_id AS merge_key, S.* FROM S
+  UNION ALL
+  SELECT CAST(NULL AS STRING) AS merge_key, S.* FROM S JOIN destination_project.destintation_dataset.lines C ON C.pk_line_id = S.pk_line_id AND C.valid_to IS NULL AND C.pk_line_id BETWEEN @min_key AND @max_key AND C.row_hash != S.row_hash
+  WHERE S.change_type != 'D'
+) N
+ON B.pk_line_id = N.merge_key AND B.valid_to IS NULL AND B.pk_line_id BETWEEN @min_key AND @max_key
+WHEN MATCHED AND (N.change_type = 'D' OR B.row_hash != N.row_hash) THEN
+  UPDATE SET
+    valid_to = CURRENT_TIMESTAMP()
+WHEN NOT MATCHED AND N.change_type != 'D' THEN
+  INSERT (
+    uuid_line,
+    pk_line_id,
+    line_name,
+    transport_type,
+    line_public_number,
+    data_owner_code,
+    destination_name_50,
+    line_planning_number,
+    line_direction,
+    load_timestamp,
+    source_system,
+    valid_from,
+    valid_to,
+    row_hash
+  ) VALUES(
+    N.uuid_line,
+    N.pk_line_id,
+    N.line_name,
+    N.transport_type,
+    N.line_public_number,
+    N.data_owner_code,
+    N.destination_name_50,
+    N.line_planning_number,
+    N.line_direction,
+    CURRENT_TIMESTAMP(),
+    N.source_system,
+    CURRENT_TIMESTAMP(),
+    NULL,
+    N.row_hash
+  );